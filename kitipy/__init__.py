@@ -1,14 +1,47 @@
+__version__ = '0.1'
+
+from .cache import CachingExecutor, ResultCache
+from .capture import CaptureBuffer
 from .dispatcher import Dispatcher
 from .context import Context, pass_context, get_current_context, get_current_executor
-from .exceptions import TaskError
-from .executor import Executor, InteractiveWarningPolicy
+from .exceptions import FanOutError, ParallelError, TaskError
+from .executor import Executor, FanOutResult, InteractiveWarningPolicy, ParallelResult
+from .metrics import CommandMetrics
+from .progress import TransferProgress
+from .remotefs import RemoteFS
+from .scheduler import TaskScheduler
+from .ssh import ConnectionPool, get_connection_pool
+from .sync import SyncPlan
 from .groups import Task, Group, RootCommand, StackGroup, StageGroup, root, task, group
-from .utils import append_cmd_flags, confirm_and_apply, invoke_tree, load_config_file, normalize_config, set_up_file_transfer_listeners, wait_for
-from . import docker, filters, libs, tasks
+from .values import LazyValue, lazy_value
+from .utils import append_cmd_flags, confirm_and_apply, invoke_tree, load_config, load_config_file, normalize_config, set_up_file_transfer_listeners, wait_for
+from .lazy import lazy_attributes
+from . import filters
 
-from . import ansible_actions, git_actions
+# Submodules pulling heavy dependencies (e.g. asyncio, boto3, requests or
+# container_transform) are only imported when they're first accessed, such
+# that kitipy loads quickly.
+__getattr__, __dir__ = lazy_attributes(
+    __name__, {
+        'AsyncExecutor': '.async_executor:AsyncExecutor',
+        'ansible_actions': '.ansible_actions',
+        'docker': '.docker',
+        'git_actions': '.git_actions',
+        'libs': '.libs',
+        'tasks': '.tasks',
+    })
 
 __all__ = [
+    # from async_executor module
+    'AsyncExecutor',
+
+    # from cache module
+    'CachingExecutor',
+    'ResultCache',
+
+    # from capture module
+    'CaptureBuffer',
+
     #  from dispatcher module
     'Dispatcher',
 
@@ -19,11 +52,34 @@ __all__ = [
     'get_current_executor',
 
     # from exceptions module
+    'FanOutError',
+    'ParallelError',
     'TaskError',
 
     # from executor module
     'Executor',
+    'FanOutResult',
     'InteractiveWarningPolicy',
+    'ParallelResult',
+
+    # from metrics module
+    'CommandMetrics',
+
+    # from progress module
+    'TransferProgress',
+
+    # from remotefs module
+    'RemoteFS',
+
+    # from scheduler module
+    'TaskScheduler',
+
+    # from ssh module
+    'ConnectionPool',
+    'get_connection_pool',
+
+    # from sync module
+    'SyncPlan',
 
     # from groups module
     'Task',
@@ -37,11 +93,16 @@ __all__ = [
     'append_cmd_flags',
     'confirm_and_apply',
     'invoke_tree',
+    'load_config',
     'load_config_file',
     'normalize_config',
     'set_up_file_transfer_listeners',
     'wait_for',
 
+    # from values module
+    'LazyValue',
+    'lazy_value',
+
     # action modules
     'ansible_actions',
     'git_actions',
@@ -0,0 +1,320 @@
+"""This module provides AsyncExecutor, an asyncio counterpart of the kitipy
+Executor. It's useful to overlap lots of independent local and remote
+commands on a single event loop, instead of running them one after the
+other.
+"""
+
+import asyncio
+import concurrent.futures
+import os.path
+import shlex
+import subprocess
+import sys
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+from .capture import CaptureBuffer
+from .executor import Executor, _StreamDecoder, _write_output
+
+
+class AsyncExecutor(object):
+    """AsyncExecutor wraps an Executor and provides awaitable versions of its
+    methods to run commands and transfer files.
+
+    Local commands are run through asyncio subprocesses. Remote commands are
+    started on their own SSH channel and their output is read without blocking
+    the event loop. File transfers, which go through paramiko's blocking SFTP
+    client, are run in the default thread pool of the event loop.
+
+    Sync callers can use submit() to schedule coroutines on a background event
+    loop and get concurrent.futures.Future objects back:
+
+        aexec = AsyncExecutor(kctx.executor)
+        futures = [aexec.submit(aexec.arun, 'deploy %s' % (app)) for app in apps]
+        for future in concurrent.futures.as_completed(futures):
+            print(future.result().returncode)
+        aexec.close()
+    """
+    def __init__(self, executor: Executor):
+        """
+        Args:
+            executor (Executor):
+                The Executor providing the target (local or remote host), the
+                base directories and the SSH connection.
+        """
+        self._executor = executor
+        self._loop = None  # type: Optional[asyncio.AbstractEventLoop]
+        self._thread = None  # type: Optional[threading.Thread]
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> Executor:
+        return self._executor
+
+    async def arun(
+            self,
+            cmd: str,
+            env: Optional[Dict[str, str]] = None,
+            cwd: Optional[str] = None,
+            shell: bool = True,
+            input: Optional[str] = None,
+            text: bool = True,
+            encoding: Optional[str] = None,
+            pipe: bool = False,
+            check: bool = True,
+    ) -> subprocess.CompletedProcess:
+        """Run a command on either local or remote target, depending on how
+        the underlying executor was set. See Executor.run() for more details
+        about the parameters.
+
+        Raises:
+            subprocess.CalledProcessError: When check mode is enabled and the
+                command returns an exit code > 0.
+            paramiko.SSHException: When the SSH client fails to run the command.
+
+        Returns:
+            subprocess.CompletedProcess
+        """
+        if self._executor.is_remote:
+            return await self._aremote(cmd,
+                                       env=env,
+                                       cwd=cwd,
+                                       input=input,
+                                       text=text,
+                                       encoding=encoding,
+                                       pipe=pipe,
+                                       check=check)
+        return await self.alocal(cmd,
+                                 env=env,
+                                 cwd=cwd,
+                                 shell=shell,
+                                 input=input,
+                                 text=text,
+                                 encoding=encoding,
+                                 pipe=pipe,
+                                 check=check)
+
+    async def alocal(
+            self,
+            cmd: str,
+            env: Optional[Dict[str, str]] = None,
+            cwd: Optional[str] = None,
+            shell: bool = True,
+            input: Optional[str] = None,
+            text: bool = True,
+            encoding: Optional[str] = None,
+            pipe: bool = False,
+            check: bool = True,
+    ) -> subprocess.CompletedProcess:
+        """Run a command on local host. See Executor.local() for more details
+        about the parameters.
+
+        Raises:
+            subprocess.CalledProcessError: When check mode is enabled and the
+                command returns an exit code > 0.
+
+        Returns:
+            subprocess.CompletedProcess
+        """
+        cwd = cwd or self._executor.local_cwd
+        encoding = encoding if encoding else sys.getdefaultencoding()
+        stream = asyncio.subprocess.PIPE if pipe else None
+        stdin = asyncio.subprocess.PIPE if input is not None else None
+
+        if shell:
+            proc = await asyncio.create_subprocess_shell(cmd,
+                                                         stdin=stdin,
+                                                         stdout=stream,
+                                                         stderr=stream,
+                                                         env=env,
+                                                         cwd=cwd)
+        else:
+            proc = await asyncio.create_subprocess_exec(*shlex.split(cmd),
+                                                        stdin=stdin,
+                                                        stdout=stream,
+                                                        stderr=stream,
+                                                        env=env,
+                                                        cwd=cwd)
+
+        data = input.encode(encoding) if input is not None else None
+        with self._executor._command_events(cmd, 'localhost', cwd,
+                                            input) as event:
+            out, err = await proc.communicate(data)
+
+            stdout = out if out else b''  # type: Union[str, bytes]
+            stderr = err if err else b''  # type: Union[str, bytes]
+            if text:
+                stdout = stdout.decode(encoding)  # type: ignore
+                stderr = stderr.decode(encoding)  # type: ignore
+
+            return event.done(
+                _completed(cmd, proc.returncode, stdout, stderr, check))
+
+    async def _aremote(
+            self,
+            cmd: str,
+            env: Optional[Dict[str, str]] = None,
+            cwd: Optional[str] = None,
+            input: Optional[str] = None,
+            text: bool = True,
+            encoding: Optional[str] = None,
+            pipe: bool = False,
+            check: bool = True,
+    ) -> subprocess.CompletedProcess:
+        if not self._executor.is_remote:
+            raise RuntimeError(
+                'This Executor is running in local mode, could not run following command: %s'
+                % (cmd))
+
+        loop = asyncio.get_event_loop()
+        encoding = encoding if encoding else sys.getdefaultencoding()
+        cwd = cwd or self._executor.remote_cwd
+
+        host = self._executor._hostname
+        with self._executor._command_events(cmd, host, cwd, input) as event:
+            res = await self._aread_remote(loop, cmd, env, cwd, input, text,
+                                           encoding, pipe, check)
+            return event.done(res)
+
+    async def _aread_remote(self, loop: asyncio.AbstractEventLoop, cmd: str,
+                            env: Optional[Dict[str, str]],
+                            cwd: Optional[str], input: Optional[str],
+                            text: bool, encoding: str, pipe: bool,
+                            check: bool) -> subprocess.CompletedProcess:
+        # Opening the SSH connection and the channel blocks on network I/O.
+        # The connection is opened under the lock of the Executor, such that
+        # concurrent commands share it instead of each acquiring their own.
+        channel = await loop.run_in_executor(None, self._executor._exec_remote,
+                                             cmd, env, cwd, input)
+
+        decoder = _StreamDecoder(text, encoding, False)
+        buffers = {
+            'stdout': CaptureBuffer(encoding if text else None),
+            'stderr': CaptureBuffer(encoding if text else None),
+        }
+
+        try:
+            async for stream, chunk in _aiter_channel_chunks(channel):
+                if pipe:
+                    buffers[stream].write(chunk)
+                    continue
+                for data in decoder.feed(stream, chunk):
+                    _write_output(stream, data)
+
+            for stream, data in decoder.flush():
+                _write_output(stream, data)
+
+            returncode = await loop.run_in_executor(None,
+                                                    channel.recv_exit_status)
+        finally:
+            channel.close()
+
+        return _completed(cmd, returncode, buffers['stdout'].getvalue(),
+                          buffers['stderr'].getvalue(), check)
+
+    async def acopy(self, local_path: str, remote_path: str):
+        """Transfer a file from your computer to the remote target. See
+        Executor.copy() for more details.
+
+        The transfer is run in the default thread pool of the event loop, as
+        paramiko's SFTP client is blocking.
+        """
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._executor.copy, local_path,
+                                   remote_path)
+
+    async def apath_exists(self, path: str) -> bool:
+        """Check if the given path exists. In local mode, it uses
+        `os.path.exists` and `ls` in remote mode.
+        """
+        if self._executor.is_local:
+            return os.path.exists(path)
+
+        res = await self._aremote("ls %s 1>/dev/null 2>&1" % (path),
+                                  pipe=True,
+                                  check=False)
+        return res.returncode == 0
+
+    def submit(self, fn: Callable[..., Awaitable[Any]], *args,
+               **kwargs) -> concurrent.futures.Future:
+        """Schedule a coroutine function on the background event loop of this
+        AsyncExecutor. This is the entrypoint for sync callers.
+
+        Args:
+            fn (Callable[..., Awaitable[Any]]):
+                The coroutine function to run (e.g. aexec.arun).
+            *args: Positional args passed to fn.
+            **kwargs: Keyword args passed to fn.
+
+        Returns:
+            concurrent.futures.Future: The future resolved with the result of
+                the coroutine.
+        """
+        return asyncio.run_coroutine_threadsafe(fn(*args, **kwargs),
+                                                self._background_loop())
+
+    def _background_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, daemon=True)
+                self._thread.start()
+
+            return self._loop
+
+    def close(self):
+        """Stop the background event loop, if it has been started."""
+        with self._lock:
+            if self._loop is None:
+                return
+
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()  # type: ignore
+            self._loop.close()
+            self._loop = None
+            self._thread = None
+
+
+async def _aiter_channel_chunks(channel):
+    """Read the stdout/stderr of a SSH channel as data arrive, until the
+    remote command exits, without blocking the event loop.
+
+    The channel fileno becomes readable when data are available on either
+    stdout or stderr, or when the channel is closed. The wait is bounded in
+    case the exit status arrives without waking up the fileno.
+    """
+    loop = asyncio.get_event_loop()
+    ready = asyncio.Event()
+    fd = channel.fileno()
+    loop.add_reader(fd, ready.set)
+
+    try:
+        while True:
+            received = False
+            if channel.recv_ready():
+                yield ('stdout', channel.recv(32768))
+                received = True
+            if channel.recv_stderr_ready():
+                yield ('stderr', channel.recv_stderr(32768))
+                received = True
+
+            if received:
+                continue
+            if channel.exit_status_ready() or channel.closed:
+                break
+
+            ready.clear()
+            try:
+                await asyncio.wait_for(ready.wait(), 1)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        loop.remove_reader(fd)
+
+
+def _completed(cmd: str, returncode: int, stdout: Union[str, bytes],
+               stderr: Union[str, bytes],
+               check: bool) -> subprocess.CompletedProcess:
+    if check and returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd, stdout, stderr)
+    return subprocess.CompletedProcess(cmd, returncode, stdout, stderr)
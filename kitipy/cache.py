@@ -0,0 +1,272 @@
+"""This module provides the on-disk cache used to memoize the results of
+idempotent read-only commands, as well as CachingExecutor, the executor
+wrapper using it.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import os.path
+import subprocess
+import time
+from typing import Any, Callable, Dict, Optional
+from .executor import BaseExecutor, ProxyExecutor
+
+
+def cache_dir(*parts: str) -> str:
+    """Get the path to a kitipy cache directory. They're located in
+    $XDG_CACHE_HOME/kitipy, or ~/.cache/kitipy when that env var is not
+    defined.
+
+    Args:
+        *parts (str): Path segments appended to the cache root.
+    """
+    cache_home = os.environ.get('XDG_CACHE_HOME',
+                                os.path.expanduser('~/.cache'))
+    return os.path.join(cache_home, 'kitipy', *parts)
+
+
+class ResultCache(object):
+    """ResultCache stores subprocess.CompletedProcess on disk, one JSON file
+    per entry.
+
+    Entries expire after the TTL passed to get(). The cache is bounded to
+    max_entries: the least recently used entries are evicted when it grows
+    beyond that limit.
+    """
+    def __init__(self, path: Optional[str] = None, max_entries: int = 1000):
+        """
+        Args:
+            path (Optional[str]):
+                Directory where the entries are stored. Defaults to
+                $XDG_CACHE_HOME/kitipy/results.
+            max_entries (int):
+                Maximum number of entries kept in the cache.
+        """
+        self.path = path if path else cache_dir('results')
+        self.max_entries = max_entries
+
+    @staticmethod
+    def key(cmd: str,
+            env: Optional[Dict[str, str]],
+            cwd: Optional[str],
+            host: str,
+            text: bool = True) -> str:
+        """Compute the cache key of a command.
+
+        Args:
+            cmd (str): The command.
+            env (Optional[Dict[str, str]]): The env vars passed to the command.
+            cwd (Optional[str]): The working directory of the command.
+            host (str): The host where the command is run.
+            text (bool): Whether the outputs are decoded into strings.
+
+        Returns:
+            str: The cache key.
+        """
+        data = json.dumps([cmd, env, cwd, host, text], sort_keys=True)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key + '.json')
+
+    def get(self, key: str,
+            ttl: float) -> Optional[subprocess.CompletedProcess]:
+        """Get a cached result.
+
+        Args:
+            key (str): The cache key (see key()).
+            ttl (float): Maximum age, in seconds, of the cached result.
+
+        Returns:
+            Optional[subprocess.CompletedProcess]:
+                The cached result or None if there's no fresh entry.
+        """
+        try:
+            with open(self._file(key), 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if time.time() - entry['created'] > ttl:
+            return None
+
+        # The mtime of the entry tracks when it was last used.
+        try:
+            os.utime(self._file(key))
+        except OSError:
+            pass
+
+        return subprocess.CompletedProcess(entry['args'], entry['returncode'],
+                                           _load_output(entry['stdout']),
+                                           _load_output(entry['stderr']))
+
+    def set(self, key: str, res: subprocess.CompletedProcess):
+        """Store a result in the cache and evict the least recently used
+        entries if the cache is full.
+
+        Args:
+            key (str): The cache key (see key()).
+            res (subprocess.CompletedProcess): The result to store.
+        """
+        entry = {
+            'created': time.time(),
+            'args': res.args,
+            'returncode': res.returncode,
+            'stdout': _dump_output(res.stdout),
+            'stderr': _dump_output(res.stderr),
+        }
+
+        os.makedirs(self.path, exist_ok=True)
+        tmp_file = self._file(key) + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp_file, self._file(key))
+
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.path):
+            if not name.endswith('.json'):
+                continue
+            try:
+                mtime = os.stat(os.path.join(self.path, name)).st_mtime
+            except OSError:
+                continue
+            entries.append((mtime, name))
+
+        if len(entries) <= self.max_entries:
+            return
+
+        entries.sort()
+        for _, name in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+
+    def clear(self):
+        """Remove all the entries of the cache."""
+        if not os.path.isdir(self.path):
+            return
+        for name in os.listdir(self.path):
+            if name.endswith('.json'):
+                os.remove(os.path.join(self.path, name))
+
+
+def _dump_output(output: Any) -> Dict[str, str]:
+    if isinstance(output, bytes):
+        return {'bytes': base64.b64encode(output).decode('ascii')}
+    return {'text': output if output else ''}
+
+
+def _load_output(data: Dict[str, str]) -> Any:
+    if 'bytes' in data:
+        return base64.b64decode(data['bytes'])
+    return data['text']
+
+
+class CachingExecutor(ProxyExecutor):
+    """CachingExecutor wraps another executor and memoizes the results of the
+    commands it runs, such that repeated runs of idempotent read-only
+    commands (e.g. `git ls-remote`) are answered from the cache, even across
+    CLI invocations.
+
+    Only commands whose output is piped, that take no input and that succeed
+    are cached. Their cache key is made of the command, its env vars, its
+    working directory and the host where it's run. It's the caller
+    responsibility to only run commands that don't mutate anything through
+    this executor. The easiest way to use it is through Context.cached():
+
+        with kctx.cached(ttl=600):
+            res = kctx.local('git ls-remote --tags origin', pipe=True)
+    """
+    def __init__(self,
+                 executor: BaseExecutor,
+                 ttl: float = 300,
+                 cache: Optional[ResultCache] = None):
+        """
+        Args:
+            executor (BaseExecutor):
+                The executor actually running the commands.
+            ttl (float):
+                Number of seconds the results are kept.
+            cache (Optional[ResultCache]):
+                The cache where results are stored. A ResultCache using the
+                default cache directory is used when none is provided.
+        """
+        super().__init__(executor)
+        self.ttl = ttl
+        self.cache = cache if cache is not None else ResultCache()
+
+    def local(
+            self,
+            cmd: str,
+            env: Optional[Dict[str, str]] = None,
+            cwd: Optional[str] = None,
+            shell: bool = True,
+            input: Optional[str] = None,
+            text: bool = True,
+            encoding: Optional[str] = None,
+            pipe: bool = False,
+            check: bool = True,
+            tee: bool = False,
+    ) -> subprocess.CompletedProcess:
+        run = lambda: super(CachingExecutor, self).local(
+            cmd, env, cwd, shell, input, text, encoding, pipe, check, tee)
+        if not pipe or tee or input is not None:
+            return run()
+
+        key = ResultCache.key(cmd, env, self._local_dir(cwd), 'localhost',
+                              text)
+        return self._cached(key, run)
+
+    def run(
+            self,
+            cmd: str,
+            env: Optional[Dict[str, str]] = None,
+            cwd: Optional[str] = None,
+            shell: bool = True,
+            input: Optional[str] = None,
+            text: bool = True,
+            encoding: Optional[str] = None,
+            pipe: bool = False,
+            check: bool = True,
+            tee: bool = False,
+    ) -> subprocess.CompletedProcess:
+        run = lambda: super(CachingExecutor, self).run(
+            cmd, env, cwd, shell, input, text, encoding, pipe, check, tee)
+        if not pipe or tee or input is not None:
+            return run()
+
+        if self.is_local:
+            key = ResultCache.key(cmd, env, self._local_dir(cwd), 'localhost',
+                                  text)
+            return self._cached(key, run)
+
+        hostnames = self.hostnames
+        host = hostnames[0] if len(hostnames) > 0 else 'localhost'
+        # Remote commands run without cwd are run from the login directory.
+        key = ResultCache.key(cmd, env, cwd or self.cwd or '~', host, text)
+        return self._cached(key, run)
+
+    def _local_dir(self, cwd: Optional[str]) -> str:
+        # Commands run without cwd are run from the current directory, which
+        # has to be part of the cache key: the same command run from two
+        # different directories (e.g. git describe) might output different
+        # things.
+        return os.path.abspath(cwd or self.local_cwd or os.getcwd())
+
+    def _cached(self, key: str,
+                run: Callable[[], subprocess.CompletedProcess]
+                ) -> subprocess.CompletedProcess:
+        res = self.cache.get(key, self.ttl)
+        if res is not None:
+            return res
+
+        res = run()
+        if res.returncode == 0:
+            self.cache.set(key, res)
+        return res
@@ -0,0 +1,101 @@
+"""This module provides the buffer used by kitipy Executors to capture the
+output of the commands they run.
+"""
+
+import codecs
+from typing import Optional, Union
+
+
+class CaptureBuffer(object):
+    """CaptureBuffer accumulates the raw chunks read from a command stdout or
+    stderr and decodes them once the command has ended.
+
+    Chunks are appended to a bytearray, such that capturing a large output
+    takes linear time, and decoding is done on the whole output, such that
+    multi-byte characters split over two chunks are properly decoded.
+
+    The buffer can be bounded through max_size. In that case, it either keeps
+    the first max_size bytes and discards the rest, or keeps the last
+    max_size bytes when used as a ring buffer (e.g. to keep the tail of a
+    long log).
+    """
+    def __init__(self,
+                 encoding: Optional[str] = None,
+                 max_size: Optional[int] = None,
+                 ring: bool = False):
+        """
+        Args:
+            encoding (Optional[str]):
+                Encoding used to decode the captured output. When None, the
+                output is returned as bytes by getvalue().
+            max_size (Optional[int]):
+                Maximum number of bytes kept by the buffer. It's unbounded by
+                default.
+            ring (bool):
+                Whether the last max_size bytes should be kept instead of the
+                first ones.
+
+        Raises:
+            ValueError: When max_size is not a positive number.
+        """
+        if max_size is not None and max_size <= 0:
+            raise ValueError('max_size should be a positive number.')
+
+        self.encoding = encoding
+        self.max_size = max_size
+        self.ring = ring
+        self.truncated = False
+        self._size = 0
+        self._buffer = bytearray()
+
+    def __len__(self):
+        """Get the number of bytes written to the buffer so far, including
+        the ones discarded.
+        """
+        return self._size
+
+    def write(self, chunk: bytes):
+        """Append a chunk to the buffer.
+
+        Args:
+            chunk (bytes): The raw chunk read from the command output.
+        """
+        self._size += len(chunk)
+
+        if self.max_size is None:
+            self._buffer += chunk
+            return
+
+        if not self.ring:
+            free = self.max_size - len(self._buffer)
+            if len(chunk) > free:
+                self.truncated = True
+            self._buffer += chunk[:max(free, 0)]
+            return
+
+        self._buffer += chunk
+        # Extra bytes are discarded only once the buffer is twice as large as
+        # needed, such that the cost of shifting the buffer is amortized.
+        if len(self._buffer) > 2 * self.max_size:
+            del self._buffer[:-self.max_size]
+            self.truncated = True
+
+    def getvalue(self) -> Union[str, bytes]:
+        """Get the captured output, decoded if an encoding was provided.
+
+        Returns:
+            Union[str, bytes]: The captured output.
+        """
+        data = bytes(self._buffer)
+        if self.ring and self.max_size is not None and len(
+                data) > self.max_size:
+            data = data[-self.max_size:]
+            self.truncated = True
+
+        if self.encoding is None:
+            return data
+
+        # A truncated buffer might start or end in the middle of a multi-byte
+        # character.
+        errors = 'replace' if self.truncated else 'strict'
+        return codecs.decode(data, self.encoding, errors)
@@ -0,0 +1,287 @@
+"""This module provides the cached index of the command tree used to answer
+shell completion requests without resolving the whole command tree.
+
+Click answers completion requests by building the whole command tree, which
+means resolving every task group (including their filters). Instead,
+RootCommand stores the resolved tree in an index file the first time it
+answers a completion request. Next requests are answered from that index by
+complete_from_cache(), which is called by RootCommand.main() before the tree
+is resolved. The index is invalidated when the mtime of the task files or of
+the config file changes.
+
+RootCommand.main() is only called once the task script has imported the
+task modules and built the tree though. Task scripts should thus call
+complete_from_cache() themselves before anything else, such that completion
+requests don't import any task code:
+
+    #!/usr/bin/env python3
+    from kitipy import completion
+    completion.complete_from_cache()
+
+    import kitipy
+    ...
+
+Both the click 7 (e.g. _TASKS_COMPLETE=complete_bash) and click 8 (e.g.
+_TASKS_COMPLETE=bash_complete) protocols are supported. Only subcommand and
+option names are completed from the index. Requests involving options or
+arguments already typed, or the completion of option/argument values, are
+handled by click as usual.
+
+This module should only import click and modules from the standard library,
+such that it can be imported before anything else.
+"""
+
+import click
+import hashlib
+import json
+import os
+import os.path
+import sys
+import types
+from typing import Any, Dict, List, Optional, Tuple
+
+INDEX_VERSION = 1
+"""Version of the index format. Indexes with a different version are
+ignored."""
+
+Choices = List[Tuple[str, Optional[str]]]
+
+
+def complete_var(prog_name: str) -> str:
+    """Get the name of the env var click uses to trigger shell completion."""
+    return '_%s_COMPLETE' % (prog_name.replace('-', '_').upper())
+
+
+def index_path(script: str) -> str:
+    """Get the path to the completion index of a task script. It's located
+    in $XDG_CACHE_HOME/kitipy/completion, or ~/.cache/kitipy/completion when
+    that env var is not defined.
+    """
+    cache_home = os.environ.get('XDG_CACHE_HOME',
+                                os.path.expanduser('~/.cache'))
+    key = hashlib.sha1(os.path.abspath(script).encode('utf-8')).hexdigest()
+    return os.path.join(cache_home, 'kitipy', 'completion', key + '.json')
+
+
+def load_index(script: str) -> Optional[Dict[str, Any]]:
+    """Load the completion index of a task script.
+
+    Returns:
+        Optional[Dict[str, Any]]:
+            The command tree, or None when there's no index or when it's
+            stale.
+    """
+    try:
+        with open(index_path(script), 'r') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if index.get('version') != INDEX_VERSION:
+        return None
+
+    for path, mtime in index['files'].items():
+        try:
+            if os.stat(path).st_mtime_ns != mtime:
+                return None
+        except OSError:
+            return None
+
+    return index['tree']
+
+
+def save_index(script: str, tree: Dict[str, Any],
+               config_file: Optional[str] = None):
+    """Store the completion index of a task script. The task files are the
+    script itself and the modules loaded from its directory.
+
+    Args:
+        script (str): Path to the task script.
+        tree (Dict[str, Any]): The command tree (see index_command()).
+        config_file (Optional[str]): Path to the config file used by kitipy.
+    """
+    basedir = os.path.dirname(os.path.abspath(script)) + os.sep
+    paths = [script] + ([config_file] if config_file else [])
+    for module in list(sys.modules.values()):
+        # Lazy modules (see kitipy.lazy) are skipped, as accessing their
+        # attributes would load them.
+        if type(module) is not types.ModuleType:
+            continue
+        path = getattr(module, '__file__', None)
+        if path and os.path.abspath(path).startswith(basedir):
+            paths.append(path)
+
+    files = {}  # type: Dict[str, int]
+    for path in paths:
+        path = os.path.abspath(path)
+        try:
+            files[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            continue
+
+    path = index_path(script)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump({
+            'version': INDEX_VERSION,
+            'files': files,
+            'tree': tree
+        }, f)
+    os.replace(tmp_file, path)
+
+
+def index_command(click_ctx: click.Context) -> Dict[str, Any]:
+    """Build the index of a command and its subcommands, as resolved in the
+    given click.Context.
+    """
+    cmd = click_ctx.command
+    node = {
+        'name': cmd.name,
+        'help': cmd.get_short_help_str(),
+        'options': [],
+        'arguments': False,
+        'chain': bool(getattr(cmd, 'chain', False)),
+        'commands': {},
+    }  # type: Dict[str, Any]
+
+    for param in cmd.params:
+        if isinstance(param, click.Argument):
+            node['arguments'] = True
+        elif isinstance(param, click.Option) and not param.hidden:
+            node['options'].extend([opt, param.help]
+                                   for opt in param.opts + param.secondary_opts)
+
+    if isinstance(cmd, click.MultiCommand):
+        for name in cmd.list_commands(click_ctx):
+            subcmd = cmd.get_command(click_ctx, name)
+            if subcmd is None or subcmd.hidden:
+                continue
+            sub_ctx = subcmd.make_context(name, [],
+                                          parent=click_ctx,
+                                          resilient_parsing=True)
+            node['commands'][name] = index_command(sub_ctx)
+
+    return node
+
+
+def complete(tree: Dict[str, Any], args: List[str],
+             incomplete: str) -> Optional[Choices]:
+    """Find the completion choices of a partial command line, like click
+    does.
+
+    Args:
+        tree (Dict[str, Any]): The command tree (see index_command()).
+        args (List[str]): The args typed before the incomplete one.
+        incomplete (str): The arg being completed.
+
+    Returns:
+        Optional[Choices]:
+            The choices and their description, or None when the index can't
+            tell.
+    """
+    node = tree
+    for arg in args:
+        # Options and arguments depend on the actual parsing.
+        if node['chain'] or arg not in node['commands']:
+            return None
+        node = node['commands'][arg]
+
+    if incomplete.startswith('-'):
+        if '=' in incomplete:
+            return None
+        return [(opt, help) for opt, help in node['options']
+                if opt.startswith(incomplete)]
+
+    if node['arguments'] or node['chain'] or incomplete == '=':
+        return None
+
+    return sorted((subnode['name'], subnode['help'])
+                  for name, subnode in node['commands'].items()
+                  if name.startswith(incomplete))
+
+
+def parse_instruction(instr: str) -> Optional[Tuple[str, int]]:
+    """Parse the value of the env var used by click to trigger shell
+    completion.
+
+    Returns:
+        Optional[Tuple[str, int]]:
+            The shell and the major version of click whose protocol is used,
+            or None when it's not a completion request.
+    """
+    if instr == 'complete':
+        return ('bash', 7)
+    if instr.startswith('complete_'):
+        return (instr[len('complete_'):], 7)
+    if instr.endswith('_complete'):
+        return (instr[:-len('_complete')], 8)
+    return None
+
+
+def complete_from_cache(prog_name: Optional[str] = None,
+                        complete_var_name: Optional[str] = None):
+    """Answer the shell completion request of the running task script from
+    its index, and exit. Nothing is done when it's not a completion request
+    or when the index can't answer it.
+
+    Args:
+        prog_name (Optional[str]):
+            The program name used by click. Defaults to the name of the task
+            script.
+        complete_var_name (Optional[str]):
+            The name of the env var used by click to trigger shell
+            completion. Defaults to the one derived from prog_name.
+    """
+    script = sys.argv[0] if len(sys.argv) > 0 else ''
+    prog_name = prog_name or os.path.basename(script)
+    instr = os.environ.get(complete_var_name or complete_var(prog_name), '')
+    parsed = parse_instruction(instr)
+    if parsed is None or 'COMP_WORDS' not in os.environ:
+        return
+    shell, protocol = parsed
+
+    tree = load_index(script)
+    if tree is None:
+        return
+
+    cwords = click.parser.split_arg_string(os.environ['COMP_WORDS'])
+    if shell == 'fish':
+        args, incomplete = cwords[1:], os.environ.get('COMP_CWORD', '')
+        # Click 8 asks fish for the current token along with the previous
+        # ones.
+        if protocol >= 8 and incomplete and args and args[-1] == incomplete:
+            args.pop()
+    else:
+        cword = int(os.environ.get('COMP_CWORD', '0'))
+        args = cwords[1:cword]
+        incomplete = cwords[cword] if cword < len(cwords) else ''
+
+    choices = complete(tree, args, incomplete)
+    if choices is None:
+        return
+
+    lines = []  # type: List[str]
+    for choice, help in choices:
+        if protocol >= 8:
+            lines.extend(_format_click8(shell, choice, help))
+            continue
+        if shell == 'fish':
+            lines.append('%s\t%s' % (choice, help) if help else choice)
+            continue
+        lines.append(choice)
+        if shell == 'zsh':
+            lines.append(help if help else '_')
+
+    sys.stdout.write(''.join(line + '\n' for line in lines))
+    sys.stdout.flush()
+    # Exit like click does once it answered a completion request.
+    sys.exit(0 if protocol >= 8 else 1)
+
+
+def _format_click8(shell: str, choice: str, help: Optional[str]) -> List[str]:
+    if shell == 'zsh':
+        return ['plain', choice.replace(':', '\\:'), help if help else '_']
+    if shell == 'fish' and help:
+        return ['plain,%s\t%s' % (choice, help)]
+    return ['plain,' + choice]
@@ -2,10 +2,14 @@ import click
 import contextlib
 import subprocess
 from contextlib import contextmanager
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set, Tuple
+from .cache import CachingExecutor
 from .dispatcher import Dispatcher
 from .exceptions import TaskError
 from .executor import BaseExecutor, ProxyExecutor, _create_executor
+from .incremental import is_incremental, run_incremental
+from .scheduler import TaskScheduler
+from .values import prefetch
 
 
 class Context(ProxyExecutor):
@@ -73,6 +77,11 @@ class Context(ProxyExecutor):
         self._stage = stage
         self._stack = stack
         self.dispatcher = dispatcher
+        # The tasks invoked without explicit arguments that completed, per
+        # stage and stack, such that the dependencies shared by tasks invoked
+        # one after another are run only once (see TaskScheduler).
+        self._completed = set(
+        )  # type: Set[Tuple[click.Command, Optional[str], Optional[str]]]
 
     @property
     def stack(self):
@@ -95,6 +104,19 @@ class Context(ProxyExecutor):
         finally:
             self._executor = previous
 
+    @contextmanager
+    def cached(self, ttl: float = 300):
+        """Memoize the results of the commands run within this context
+        manager, such that repeated runs of idempotent read-only commands are
+        answered from an on-disk cache, even across CLI invocations. See
+        kitipy.cache.CachingExecutor for which commands are cached.
+
+        Args:
+            ttl (float): Number of seconds the results are kept.
+        """
+        with self.using_executor(CachingExecutor(self.executor, ttl)):
+            yield None
+
     @contextmanager
     def using_stage(self, stage_name: str):
         exec = _create_executor(self.config, stage_name, self.dispatcher)
@@ -107,6 +129,7 @@ class Context(ProxyExecutor):
                 yield None
             finally:
                 self._stage = previous
+                exec.close()
 
     @contextmanager
     def using_stack(self,
@@ -132,7 +155,30 @@ class Context(ProxyExecutor):
                 self._stack = previous
 
     def invoke(self, cmd: click.Command, *args, **kwargs):
-        """Call invoke() method on current click.Context"""
+        """Call invoke() method on current click.Context. Like when tasks are
+        run from the CLI, their dependencies are run first (see
+        invoke_parallel()) and the config values they prefetch are fetched
+        before they run. Incremental tasks (see kitipy.Task) are skipped when
+        they're up-to-date.
+        """
+        return self._invoke(cmd, args, kwargs, True)
+
+    def _invoke(self, cmd: click.Command, args: Tuple, kwargs: Dict[str, Any],
+                with_dependencies: bool):
+        # The TaskScheduler runs the dependencies of the tasks it invokes by
+        # itself, so it calls this method with with_dependencies=False.
+        depends_on = [
+            dep for dep in getattr(cmd, 'depends_on', [])
+            if not self._has_completed(dep)
+        ]
+        if with_dependencies and len(depends_on) > 0:
+            self.invoke_parallel(depends_on)
+
+        prefetched = getattr(cmd, 'prefetch', [])
+        if len(prefetched) > 0:
+            self.prefetch(prefetched)
+
+        recorded = len(args) == 0 and len(kwargs) == 0
         parent = click.get_current_context()
         ctx = click.Context(cmd, info_name=cmd.name, parent=parent)
 
@@ -154,7 +200,75 @@ class Context(ProxyExecutor):
 
         with click.core.augment_usage_errors(parent):
             with ctx:  # type: ignore
-                return callback(*args, **kwargs)  # type: ignore
+                if not is_incremental(cmd):
+                    res = callback(*args, **kwargs)  # type: ignore
+                else:
+                    res = run_incremental(
+                        self, cmd, ctx.command_path, kwargs,
+                        lambda: callback(*args, **kwargs))  # type: ignore
+
+        if recorded:
+            self._completed.add(self._completion_key(cmd))
+        return res
+
+    def _completion_key(
+            self, cmd: click.Command
+    ) -> Tuple[click.Command, Optional[str], Optional[str]]:
+        stage = self._stage['name'] if self._stage else None
+        stack = self._stack.name if self._stack else None
+        return (cmd, stage, stack)
+
+    def _has_completed(self, cmd: click.Command) -> bool:
+        return self._completion_key(cmd) in self._completed
+
+    def invoke_parallel(self,
+                        cmds: List[click.Command],
+                        concurrency: Optional[int] = None) -> List[Any]:
+        """Invoke many tasks concurrently, along with their dependencies.
+        Tasks are started as soon as their dependencies are done and each
+        task is run only once. Dependencies already run through this Context
+        (e.g. by a previous call to invoke()) for the current stage and stack
+        are not run again. See kitipy.TaskScheduler for more details.
+
+            kctx.invoke_parallel([build_images, build_assets])
+
+        Args:
+            cmds (List[click.Command]): The tasks to invoke.
+            concurrency (Optional[int]):
+                Maximum number of tasks running at the same time. Defaults to
+                the number of CPUs.
+
+        Returns:
+            List[Any]: The values returned by the given tasks.
+        """
+        return TaskScheduler(self, concurrency).run(cmds)
+
+    def prefetch(self, keys: List[str], concurrency: Optional[int] = None):
+        """Concurrently fetch the sources of the given config values, such
+        that the remote lookups they need are done up front rather than one
+        after another (see kitipy.LazyValue).
+
+            kctx.prefetch(['ecs_task_definition', 'ecs_service_definition'])
+
+        Args:
+            keys (List[str]):
+                Names of the config values. They're looked up in the config of
+                the current stack, then in the one of the current stage. Names
+                not found or not bound to a LazyValue are ignored.
+            concurrency (Optional[int]):
+                Maximum number of sources fetched at the same time.
+        """
+        scopes = []  # type: List[Dict]
+        if self.stack is not None:
+            scopes.append(self.config['stacks'].get(self.stack.name, {}))
+        if self.stage is not None:
+            scopes.append(self.stage)
+
+        values = [
+            next((scope[key] for scope in scopes if key in scope), None)
+            for key in keys
+        ]
+        prefetch(self, values, concurrency)
 
     def echo(self, *args, **kwargs):
         """Call echo() method on current click.Context"""
@@ -1,52 +1,187 @@
-from typing import Any, Callable, Dict, List
+import fnmatch
+import itertools
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 
 class Dispatcher(object):
     """This dispatcher is mostly used to decouple CLI concerns from SSH/SFTP
     handling.
+
+    By default, listeners are called synchronously by emit(). In async mode,
+    events are queued and listeners are called by a background thread, such
+    that slow listeners (e.g. metrics exporters, loggers or UI updates) don't
+    slow down the code emitting events. The queue is bounded: when it's full,
+    emit() either waits for some room (the "block" policy) or drops the event
+    (the "drop" policy).
     """
-    def __init__(self, listeners: Dict[str, List[Callable[..., bool]]] = {}):
+    def __init__(self,
+                 listeners: Optional[Dict[str, List[Callable[..., bool]]]] = None,
+                 async_mode: bool = False,
+                 queue_size: int = 1000,
+                 overflow: str = 'block'):
         """
         Args:
-            listeners (Dict[str, Callable[..., bool]]):
+            listeners (Optional[Dict[str, List[Callable[..., bool]]]]):
                 List of callables taking undefined arguments and returning a
                 bool associated to event names.
+            async_mode (bool):
+                Whether listeners should be called by a background thread
+                instead of being called by emit().
+            queue_size (int):
+                Maximum number of events waiting to be dispatched in async
+                mode.
+            overflow (str):
+                What to do when the queue is full in async mode: either
+                "block" until there's some room, or "drop" the event.
+
+        Raises:
+            ValueError: When the overflow policy is not supported.
         """
-        self.__listeners = listeners
+        if overflow not in ('block', 'drop'):
+            raise ValueError('Overflow policy "%s" is not supported.' %
+                             (overflow))
+
+        self.__listeners = {
+        }  # type: Dict[str, List[Tuple[int, int, Callable[..., bool]]]]
+        self.__seq = itertools.count()
+        self.async_mode = async_mode
+        self.overflow = overflow
+        self.dropped = 0
+        self._queue = queue.Queue(
+            queue_size)  # type: queue.Queue[Optional[Tuple[str, Dict]]]
+        self._worker = None  # type: Optional[threading.Thread]
+        self._errors = []  # type: List[Exception]
+        self._lock = threading.Lock()
 
-    def on(self, event_name: str, fn: Callable[..., bool]):
+        for event_name, fns in (listeners or {}).items():
+            for fn in fns:
+                self.on(event_name, fn)
+
+    def on(self, event_name: str, fn: Callable[..., bool], priority: int = 0):
         """Register a listener for a given event name.
 
         Args:
             event_name (str):
-                Name of the event the listeners should be attached to.
+                Name of the event the listeners should be attached to. It
+                could also be a wildcard pattern (e.g. "file_transfer.*" or
+                "*") to listen to many events. Wildcard listeners receive the
+                name of the event through the event_name keyword argument.
             fn (Callable[[Any, ...], bool]):
                 The event listener that should be triggered for the given event
                 name.
+            priority (int):
+                Listeners with a higher priority are called first. Listeners
+                with the same priority are called in the order they've been
+                registered.
         """
 
         if event_name not in self.__listeners:
             self.__listeners[event_name] = []
 
-        self.__listeners[event_name].append(fn)
+        self.__listeners[event_name].append((-priority, next(self.__seq), fn))
+
+    def listeners(self, event_name: str) -> List[Callable[..., bool]]:
+        """Get the listeners triggered for a given event name, in the order
+        they're called.
+        """
+        return [fn for _, fn in self._matching(event_name)]
+
+    def _matching(self,
+                  event_name: str) -> List[Tuple[str, Callable[..., bool]]]:
+        matching = []  # type: List[Tuple[int, int, str, Callable[..., bool]]]
+        for pattern, entries in list(self.__listeners.items()):
+            if pattern == event_name or (_is_wildcard(pattern)
+                                         and fnmatch.fnmatchcase(
+                                             event_name, pattern)):
+                matching.extend((p, seq, pattern, fn)
+                                for p, seq, fn in entries)
+        matching.sort(key=lambda e: e[:2])
+        return [(pattern, fn) for _, _, pattern, fn in matching]
 
     def emit(self, event_name: str, **kwargs: Any):
         """Trigger all the event listeners registered for a given event name.
 
-        This dispatcher doesn't support listener priority, so the event
-        listeners are called in the order they've been registered.
-        Listeners can either inform the Dispatcher to continue the event
-        propagation, by returning True, or stop it by returning anything else
-        or nothing.
+        Listeners are called by priority, then in the order they've been
+        registered. Listeners can either inform the Dispatcher to continue the
+        event propagation, by returning True, or stop it by returning anything
+        else or nothing.
+
+        In async mode, the event is queued and this method returns right away
+        (unless the queue is full and the overflow policy is "block").
 
         Args:
             event_name (str): Name of the emitted event
             **kwargs: Any arguments associated with the event
         """
 
-        if event_name not in self.__listeners:
+        if not self.async_mode:
+            self._dispatch(event_name, kwargs)
             return
 
-        for fn in self.__listeners[event_name]:
-            if not fn(**kwargs):
+        self._start_worker()
+        try:
+            self._queue.put((event_name, kwargs),
+                            block=self.overflow == 'block')
+        except queue.Full:
+            self.dropped += 1
+
+    def _dispatch(self, event_name: str, kwargs: Dict[str, Any]):
+        for pattern, fn in self._matching(event_name):
+            args = kwargs
+            if pattern != event_name:
+                args = dict(kwargs, event_name=event_name)
+            if not fn(**args):
+                return
+
+    def _start_worker(self):
+        with self._lock:
+            if self._worker is not None:
                 return
+            self._worker = threading.Thread(target=self._work, daemon=True)
+            self._worker.start()
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._dispatch(*item)
+            except Exception as err:
+                self._errors.append(err)
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Wait until all the queued events have been dispatched. This is a
+        no-op in sync mode.
+
+        Raises:
+            Exception: The first exception raised by a listener called in the
+                background since the last flush.
+        """
+        if self._worker is not None:
+            self._queue.join()
+
+        if len(self._errors) > 0:
+            errors, self._errors = self._errors, []
+            raise errors[0]
+
+    def close(self):
+        """Dispatch the queued events and stop the background thread. It's
+        started again if more events are emitted.
+        """
+        with self._lock:
+            worker, self._worker = self._worker, None
+        if worker is None:
+            return
+
+        self._queue.put(None)
+        worker.join()
+        self.flush()
+
+
+def _is_wildcard(pattern: str) -> bool:
+    return any(c in pattern for c in '*?[')
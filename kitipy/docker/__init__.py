@@ -1,8 +1,16 @@
-from . import actions as docker_actions
-from . import filters as docker_filters
-from . import tasks as docker_tasks
+from ..lazy import lazy_attributes
 from .stack import BaseStack, ComposeStack, SwarmStack, load_stack
 
+__getattr__, __dir__ = lazy_attributes(
+    __name__, {
+        'actions': '.actions',
+        'filters': '.filters',
+        'tasks': '.tasks',
+        'docker_actions': '.actions',
+        'docker_filters': '.filters',
+        'docker_tasks': '.tasks',
+    })
+
 __all__ = [
     #from stack module
     'BaseStack',
@@ -11,6 +19,9 @@ __all__ = [
     'load_stack',
 
     # submodules
+    'actions',
+    'filters',
+    'tasks',
     'docker_actions',
     'docker_filters',
     'docker_tasks',
@@ -1,5 +1,6 @@
 import click
-from typing import Optional
+import subprocess
+from typing import Any, Dict, Optional
 
 
 class TaskError(click.ClickException):
@@ -17,3 +18,42 @@ class TaskError(click.ClickException):
                           fg='bright_white',
                           bg='red')
         click.echo(msg, file=file, color=color)
+
+
+class FanOutError(subprocess.CalledProcessError):
+    """FanOutError is raised when a command run on multiple hosts through
+    Executor.run_all() fails on at least one of them. As it inherits from
+    subprocess.CalledProcessError, it's handled by RootCommand like any other
+    failed command.
+    """
+    def __init__(self, cmd: str, results: Dict[str, Any]):
+        """
+        Args:
+            cmd (str):
+                The command that failed.
+            results (Dict[str, subprocess.CompletedProcess]):
+                Per-host results of the command, including the successful ones.
+        """
+        failed = [res for res in results.values() if res.returncode != 0]
+        super().__init__(failed[0].returncode, cmd)
+        self.results = results
+
+    def __str__(self):
+        failed = [
+            host for host, res in self.results.items() if res.returncode != 0
+        ]
+        return "Command '%s' failed on %d/%d hosts: %s." % (
+            self.cmd, len(failed), len(self.results), ', '.join(failed))
+
+
+class ParallelError(FanOutError):
+    """ParallelError is raised when at least one of the commands run through
+    Executor.local_many() fails.
+    """
+    def __str__(self):
+        failed = [
+            label for label, res in self.results.items()
+            if res.returncode != 0
+        ]
+        return '%d/%d commands failed: %s.' % (len(failed), len(
+            self.results), ', '.join(failed))
@@ -1,17 +1,34 @@
 import click
+import codecs
+import concurrent.futures
+import fnmatch
 import os.path
-import paramiko
 import random
 import select
+import selectors
+import shlex
 import shutil
+import signal
 import string
 import subprocess
 import sys
 import tempfile
+import threading
+import time
 from abc import ABC, abstractmethod
 from contextlib import contextmanager
-from typing import Any, Callable, Dict, Optional, Tuple, Union
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from .capture import CaptureBuffer
 from .dispatcher import Dispatcher
+from .exceptions import FanOutError, ParallelError
+from .lazy import lazy_import
+from .progress import TransferProgress
+from .remotefs import RemoteFS
+from .ssh import (ConnectionPool, ShellSession, get_connection_pool,
+                  quote_path)
+from .sync import SyncPlan, build_manifest, hash_file, parse_sha256sum, remote_manifest_cmd
+
+paramiko = lazy_import('paramiko')
 
 
 class BaseExecutor(ABC):
@@ -28,6 +45,7 @@ class BaseExecutor(ABC):
             encoding: Optional[str] = None,
             pipe: bool = False,
             check: bool = True,
+            tee: bool = False,
     ) -> subprocess.CompletedProcess:
         pass
 
@@ -43,13 +61,89 @@ class BaseExecutor(ABC):
             encoding: Optional[str] = None,
             pipe: bool = False,
             check: bool = True,
+            tee: bool = False,
     ) -> subprocess.CompletedProcess:
         pass
 
+    @abstractmethod
+    def run_stream(
+            self,
+            cmd: str,
+            env: Optional[Dict[str, str]] = None,
+            cwd: Optional[str] = None,
+            input: Optional[str] = None,
+            text: bool = True,
+            encoding: Optional[str] = None,
+            lines: bool = True,
+            tee: bool = False,
+            check: bool = True,
+    ) -> Iterator[Tuple[str, Union[str, bytes]]]:
+        pass
+
+    @abstractmethod
+    def run_all(
+            self,
+            cmd: str,
+            env: Optional[Dict[str, str]] = None,
+            cwd: Optional[str] = None,
+            input: Optional[str] = None,
+            text: bool = True,
+            encoding: Optional[str] = None,
+            pipe: bool = False,
+            check: bool = True,
+    ) -> 'FanOutResult':
+        pass
+
+    @abstractmethod
+    def local_many(
+            self,
+            cmds: Union[List[str], Dict[str, str]],
+            env: Optional[Dict[str, str]] = None,
+            cwd: Optional[str] = None,
+            concurrency: Optional[int] = None,
+            text: bool = True,
+            encoding: Optional[str] = None,
+            pipe: bool = False,
+            check: bool = True,
+            fail_fast: bool = False,
+    ) -> 'ParallelResult':
+        pass
+
     @abstractmethod
     def copy(self, local_path: str, remote_path: str):
         pass
 
+    @abstractmethod
+    def copy_many(self, paths: Dict[str, str], concurrency: int = 4):
+        pass
+
+    @abstractmethod
+    def fetch(self, remote_path: str, local_path: str, resume: bool = True):
+        pass
+
+    @abstractmethod
+    def copy_tree(self,
+                  local_dir: str,
+                  remote_dir: str,
+                  concurrency: int = 4):
+        pass
+
+    @abstractmethod
+    def upload_tree(self,
+                    local_dir: str,
+                    remote_dir: str,
+                    compression: Optional[str] = 'gzip',
+                    treeish: Optional[str] = None):
+        pass
+
+    @abstractmethod
+    def sync(self,
+             local_dir: str,
+             remote_dir: str,
+             delete: bool = False,
+             concurrency: int = 4) -> SyncPlan:
+        pass
+
     @abstractmethod
     def mkdtemp(self,
                 suffix: Optional[str] = None,
@@ -69,6 +163,11 @@ class BaseExecutor(ABC):
     def path_exists(self, path: str) -> bool:
         pass
 
+    @property
+    @abstractmethod
+    def fs(self) -> RemoteFS:
+        pass
+
     @property
     @abstractmethod
     def is_local(self) -> bool:
@@ -94,6 +193,11 @@ class BaseExecutor(ABC):
     def remote_cwd(self) -> Optional[str]:
         pass
 
+    @property
+    @abstractmethod
+    def hostnames(self) -> List[str]:
+        pass
+
     @abstractmethod
     def mkdir(self, path: str):
         pass
@@ -108,8 +212,16 @@ class Executor(BaseExecutor):
     SSH/SFTP client to do its job. Remote connections are lazily opened when
     the first command is run or when the first file is copied.
 
-    The SSH/SFTP connections are automatically closed when the executor got
-    destroyed.
+    SSH connections are borrowed from a ConnectionPool shared by all the
+    Executors of the process (see kitipy.ssh), such that executors targeting
+    the same host reuse the same connection. They're given back to the pool
+    when the executor got destroyed or closed. SFTP sessions are
+    automatically closed at the same time.
+
+    In remote mode, the Executor can also target a fleet of hosts: commands
+    run through run_all() are then executed on all of them concurrently. The
+    first host of the fleet is the primary host, where commands run through
+    run() and files copied through copy() land.
     """
 
     def __init__(self,
@@ -118,7 +230,12 @@ class Executor(BaseExecutor):
                  remote_basedir: Optional[str] = None,
                  hostname: Optional[str] = None,
                  ssh_config_file: str = '~/.ssh/config',
-                 paramiko_config: Dict[str, Any] = {}):
+                 paramiko_config: Dict[str, Any] = {},
+                 hostnames: Optional[List[str]] = None,
+                 concurrency: int = 10,
+                 connection_pool: Optional[ConnectionPool] = None,
+                 persistent_session: bool = False,
+                 output_limit: Optional[int] = None):
         """
         Args:
             basedir (str):
@@ -141,25 +258,97 @@ class Executor(BaseExecutor):
                 SSH connection. This is useful to tweak paramiko-specific 
                 parameters like look_for_key (which uses ~/.ssh/id_rsa if 
                 other authentication mechanisms don't work).
+            hostnames (Optional[List[str]]):
+                The SSH hostnames (or aliases) of the fleet targeted by
+                run_all(). Entries could also be ssh_config Host patterns
+                (e.g. "app-*"), in which case they're expanded into the
+                matching hosts declared in the ssh_config file. When no
+                hostname is provided, the first host of the fleet is used as
+                the primary host.
+            concurrency (int):
+                Maximum number of hosts run_all() talks to at the same time.
+            connection_pool (Optional[ConnectionPool]):
+                The pool SSH connections are borrowed from. The process-wide
+                pool is used by default.
+            persistent_session (bool):
+                Whether remote commands should be run through a single
+                long-lived shell session (see kitipy.ssh.ShellSession) instead
+                of opening a new SSH channel for each command. This is
+                particularly useful for tasks running lots of small commands.
+            output_limit (Optional[int]):
+                Maximum number of bytes of stdout/stderr captured for each
+                command run over SSH or in tee mode. Only the last
+                output_limit bytes are kept. The whole output is captured by
+                default.
         """
         self._ssh = None
         self._sftp = None
+        self._fs = None  # type: Optional[RemoteFS]
+        self._session = None  # type: Optional[ShellSession]
+        # Guards the lazy opening of the SSH/SFTP connections, as commands
+        # and transfers might be started concurrently from worker threads
+        # (see run_all() and kitipy.async_executor).
+        self._connection_lock = threading.RLock()
+        self._persistent_session = persistent_session
+        self._output_limit = output_limit
         self._local_basedir = local_basedir
         self._remote_basedir = remote_basedir
         self._dispatcher = dispatcher
         self._ssh_config = None  # type: Optional[Dict[str, str]]
+        self._ssh_config_file = ssh_config_file
+        self._paramiko_config = paramiko_config
         self._missing_host_key_policy = InteractiveWarningPolicy()
+        self._hostnames = []  # type: List[str]
+        self._fleet = {}  # type: Dict[str, Executor]
+        self._concurrency = concurrency
+        self._pool = connection_pool
+        if self._pool is None:
+            self._pool = get_connection_pool()
+
+        if hostnames:
+            self._hostnames = _expand_host_patterns(hostnames, ssh_config_file)
+        if hostname is None and len(self._hostnames) > 0:
+            hostname = self._hostnames[0]
+        if hostname is not None and hostname not in self._hostnames:
+            self._hostnames.insert(0, hostname)
+        self._hostname = hostname
 
         if hostname is not None:
             self._load_ssh_config(hostname, ssh_config_file, paramiko_config)
 
     def __del__(self):
-        """Close SSH/SFTP connections when the Executor is destroyed."""
+        """Close SSH/SFTP connections when the Executor is destroyed. Remote
+        temporary directories are not removed at this point, as the SSH
+        connection might not be usable anymore.
+        """
+        self._release_connections()
 
-        if self._ssh is not None:
-            self._ssh.close()
+    def close(self):
+        """Remove the temporary directories created through the remote
+        filesystem facade, close the SFTP session and give the SSH connection
+        back to the connection pool. The connection is re-acquired if the
+        Executor is used again afterwards.
+        """
+        if self._fs is not None:
+            self._fs.cleanup()
+        for executor in self._fleet.values():
+            executor.close()
+
+        self._release_connections()
+
+    def _release_connections(self):
         if self._sftp is not None:
             self._sftp.close()
+            self._sftp = None
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+        if self._ssh is not None:
+            self._pool.release(self._ssh)
+            self._ssh = None
+
+        for executor in self._fleet.values():
+            executor._release_connections()
 
     def _load_ssh_config(self, hostname: str, ssh_config_file: str,
                          paramiko_config: Dict[str, Any]):
@@ -187,7 +376,9 @@ class Executor(BaseExecutor):
 
         host_config = ssh_config.lookup(hostname)
         # @TODO: accept only a subset of all paramiko args (or it might be used to overwrite stage-specific parameters).
-        cfg = paramiko_config
+        # The paramiko config is copied as it's shared by all the hosts of a
+        # fleet.
+        cfg = dict(paramiko_config)
         # The hostname parameter for paramiko is defined here but it might be
         # rewritten by the loop below if it's just an alias to another
         # hostname. For instance, if a ssh_file declares a host "foobar.prod"
@@ -202,8 +393,10 @@ class Executor(BaseExecutor):
             if hk in host_config:
                 cfg[ck] = host_config[hk]
 
+        # The ProxyCommand is started by the connection pool only when the
+        # connection is actually opened.
         if 'proxycommand' in host_config:
-            cfg['sock'] = paramiko.ProxyCommand(host_config['proxycommand'])
+            cfg['proxycommand'] = host_config['proxycommand']
 
         if 'identityfile' in host_config:
             cfg['key_filename'] = []
@@ -225,7 +418,7 @@ class Executor(BaseExecutor):
         self._ssh_config = cfg
 
     def set_missing_host_key_policy(self,
-                                    policy: paramiko.MissingHostKeyPolicy):
+                                    policy: 'paramiko.MissingHostKeyPolicy'):
         """Set the missing_host_key_policy used by paramiko when it stumbles
         upon a server with an unknown signature.
 
@@ -246,10 +439,12 @@ class Executor(BaseExecutor):
             )
 
         self._missing_host_key_policy = policy
+        for executor in self._fleet.values():
+            executor.set_missing_host_key_policy(policy)
 
     # @TODO: manage private keys with passphrase
     @property
-    def ssh(self) -> paramiko.SSHClient:
+    def ssh(self) -> 'paramiko.SSHClient':
         """Get previously opened SSH connection or open it.
 
         Raises:
@@ -264,17 +459,15 @@ class Executor(BaseExecutor):
             raise RuntimeError(
                 "No SSH connection available: this is a local executor.")
 
-        if self._ssh == None:
-            client = paramiko.SSHClient()
-            client.load_system_host_keys()
-            client.set_missing_host_key_policy(self._missing_host_key_policy)
-            client.connect(**self._ssh_config)
-            self._ssh = client
+        with self._connection_lock:
+            if self._ssh == None:
+                self._ssh = self._pool.acquire(self._ssh_config,
+                                               self._missing_host_key_policy)
 
-        return self._ssh
+            return self._ssh
 
     @property
-    def sftp(self) -> paramiko.SFTPClient:
+    def sftp(self) -> 'paramiko.SFTPClient':
         """Get previously opened SFTP connection or open it.
 
         Raises:
@@ -289,11 +482,52 @@ class Executor(BaseExecutor):
             raise RuntimeError(
                 "No SFTP connection available: this is a local executor.")
 
-        if self._sftp == None:
-            # @TODO: test what happens when both ssh/sftp connections are open and executor got destroyed (does it fail to close both?)
-            self._sftp = self.ssh.open_sftp()
+        with self._connection_lock:
+            if self._sftp == None:
+                # @TODO: test what happens when both ssh/sftp connections are open and executor got destroyed (does it fail to close both?)
+                self._sftp = self.ssh.open_sftp()
+
+            return self._sftp
+
+    @property
+    def session(self) -> ShellSession:
+        """Get the shell session used to run remote commands when the
+        Executor runs in persistent session mode.
+
+        Raises:
+            RuntimeError: When the Executor is running in local mode.
+
+        Returns:
+            ShellSession: The shell session.
+        """
+        if self.is_local:
+            raise RuntimeError(
+                "No shell session available: this is a local executor.")
+
+        if self._session is None:
+            self._session = ShellSession(self.ssh)
+
+        return self._session
 
-        return self._sftp
+    @property
+    def fs(self) -> RemoteFS:
+        """Get the facade used to inspect and manipulate the remote filesystem
+        through the SFTP session (see kitipy.remotefs.RemoteFS).
+
+        Raises:
+            RuntimeError: When the Executor is running in local mode.
+
+        Returns:
+            RemoteFS: The remote filesystem facade.
+        """
+        if self.is_local:
+            raise RuntimeError(
+                "No remote filesystem available: this is a local executor.")
+
+        if self._fs is None:
+            self._fs = RemoteFS(self)
+
+        return self._fs
 
     def local(
             self,
@@ -306,6 +540,7 @@ class Executor(BaseExecutor):
             encoding: Optional[str] = None,
             pipe: bool = False,
             check: bool = True,
+            tee: bool = False,
     ) -> subprocess.CompletedProcess:
         """Run a command on local host.
         
@@ -344,6 +579,11 @@ class Executor(BaseExecutor):
             check (bool):
                 Check if the executed command returns exit code 0 or raise an
                 error otherwise.
+            tee (bool):
+                Whether the subprocess output should be both outputted to
+                kitipy stdout/stderr as it arrives and made available through
+                the returned subprocess.CompletedProcess. This takes
+                precedence over pipe.
         Raises:
             subprocess.SubprocessError: When check mode is enable and the
                 command returns an exit code > 0.
@@ -353,24 +593,38 @@ class Executor(BaseExecutor):
         """
         cwd = cwd or self._local_basedir
 
-        res = subprocess.run(cmd,
-                             env=env,
-                             cwd=cwd,
-                             shell=shell,
-                             input=input,
-                             text=text,
-                             encoding=encoding,
-                             stdout=subprocess.PIPE if pipe else None,
-                             stderr=subprocess.PIPE if pipe else None,
-                             check=check)
-
-        # Take care of initializing stdout/stderr to avoid dumb bugs. Also this
-        # is consistent with _remote() behavior (return empty strings when the
-        # command fail and check is False).
-        res.stdout = res.stdout if res.stdout else ''
-        res.stderr = res.stderr if res.stderr else ''
-
-        return res
+        with self._command_events(cmd, 'localhost', cwd, input) as event:
+            if tee:
+                encoding = encoding if encoding else sys.getdefaultencoding()
+                proc = _popen(cmd, env, cwd, shell, input, encoding)
+                stdout, stderr = _tee(_iter_process_chunks(proc), text,
+                                      encoding, self._output_limit)
+                returncode = proc.wait()
+                if check and returncode != 0:
+                    raise subprocess.CalledProcessError(
+                        returncode, cmd, stdout, stderr)
+                return event.done(
+                    subprocess.CompletedProcess(cmd, returncode, stdout,
+                                                stderr))
+
+            res = subprocess.run(cmd,
+                                 env=env,
+                                 cwd=cwd,
+                                 shell=shell,
+                                 input=input,
+                                 text=text,
+                                 encoding=encoding,
+                                 stdout=subprocess.PIPE if pipe else None,
+                                 stderr=subprocess.PIPE if pipe else None,
+                                 check=check)
+
+            # Take care of initializing stdout/stderr to avoid dumb bugs. Also
+            # this is consistent with _remote() behavior (return empty strings
+            # when the command fail and check is False).
+            res.stdout = res.stdout if res.stdout else ''
+            res.stderr = res.stderr if res.stderr else ''
+
+            return event.done(res)
 
     def _remote(
             self,
@@ -382,6 +636,8 @@ class Executor(BaseExecutor):
             encoding: Optional[str] = None,
             pipe: bool = False,
             check: bool = True,
+            tee: bool = False,
+            invalidate: bool = True,
     ) -> subprocess.CompletedProcess:
         """Run a command on remote host.
 
@@ -408,6 +664,13 @@ class Executor(BaseExecutor):
             check (bool):
                 Check if the executed command returns exit code 0 or raise an
                 error otherwise.
+            tee (bool):
+                Whether the command output should be both outputted to kitipy
+                stdout/stderr as it arrives and made available through the
+                returned subprocess.CompletedProcess.
+            invalidate (bool):
+                Whether the stat results cached by the RemoteFS should be
+                dropped. Only read-only commands should disable it.
 
         Raises:
             RuntimeError: When the Executor is running in local mode.
@@ -427,68 +690,126 @@ class Executor(BaseExecutor):
                 % (cmd))
 
         cwd = cwd or self._remote_basedir
-        if cwd:
-            self.ssh.exec_command('cd ' + cwd)
 
-        sin, sout, serr = self.ssh.exec_command(cmd, environment=env)
-        channel = sin.channel
+        with self._command_events(cmd, self._hostname, cwd, input) as event:
+            # Commands with an input can't go through the session as their
+            # input would be mixed with the session script.
+            if self._persistent_session and input is None and not tee:
+                if invalidate:
+                    self._invalidate_fs()
+                return event.done(
+                    self.session.run(cmd,
+                                     env=env,
+                                     cwd=cwd,
+                                     text=text,
+                                     encoding=encoding,
+                                     pipe=pipe,
+                                     max_size=self._output_limit))
+
+            channel = self._exec_remote(cmd, env, cwd, input, invalidate)
+
+            encoding = encoding if encoding else sys.getdefaultencoding()
+            try:
+                if pipe and not tee:
+                    stdout, stderr = _capture(_iter_channel_chunks(channel),
+                                              text, encoding,
+                                              self._output_limit)
+                elif tee:
+                    stdout, stderr = _tee(_iter_channel_chunks(channel), text,
+                                          encoding, self._output_limit)
+                else:
+                    for _ in _output(_iter_channel_chunks(channel), text,
+                                     encoding):
+                        pass
+                    stdout, stderr = ('', '') if text else (b'', b'')
+
+                returncode = channel.recv_exit_status()
+            finally:
+                channel.close()
 
-        if input is not None:
-            sin.write(input)
+            return event.done(
+                subprocess.CompletedProcess(cmd, returncode, stdout, stderr))
 
-        # We don't need stdin anymore, close it
-        sin.close()
-        channel.shutdown_write()
-
-        encoding = encoding if encoding else sys.getdefaultencoding()
-        stdout, stderr = self._read_ssh_chunks(channel, text, encoding, pipe)
-        while not channel.closed or channel.recv_ready(
-        ) or channel.recv_stderr_ready():
-            rlist, _, _ = select.select([channel], [], [])
-
-            if len(rlist) > 0:
-                chunks = self._read_ssh_chunks(channel, text, encoding, pipe)
-                stdout += chunks[0]  # type: ignore
-                stderr += chunks[1]  # type: ignore
-
-            if channel.exit_status_ready(
-            ) and not channel.recv_ready() and not channel.recv_stderr_ready():
-                channel.shutdown_read()
+    def _remote_prefixed(self, cmd: str, env: Optional[Dict[str, str]],
+                         cwd: Optional[str], input: Optional[str], text: bool,
+                         encoding: str, output: '_PrefixedOutput'
+                         ) -> subprocess.CompletedProcess:
+        """Run a command on remote host and output it through the given
+        _PrefixedOutput, such that the output of concurrent hosts doesn't get
+        interleaved. The output is captured as well.
+        """
+        with self._command_events(cmd, self._hostname, cwd, input) as event:
+            channel = self._exec_remote(cmd, env, cwd, input)
+            try:
+                chunks = output.stream(self._hostname,
+                                       _iter_channel_chunks(channel))
+                stdout, stderr = _capture(chunks, text, encoding,
+                                          self._output_limit)
+                returncode = channel.recv_exit_status()
+            finally:
                 channel.close()
-                break
 
-        sout.close()
-        serr.close()
+            return event.done(
+                subprocess.CompletedProcess(cmd, returncode, stdout, stderr))
 
-        returncode = sin.channel.recv_exit_status()
-        return subprocess.CompletedProcess(cmd, returncode, stdout, stderr)
+    @contextmanager
+    def _command_events(self, cmd: str, host: Optional[str],
+                        cwd: Optional[str], input: Optional[str]):
+        """Emit command.start and command.end events around the execution of
+        a command. See kitipy.metrics for the details of these events.
+        """
+        info = {'cmd': cmd, 'host': host, 'cwd': cwd}
+        self._dispatcher.emit('command.start', **info)
 
-    def _read_ssh_chunks(
-            self,
-            channel: paramiko.channel.Channel,
-            text: bool,
-            encoding: str,
-            pipe: bool,
-    ) -> Tuple[Union[bytes, str], Union[bytes, str]]:
-        stdout_chunk = b''  # type: Union[bytes, str]
-        stderr_chunk = b''  # type: Union[bytes, str]
+        event = _CommandEvent(time.time(), _byte_size(input))
+        try:
+            yield event
+        except subprocess.CalledProcessError as err:
+            event.done(
+                subprocess.CompletedProcess(cmd, err.returncode, err.stdout,
+                                            err.stderr))
+            raise
+        finally:
+            self._dispatcher.emit('command.end',
+                                  start=event.start,
+                                  duration=time.time() - event.start,
+                                  returncode=event.returncode,
+                                  bytes_in=event.bytes_in,
+                                  bytes_out=event.bytes_out,
+                                  **info)
+
+    def _invalidate_fs(self):
+        # Commands might change anything on the remote filesystem, so the
+        # stat results cached by the RemoteFS can't be trusted anymore.
+        if self._fs is not None:
+            self._fs.invalidate()
+
+    def _exec_remote(self,
+                     cmd: str,
+                     env: Optional[Dict[str, str]],
+                     cwd: Optional[str],
+                     input: Optional[str],
+                     invalidate: bool = True) -> 'paramiko.Channel':
+        """Start a command on a new SSH channel, write its input and close its
+        stdin.
+        """
+        if invalidate:
+            self._invalidate_fs()
+        remote_cmd = cmd
+        if cwd:
+            remote_cmd = 'cd %s || exit 1\n%s' % (quote_path(cwd), cmd)
 
-        if channel.recv_ready():
-            stdout_chunk = channel.recv(len(channel.in_buffer))
-        if channel.recv_stderr_ready():
-            stderr_chunk = channel.recv_stderr(len(channel.in_stderr_buffer))
+        sin, _, _ = self.ssh.exec_command(remote_cmd, environment=env)
+        channel = sin.channel
 
-        if text:
-            stdout_chunk = stdout_chunk.decode(encoding)  # type: ignore
-            stderr_chunk = stderr_chunk.decode(encoding)  # type: ignore
+        if input is not None:
+            sin.write(input)
 
-        if not pipe:
-            print(stdout_chunk, file=sys.stdout, end='')
-            print(stderr_chunk, file=sys.stderr, end='')
-            stdout_chunk = ''
-            stderr_chunk = ''
+        # We don't need stdin anymore, close it
+        sin.close()
+        channel.shutdown_write()
 
-        return (stdout_chunk, stderr_chunk)
+        return channel
 
     # @TODO: cmd signature have to be changed to accept list too (due to shell opts)
     def run(
@@ -502,6 +823,7 @@ class Executor(BaseExecutor):
             encoding: Optional[str] = None,
             pipe: bool = False,
             check: bool = True,
+            tee: bool = False,
     ) -> subprocess.CompletedProcess:
         """This method is the way to ubiquitously run a command on either local
         or remote target, depending on how the executor was set. More precisely, 
@@ -539,6 +861,11 @@ class Executor(BaseExecutor):
             check (bool):
                 Check if the executed command returns exit code 0 or raise an
                 error otherwise.
+            tee (bool):
+                Whether the subprocess output should be both outputted to
+                kitipy stdout/stderr as it arrives and made available through
+                the returned subprocess.CompletedProcess. This takes
+                precedence over pipe.
         Raises:
             RuntimeError: When the Executor is running in local mode.
             
@@ -554,11 +881,13 @@ class Executor(BaseExecutor):
         if self.is_remote:
             return self._remote(cmd,
                                 env=env,
+                                cwd=cwd,
                                 input=input,
                                 text=text,
                                 encoding=encoding,
                                 pipe=pipe,
-                                check=check)
+                                check=check,
+                                tee=tee)
 
         return self.local(cmd,
                           env=env,
@@ -568,7 +897,366 @@ class Executor(BaseExecutor):
                           text=text,
                           encoding=encoding,
                           pipe=pipe,
-                          check=check)
+                          check=check,
+                          tee=tee)
+
+    def run_stream(
+            self,
+            cmd: str,
+            env: Optional[Dict[str, str]] = None,
+            cwd: Optional[str] = None,
+            input: Optional[str] = None,
+            text: bool = True,
+            encoding: Optional[str] = None,
+            lines: bool = True,
+            tee: bool = False,
+            check: bool = True,
+    ) -> Iterator[Tuple[str, Union[str, bytes]]]:
+        """Run a command on either local or remote target, depending on how
+        the executor was set, and yield its output as it arrives. This is
+        useful to react to the output of long-running commands (e.g. to tail
+        logs or to follow a migration) while they're still running.
+
+        The command is started when the first item is requested. If the
+        generator is closed before the command completes, the command is
+        killed (or its SSH channel closed in remote mode).
+
+        In remote mode, the command always runs on its own SSH channel, even
+        if the Executor runs in persistent session mode.
+
+        Args:
+            cmd (str):
+                Command and args to run.
+            env (Optional[Dict[str, str]]):
+                Env vars used to run the given cmd.
+            cwd (Optional[str]):
+                Working directory where the command should be run.
+            input (Optional[str]):
+                Standard input of the command.
+            text (bool):
+                Whether the output should be decoded into strings using
+                encoding parameter or kept in binary format.
+            encoding (Optional[str]):
+                Determine the encoding used to convert streams from/to binary
+                format.
+            lines (bool):
+                Whether the output should be yielded line by line (line
+                endings included), or in chunks as they're received.
+            tee (bool):
+                Whether the output should also be outputted to kitipy
+                stdout/stderr.
+            check (bool):
+                Check if the executed command returns exit code 0 or raise an
+                error once its output has been consumed.
+
+        Raises:
+            subprocess.CalledProcessError: When check mode is enabled and the
+                command returns an exit code > 0.
+
+        Returns:
+            Iterator[Tuple[str, Union[str, bytes]]]:
+                Tuples made of the name of the stream (either "stdout" or
+                "stderr") and the data read from that stream.
+        """
+        encoding = encoding if encoding else sys.getdefaultencoding()
+        decoder = _StreamDecoder(text, encoding, lines)
+
+        if self.is_remote:
+            cwd = cwd or self._remote_basedir
+            host = self._hostname
+        else:
+            cwd = cwd or self._local_basedir
+            host = 'localhost'
+
+        with self._command_events(cmd, host, cwd, input) as event:
+            if self.is_remote:
+                channel = self._exec_remote(cmd, env, cwd, input)
+                chunks = _iter_channel_chunks(channel)
+                wait = channel.recv_exit_status  # type: Callable[[], int]
+                stop = channel.close  # type: Callable[[], Any]
+            else:
+                proc = _popen(cmd, env, cwd, True, input, encoding)
+                chunks = _iter_process_chunks(proc)
+                wait = proc.wait
+                stop = lambda: (proc.kill(), proc.wait())
+
+            returncode = None
+            bytes_out = 0
+            try:
+                for stream, chunk in chunks:
+                    bytes_out += len(chunk)
+                    for data in decoder.feed(stream, chunk):
+                        if tee:
+                            _write_output(stream, data)
+                        yield (stream, data)
+
+                for stream, data in decoder.flush():
+                    if tee:
+                        _write_output(stream, data)
+                    yield (stream, data)
+
+                returncode = wait()
+            finally:
+                if returncode is None:
+                    stop()
+
+            event.done(subprocess.CompletedProcess(cmd, returncode))
+            # The output isn't kept, so its size is counted as it's read.
+            event.bytes_out = bytes_out
+
+        if check and returncode != 0:
+            raise subprocess.CalledProcessError(returncode, cmd)
+
+    def run_all(
+            self,
+            cmd: str,
+            env: Optional[Dict[str, str]] = None,
+            cwd: Optional[str] = None,
+            input: Optional[str] = None,
+            text: bool = True,
+            encoding: Optional[str] = None,
+            pipe: bool = False,
+            check: bool = True,
+    ) -> 'FanOutResult':
+        """Run a command on all the hosts of the fleet targeted by this
+        Executor. Hosts are reached concurrently through a thread pool, with at
+        most `concurrency` hosts at the same time. In local mode, the command
+        is run once on the local host.
+
+        Unlike run(), the command is run on every host even if it fails on
+        some of them, such that you get the full picture of the fleet.
+
+        Args:
+            cmd (str):
+                Command and args to run.
+            env (Optional[Dict[str, str]]):
+                Env vars used to run the given cmd.
+            cwd (Optional[str]):
+                Working directory where the command should be run.
+            input (Optional[str]):
+                Standard input of the command, written on every host.
+            text (bool):
+                Whether stdin/stdout/stderr streams should be converted from/into
+                strings using encoding parameter or kept in binary format.
+            encoding (Optional[str]):
+                Determine the encoding used to convert streams from/to binary format.
+            pipe (bool):
+                Whether the output of the commands should only be captured
+                (when True), or also outputted to kitipy stdout/stderr (when
+                False). In the latter case, the output of remote hosts is
+                outputted line by line, each line being prefixed by its host.
+            check (bool):
+                Check if the executed command returns exit code 0 on all hosts
+                or raise an error otherwise.
+
+        Raises:
+            kitipy.FanOutError: When check mode is enabled and the command
+                fails on at least one host.
+
+        Returns:
+            FanOutResult: The result of the command on each host.
+        """
+        if self.is_local:
+            res = self.local(cmd,
+                             env=env,
+                             cwd=cwd,
+                             input=input,
+                             text=text,
+                             encoding=encoding,
+                             pipe=pipe,
+                             check=False)
+            results = FanOutResult(cmd, {'localhost': res})
+        else:
+            cwd = cwd or self._remote_basedir
+            encoding = encoding if encoding else sys.getdefaultencoding()
+            output = None if pipe else _PrefixedOutput(self._hostnames,
+                                                       encoding)
+
+            def run_on(hostname: str) -> subprocess.CompletedProcess:
+                executor = self._host_executor(hostname)
+                try:
+                    if output is None:
+                        return executor._remote(cmd,
+                                                env=env,
+                                                cwd=cwd,
+                                                input=input,
+                                                text=text,
+                                                encoding=encoding,
+                                                pipe=True,
+                                                check=False)
+                    return executor._remote_prefixed(cmd, env, cwd, input,
+                                                     text, encoding, output)
+                except (paramiko.SSHException, OSError) as err:
+                    # Like OpenSSH client, connection errors are reported with
+                    # exit code 255.
+                    return subprocess.CompletedProcess(cmd, 255, '', str(err))
+
+            workers = max(1, min(self._concurrency, len(self._hostnames)))
+            with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+                futures = [(hostname, pool.submit(run_on, hostname))
+                           for hostname in self._hostnames]
+                results = FanOutResult(
+                    cmd, {host: f.result()
+                          for host, f in futures})
+
+        if check:
+            results.check_returncode()
+
+        return results
+
+    def local_many(
+            self,
+            cmds: Union[List[str], Dict[str, str]],
+            env: Optional[Dict[str, str]] = None,
+            cwd: Optional[str] = None,
+            concurrency: Optional[int] = None,
+            text: bool = True,
+            encoding: Optional[str] = None,
+            pipe: bool = False,
+            check: bool = True,
+            fail_fast: bool = False,
+    ) -> 'ParallelResult':
+        """Run many commands on local host in parallel, with at most
+        `concurrency` commands at the same time.
+
+        Unless pipe is True, the output of each command is streamed to kitipy
+        stdout/stderr line by line as it arrives, prefixed by the label of the
+        command in its own color, such that the outputs of concurrent commands
+        don't get mixed up. In both cases, the output of each command is
+        captured and made available through the returned results.
+
+            results = kctx.local_many({
+                'lint': 'yapf --diff -r kitipy/',
+                'test': 'pytest tests/',
+            })
+
+        Args:
+            cmds (Union[List[str], Dict[str, str]]):
+                The commands to run. It's either a list of commands, in which
+                case each command is its own label, or a dict of commands
+                indexed by their label.
+            env (Optional[Dict[str, str]]):
+                Env vars used to run the commands.
+            cwd (Optional[str]):
+                Working directory where the commands should be run.
+            concurrency (Optional[int]):
+                Maximum number of commands running at the same time. Defaults
+                to the number of CPUs.
+            text (bool):
+                Whether stdout/stderr streams should be converted into strings
+                using encoding parameter or kept in binary format.
+            encoding (Optional[str]):
+                Determine the encoding used to convert streams from binary format.
+            pipe (bool):
+                Whether the output of the commands should only be captured
+                (when True), or also outputted to kitipy stdout/stderr (when
+                False).
+            check (bool):
+                Check if all the commands return exit code 0 or raise an error
+                otherwise.
+            fail_fast (bool):
+                Whether the remaining commands should be cancelled as soon as
+                one fails (when True), or run to completion (when False).
+                Cancelled commands that were already running are terminated
+                and those not started yet are reported in the skipped
+                attribute of the returned results.
+
+        Raises:
+            kitipy.ParallelError: When check mode is enabled and at least one
+                command fails.
+
+        Returns:
+            ParallelResult: The result of each command, indexed by its label.
+        """
+        if not isinstance(cmds, dict):
+            cmds = {cmd: cmd for cmd in cmds}
+
+        cwd = cwd or self._local_basedir
+        encoding = encoding if encoding else sys.getdefaultencoding()
+        output = None if pipe else _PrefixedOutput(list(cmds.keys()), encoding)
+        running = {}  # type: Dict[str, subprocess.Popen]
+        lock = threading.Lock()
+        cancelled = threading.Event()
+
+        def cancel():
+            cancelled.set()
+            for proc in running.values():
+                _terminate(proc)
+
+        def run_one(label: str) -> Optional[subprocess.CompletedProcess]:
+            if cancelled.is_set():
+                return None
+
+            cmd = cmds[label]
+            with self._command_events(cmd, 'localhost', cwd, None) as event:
+                proc = _popen(cmd, env, cwd, True, None, encoding, True)
+                with lock:
+                    running[label] = proc
+                    if cancelled.is_set():
+                        _terminate(proc)
+
+                chunks = _iter_process_chunks(proc)
+                if output is not None:
+                    chunks = output.stream(label, chunks)
+                stdout, stderr = _capture(chunks, text, encoding,
+                                          self._output_limit)
+                returncode = proc.wait()
+
+                with lock:
+                    del running[label]
+                    if returncode != 0 and fail_fast:
+                        cancel()
+
+                return event.done(
+                    subprocess.CompletedProcess(cmd, returncode, stdout,
+                                                stderr))
+
+        workers = max(1, min(concurrency or os.cpu_count() or 1, len(cmds)))
+        with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+            futures = [(label, pool.submit(run_one, label)) for label in cmds]
+            try:
+                completed = [(label, f.result()) for label, f in futures]
+            except BaseException:
+                # Commands run in their own session, so they don't receive
+                # the signals sent to kitipy (e.g. on Ctrl+C).
+                with lock:
+                    cancel()
+                raise
+
+        results = ParallelResult(
+            '; '.join(cmds.values()),
+            {label: res
+             for label, res in completed if res is not None},
+            [label for label, res in completed if res is None])
+
+        if check:
+            results.check_returncode()
+
+        return results
+
+    def _host_executor(self, hostname: str) -> 'Executor':
+        """Get the Executor used to reach a given host of the fleet. The
+        current Executor is used for its primary host whereas other hosts get
+        their own Executor, with their own SSH connection.
+        """
+        if hostname == self._hostname:
+            return self
+
+        if hostname not in self._fleet:
+            executor = Executor(self._dispatcher,
+                                local_basedir=self._local_basedir,
+                                remote_basedir=self._remote_basedir,
+                                hostname=hostname,
+                                ssh_config_file=self._ssh_config_file,
+                                paramiko_config=self._paramiko_config,
+                                connection_pool=self._pool,
+                                persistent_session=self._persistent_session,
+                                output_limit=self._output_limit)
+            executor.set_missing_host_key_policy(
+                self._missing_host_key_policy)
+            self._fleet[hostname] = executor
+
+        return self._fleet[hostname]
 
     def copy(self, local_path: str, remote_path: str):
         """This method transfers files from your computer to a remote target.
@@ -580,6 +1268,332 @@ class Executor(BaseExecutor):
             local_path (str): Path to the file to transfer.
             remote_path (str): Destination path on the remote target.
         """
+        local_fullpath, remote_fullpath = self._transfer_paths(
+            local_path, remote_path)
+
+        if self.is_local:
+            shutil.copy(local_fullpath, remote_fullpath)
+            return
+
+        size = os.path.getsize(local_fullpath)
+        label = "Transfer %s to %s" % (local_path, remote_path)
+        try:
+            with TransferProgress(self._dispatcher, size, label) as progress:
+                self.sftp.put(local_fullpath,
+                              remote_fullpath,
+                              callback=progress.callback())
+        finally:
+            self._invalidate_fs()
+
+    def fetch(self, remote_path: str, local_path: str, resume: bool = True):
+        """This method transfers a file from a remote target to your
+        computer.
+
+        The file is read through SFTP prefetching, which sends many read
+        requests in parallel instead of waiting for each chunk. When the
+        local file already exists, it's compared with the remote one through
+        their SHA-256 digests: the transfer is skipped if they're identical,
+        and resumed where it stopped if the local file is the beginning of
+        the remote one.
+
+        This method uses the dispatcher to emit events in order to let the UI
+        display what's going on.
+
+        Args:
+            remote_path (str): Path to the file on the remote target.
+            local_path (str): Destination path on your computer.
+            resume (bool):
+                Whether partially downloaded files should be resumed. When
+                False, the file is always transferred from its beginning.
+        """
+        local_fullpath, remote_fullpath = self._transfer_paths(
+            local_path, remote_path)
+
+        if self.is_local:
+            shutil.copy(remote_fullpath, local_fullpath)
+            return
+
+        size = self.sftp.stat(remote_fullpath).st_size
+        offset = 0
+        if resume and os.path.exists(local_fullpath):
+            offset = self._resume_offset(remote_fullpath, local_fullpath, size)
+        if offset == size and size > 0:
+            return
+
+        label = "Transfer %s to %s" % (remote_path, local_path)
+        with TransferProgress(self._dispatcher, size, label,
+                              initial=offset) as progress:
+            with open(local_fullpath, 'ab') as dest:
+                dest.truncate(offset)
+
+            with self.sftp.open(remote_fullpath, 'rb') as src, \
+                    open(local_fullpath, 'r+b') as dest:
+                src.seek(offset)
+                dest.seek(offset)
+                src.prefetch(size)
+
+                current = offset
+                while current < size:
+                    chunk = src.read(min(size - current, 1024 * 1024))
+                    if not chunk:
+                        break
+                    dest.write(chunk)
+                    current += len(chunk)
+                    progress.advance(len(chunk))
+
+    def _resume_offset(self, remote_fullpath: str, local_fullpath: str,
+                       size: int) -> int:
+        """Find where the download of a file should start from, depending on
+        what's already in the local file.
+        """
+        local_size = os.path.getsize(local_fullpath)
+        if local_size == 0 or local_size > size:
+            return 0
+
+        res = self._remote('head -c %d %s | sha256sum' %
+                           (local_size, shlex.quote(remote_fullpath)),
+                           pipe=True)
+        if res.stdout.split(' ')[0] != hash_file(local_fullpath):
+            return 0
+        return local_size
+
+    def copy_many(self, paths: Dict[str, str], concurrency: int = 4):
+        """Transfer many files from your computer to a remote target at once.
+
+        Remote directories are created upfront with a single command. Files
+        are then distributed over several SFTP channels opened on the same SSH
+        connection, such that the round trips needed to open and close each
+        file overlap. A single progress bar covering all the files is reported
+        through the dispatcher.
+
+        Args:
+            paths (Dict[str, str]):
+                Destination path on the remote target, keyed by the path of
+                the file to transfer.
+            concurrency (int):
+                Number of SFTP channels used in parallel.
+
+        Raises:
+            paramiko.SSHException: When the transfer of a file fails. Other
+                transfers are stopped as soon as possible.
+        """
+        files = [self._transfer_paths(l, r) for l, r in paths.items()]
+        if len(files) == 0:
+            return
+
+        if self.is_local:
+            for local_fullpath, remote_fullpath in files:
+                os.makedirs(os.path.dirname(remote_fullpath) or '.',
+                            exist_ok=True)
+                shutil.copy(local_fullpath, remote_fullpath)
+            return
+
+        self._remote_batch('mkdir -p',
+                           set(os.path.dirname(r) for _, r in files))
+
+        size = sum(os.path.getsize(l) for l, _ in files)
+        label = "Transfer %d files" % (len(files))
+
+        lock = threading.Lock()
+        failed = threading.Event()
+        queue = list(reversed(files))
+
+        def worker(progress: TransferProgress):
+            sftp = self.ssh.open_sftp()
+            try:
+                while not failed.is_set():
+                    with lock:
+                        if len(queue) == 0:
+                            return
+                        local_fullpath, remote_fullpath = queue.pop()
+
+                    sftp.put(local_fullpath,
+                             remote_fullpath,
+                             callback=progress.callback())
+            except Exception:
+                failed.set()
+                raise
+            finally:
+                sftp.close()
+
+        workers = min(max(1, concurrency), len(files))
+        try:
+            with TransferProgress(self._dispatcher, size, label) as progress:
+                with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+                    futures = [
+                        pool.submit(worker, progress) for _ in range(workers)
+                    ]
+                    for future in futures:
+                        future.result()
+        finally:
+            self._invalidate_fs()
+
+    def copy_tree(self,
+                  local_dir: str,
+                  remote_dir: str,
+                  concurrency: int = 4):
+        """Transfer a whole directory from your computer to a remote target.
+        See copy_many().
+
+        Args:
+            local_dir (str): Path to the directory to transfer.
+            remote_dir (str): Destination directory on the remote target.
+            concurrency (int): Number of SFTP channels used in parallel.
+        """
+        local_fullpath, _ = self._transfer_paths(local_dir, remote_dir)
+
+        paths = {}  # type: Dict[str, str]
+        for dirpath, _, filenames in os.walk(local_fullpath):
+            relpath = os.path.relpath(dirpath, local_fullpath)
+            for filename in filenames:
+                dest = os.path.normpath(
+                    os.path.join(remote_dir, relpath, filename))
+                paths[os.path.join(dirpath, filename)] = dest
+
+        self.copy_many(paths, concurrency)
+
+    def upload_tree(self,
+                    local_dir: str,
+                    remote_dir: str,
+                    compression: Optional[str] = 'gzip',
+                    treeish: Optional[str] = None):
+        """Transfer a whole directory tree as a single tar stream.
+
+        The archive is generated on the fly and piped into `tar -x` running
+        on the remote target over a single SSH channel, such that no
+        temporary archive is written on either side. This is much faster than
+        copy_tree() for trees made of lots of small files, but everything is
+        transferred each time (see sync() for incremental transfers).
+
+        Args:
+            local_dir (str):
+                Path to the directory to transfer, or to the Git repository
+                when treeish is provided.
+            remote_dir (str):
+                Destination directory on the remote target. It's created if it
+                doesn't exist.
+            compression (Optional[str]):
+                Either gzip (the default), zstd or None. The matching tool has
+                to be available on both sides.
+            treeish (Optional[str]):
+                A Git tree-ish (e.g. a tag or a commit) to transfer instead of
+                the working copy. The archive is then generated through
+                `git archive`.
+
+        Raises:
+            ValueError: When the compression is not supported.
+            subprocess.CalledProcessError: When either the archive could not
+                be generated or extracted.
+        """
+        if compression not in _TAR_COMPRESSORS:
+            raise ValueError('Compression "%s" is not supported.' %
+                             (compression))
+        compress, decompress = _TAR_COMPRESSORS[compression]
+
+        local_fullpath, remote_fullpath = self._transfer_paths(
+            local_dir, remote_dir)
+
+        source = ['tar', '-cf', '-', '.']
+        if treeish is not None:
+            source = ['git', 'archive', '--format=tar', treeish]
+        cmds = [source] + ([compress] if compress else [])
+
+        extract = 'tar -xf - -C %s' % (shlex.quote(remote_fullpath))
+        if decompress:
+            extract = '%s | %s' % (' '.join(decompress), extract)
+        extract = 'mkdir -p %s && %s' % (shlex.quote(remote_fullpath),
+                                         extract)
+
+        # The stderr of the last producer is read along with its stdout, the
+        # other ones are drained in background threads: a producer blocked on
+        # a full stderr pipe would stall the whole pipeline.
+        producers = []  # type: List[subprocess.Popen]
+        drains = []  # type: List[Tuple[threading.Thread, List[bytes]]]
+        for cmd in cmds:
+            stdin = producers[-1].stdout if len(producers) > 0 else None
+            producers.append(
+                subprocess.Popen(cmd,
+                                 cwd=local_fullpath,
+                                 stdin=stdin,
+                                 stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE))
+            if stdin is not None:
+                stdin.close()
+        for proc in producers[:-1]:
+            chunks = []  # type: List[bytes]
+            drain = threading.Thread(target=_drain,
+                                     args=(proc.stderr, chunks),
+                                     daemon=True)
+            drain.start()
+            drains.append((drain, chunks))
+
+        if self.is_local:
+            sink = subprocess.Popen(extract,
+                                    shell=True,
+                                    stdin=subprocess.PIPE,
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT)
+            write = sink.stdin.write  # type: Callable[[bytes], Any]
+        else:
+            channel = self.ssh.get_transport().open_session()
+            channel.set_combine_stderr(True)
+            channel.exec_command(extract)
+            write = channel.sendall
+
+        try:
+            errors = []  # type: List[bytes]
+            write_error = None  # type: Optional[OSError]
+            try:
+                for stream, chunk in _iter_process_chunks(producers[-1]):
+                    if stream == 'stdout':
+                        write(chunk)
+                    else:
+                        errors.append(chunk)
+            except OSError as err:
+                # The extraction likely ended early, in which case the error
+                # is reported below through its exit code and output.
+                write_error = err
+                for proc in producers:
+                    proc.kill()
+            else:
+                for drain, chunks in drains:
+                    drain.join()
+                    errors.extend(chunks)
+                for proc in producers:
+                    if proc.wait() != 0:
+                        raise subprocess.CalledProcessError(
+                            proc.returncode, proc.args, b'',
+                            b''.join(errors))
+
+            if self.is_local:
+                output, _ = sink.communicate()
+                returncode = sink.returncode
+            else:
+                channel.shutdown_write()
+                output, _ = _capture(_iter_channel_chunks(channel), False,
+                                     '')
+                returncode = channel.recv_exit_status()
+
+            if returncode != 0:
+                raise subprocess.CalledProcessError(
+                    returncode, extract, output, b'') from write_error
+            if write_error is not None:
+                raise write_error
+        finally:
+            for proc in producers:
+                if proc.poll() is None:
+                    proc.kill()
+                    proc.wait()
+            if self.is_local:
+                if sink.poll() is None:
+                    sink.kill()
+                    sink.wait()
+            else:
+                channel.close()
+                self._invalidate_fs()
+
+    def _transfer_paths(self, local_path: str,
+                        remote_path: str) -> Tuple[str, str]:
         local_fullpath = local_path
         remote_fullpath = remote_path
         if not os.path.isabs(local_fullpath) and self._local_basedir:
@@ -587,22 +1601,86 @@ class Executor(BaseExecutor):
         if not os.path.isabs(remote_fullpath) and self._remote_basedir:
             remote_fullpath = os.path.join(self._remote_basedir,
                                            remote_fullpath)
+        return (local_fullpath, remote_fullpath)
 
-        if self.is_local:
-            shutil.copy(local_fullpath, remote_fullpath)
-            return
+    def sync(self,
+             local_dir: str,
+             remote_dir: str,
+             delete: bool = False,
+             concurrency: int = 4) -> SyncPlan:
+        """Make a remote directory identical to a local one, by transferring
+        only the files that are missing or have changed on the remote target.
 
-        size = os.path.getsize(local_path)
-        label = "Transfer %s to %s" % (local_path, remote_path)
-        self._dispatcher.emit('file_transfer.start', size=size, label=label)
+        Files are compared through the SHA-256 digest of their content. The
+        digests of the local files are cached between runs (see
+        kitipy.sync.build_manifest()), and the digests of the remote files
+        are fetched with a single command.
 
-        fn = lambda current, total: self._dispatcher.emit(
-            'file_transfer.update', current=current, total=total)
+        Args:
+            local_dir (str): Path to the directory to transfer.
+            remote_dir (str): Destination directory on the remote target.
+            delete (bool):
+                Whether remote files that don't exist locally should be
+                deleted.
+            concurrency (int): Number of SFTP channels used in parallel.
 
-        try:
-            self.sftp.put(local_fullpath, remote_fullpath, callback=fn)
-        finally:
-            self._dispatcher.emit('file_transfer.end')
+        Returns:
+            SyncPlan: The files uploaded and deleted, relative to remote_dir.
+        """
+        local_fullpath, remote_fullpath = self._transfer_paths(
+            local_dir, remote_dir)
+
+        # kitipy.cache depends on this module, hence the late import.
+        from .cache import cache_dir
+
+        local = build_manifest(local_fullpath, cache_dir('sync'))
+        if self.is_local:
+            remote = build_manifest(remote_fullpath)
+        else:
+            # The manifest is streamed rather than captured, as the captured
+            # output is truncated to the output_limit.
+            chunks = self.run_stream(remote_manifest_cmd(remote_fullpath),
+                                     lines=False)
+            remote = parse_sha256sum(''.join(
+                data for stream, data in chunks
+                if stream == 'stdout'))  # type: ignore
+
+        plan = SyncPlan(local, remote)
+        if not delete:
+            plan.delete = []
+
+        self.copy_many(
+            {
+                os.path.join(local_fullpath, path): os.path.join(
+                    remote_fullpath, path)
+                for path in plan.upload
+            }, concurrency)
+
+        deleted = [os.path.join(remote_fullpath, p) for p in plan.delete]
+        if self.is_local:
+            for path in deleted:
+                os.remove(path)
+        else:
+            self._remote_batch('rm -f', deleted)
+
+        return plan
+
+    def _remote_batch(self, cmd: str, args: Iterable[str]):
+        """Run a command on the remote host with as few invocations as
+        possible for the given args.
+        """
+        batch = []  # type: List[str]
+        length = 0
+        for arg in sorted(shlex.quote(a) for a in args if a):
+            # Keep the command line well below ARG_MAX.
+            if len(batch) > 0 and length + len(arg) > 65536:
+                self._remote('%s %s' % (cmd, ' '.join(batch)))
+                batch, length = [], 0
+            batch.append(arg)
+            length += len(arg) + 1
+
+        if len(batch) > 0:
+            self._remote('%s %s' % (cmd, ' '.join(batch)))
 
     def mkdtemp(self,
                 suffix: Optional[str] = None,
@@ -677,11 +1755,16 @@ class Executor(BaseExecutor):
 
     def path_exists(self, path: str) -> bool:
         """Check if the given path exists. In local mode, it uses
-        `os.path.exists` and `ls` in remote mode.
+        `os.path.exists`. In remote mode, it uses the remote filesystem facade
+        (see fs), unless the path has to be expanded by a shell (e.g. it
+        contains a glob pattern), in which case `ls` is used.
         """
         if self.is_local:
             return os.path.exists(path)
 
+        if not any(c in path for c in '*?[~$'):
+            return self.fs.exists(path)
+
         res = self._remote("ls %s 1>/dev/null 2>&1" % (path), check=False)
         return res.returncode == 0
 
@@ -707,12 +1790,399 @@ class Executor(BaseExecutor):
     def remote_cwd(self) -> Optional[str]:
         return self._remote_basedir
 
+    @property
+    def hostnames(self) -> List[str]:
+        """The hosts targeted by run_all(). It's empty in local mode."""
+        return list(self._hostnames)
+
     def mkdir(self, path: str):
         if not os.path.isabs(path):
             path = self._join_paths(self._remote_basedir, path)
 
-        res = self._remote("mkdir -p %s" % (path))
-        return res.stdout
+        self.fs.mkdir(path, parents=True)
+
+
+class _CommandEvent(object):
+    """_CommandEvent collects the outcome of a command reported through the
+    command.end event.
+    """
+    def __init__(self, start: float, bytes_in: int):
+        self.start = start
+        self.bytes_in = bytes_in
+        self.bytes_out = 0
+        self.returncode = None  # type: Optional[int]
+
+    def done(self, res: subprocess.CompletedProcess
+             ) -> subprocess.CompletedProcess:
+        self.returncode = res.returncode
+        self.bytes_out = _byte_size(res.stdout) + _byte_size(res.stderr)
+        return res
+
+
+def _byte_size(data: Any) -> int:
+    if not data:
+        return 0
+    if isinstance(data, str):
+        return len(data.encode('utf-8', 'surrogateescape'))
+    return len(data)
+
+
+_TAR_COMPRESSORS = {
+    None: ([], []),
+    'gzip': (['gzip', '-c'], ['gzip', '-dc']),
+    'zstd': (['zstd', '-c', '-q'], ['zstd', '-dc', '-q']),
+}  # type: Dict[Optional[str], Tuple[List[str], List[str]]]
+"""The commands used to compress and decompress the tar streams generated by
+Executor.upload_tree(), by compression name.
+"""
+
+
+def _popen(cmd: str,
+           env: Optional[Dict[str, str]],
+           cwd: Optional[str],
+           shell: bool,
+           input: Optional[Union[str, bytes]],
+           encoding: str,
+           new_session: bool = False) -> subprocess.Popen:
+    """Start a local process with its stdout/stderr piped. Its input is
+    written from a separate thread to not block while its output is read.
+    When new_session is True, the process gets its own process group, such
+    that it can be terminated along with its children through _terminate().
+    """
+    proc = subprocess.Popen(
+        cmd,
+        env=env,
+        cwd=cwd,
+        shell=shell,
+        stdin=subprocess.PIPE if input is not None else None,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=new_session)
+
+    if input is not None:
+        data = input if isinstance(input, bytes) else input.encode(encoding)
+
+        def write_input():
+            try:
+                proc.stdin.write(data)  # type: ignore
+                proc.stdin.close()  # type: ignore
+            except BrokenPipeError:
+                pass
+
+        threading.Thread(target=write_input, daemon=True).start()
+
+    return proc
+
+
+def _terminate(proc: subprocess.Popen):
+    """Terminate a process started by _popen() in a new session, and the
+    processes it spawned (e.g. the commands run by its shell).
+    """
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+
+
+def _iter_process_chunks(
+        proc: subprocess.Popen) -> Iterator[Tuple[str, bytes]]:
+    """Read the stdout/stderr of a local process as data arrive."""
+    with selectors.DefaultSelector() as selector:
+        selector.register(proc.stdout, selectors.EVENT_READ, 'stdout')
+        selector.register(proc.stderr, selectors.EVENT_READ, 'stderr')
+
+        while len(selector.get_map()) > 0:
+            for key, _ in selector.select():
+                chunk = os.read(key.fileobj.fileno(), 32768)  # type: ignore
+                if not chunk:
+                    selector.unregister(key.fileobj)
+                    continue
+                yield (key.data, chunk)
+
+
+def _drain(stream: IO[bytes], chunks: List[bytes]):
+    """Read a stream until EOF, appending what's read to chunks."""
+    for chunk in iter(lambda: stream.read(32768), b''):
+        chunks.append(chunk)
+
+
+def _iter_channel_chunks(
+        channel: 'paramiko.Channel') -> Iterator[Tuple[str, bytes]]:
+    """Read the stdout/stderr of a SSH channel as data arrive, until the
+    remote command exits.
+    """
+    while True:
+        received = False
+        if channel.recv_ready():
+            yield ('stdout', channel.recv(32768))
+            received = True
+        if channel.recv_stderr_ready():
+            yield ('stderr', channel.recv_stderr(32768))
+            received = True
+
+        if received:
+            continue
+        if channel.exit_status_ready() or channel.closed:
+            break
+
+        select.select([channel], [], [], 1)
+
+
+class _StreamDecoder(object):
+    """Decode stdout/stderr chunks incrementally, such that multi-byte
+    characters split over two chunks are properly decoded, and optionally
+    split them into lines.
+    """
+    def __init__(self, text: bool, encoding: str, lines: bool):
+        self._lines = lines
+        self._decoders = {}  # type: Dict[str, Any]
+        self._pending = {}  # type: Dict[str, Any]
+        if text:
+            self._decoders = {
+                'stdout': codecs.getincrementaldecoder(encoding)(),
+                'stderr': codecs.getincrementaldecoder(encoding)(),
+            }
+
+    def feed(self, stream: str, chunk: bytes,
+             final: bool = False) -> List[Union[str, bytes]]:
+        data = chunk  # type: Any
+        if stream in self._decoders:
+            data = self._decoders[stream].decode(chunk, final)
+        if not self._lines:
+            return [data] if len(data) > 0 else []
+
+        data = self._pending.pop(stream, data[:0]) + data
+        lines = data.splitlines(True)
+        newline = '\n' if isinstance(data, str) else b'\n'
+        if len(lines) > 0 and not lines[-1].endswith(newline) and not final:
+            self._pending[stream] = lines.pop()
+        return lines
+
+    def flush(self) -> List[Tuple[str, Union[str, bytes]]]:
+        remaining = []  # type: List[Tuple[str, Union[str, bytes]]]
+        for stream in ('stdout', 'stderr'):
+            for data in self.feed(stream, b'', True):
+                remaining.append((stream, data))
+        return remaining
+
+
+def _write_output(stream: str, data: Union[str, bytes]):
+    file = sys.stdout if stream == 'stdout' else sys.stderr
+    if isinstance(data, bytes):
+        file.buffer.write(data)
+        file.flush()
+    else:
+        print(data, file=file, end='', flush=True)
+
+
+def _capture(chunks: Iterator[Tuple[str, bytes]],
+             text: bool,
+             encoding: str,
+             max_size: Optional[int] = None
+             ) -> Tuple[Union[str, bytes], Union[str, bytes]]:
+    """Capture the whole stdout/stderr. When max_size is set, only the last
+    max_size bytes of each stream are kept.
+    """
+    buffers = {
+        'stdout': CaptureBuffer(encoding if text else None, max_size, True),
+        'stderr': CaptureBuffer(encoding if text else None, max_size, True),
+    }
+    for stream, chunk in chunks:
+        buffers[stream].write(chunk)
+
+    return (buffers['stdout'].getvalue(), buffers['stderr'].getvalue())
+
+
+def _output(chunks: Iterator[Tuple[str, bytes]], text: bool,
+            encoding: str) -> Iterator[Tuple[str, bytes]]:
+    """Output the chunks to kitipy stdout/stderr as they arrive, and pass them
+    through.
+    """
+    decoder = _StreamDecoder(text, encoding, False)
+    for stream, chunk in chunks:
+        for data in decoder.feed(stream, chunk):
+            _write_output(stream, data)
+        yield (stream, chunk)
+
+    for stream, data in decoder.flush():
+        _write_output(stream, data)
+
+
+def _tee(chunks: Iterator[Tuple[str, bytes]],
+         text: bool,
+         encoding: str,
+         max_size: Optional[int] = None
+         ) -> Tuple[Union[str, bytes], Union[str, bytes]]:
+    """Output the chunks to kitipy stdout/stderr as they arrive, and return
+    the whole stdout/stderr (or only the last max_size bytes of each).
+    """
+    return _capture(_output(chunks, text, encoding), text, encoding,
+                    max_size)
+
+
+class FanOutResult(Dict[str, subprocess.CompletedProcess]):
+    """FanOutResult is returned by Executor.run_all() and maps each targeted
+    host to the subprocess.CompletedProcess of the command run there.
+    """
+    def __init__(self, cmd: str, results: Dict[str,
+                                               subprocess.CompletedProcess]):
+        super().__init__(results)
+        self.cmd = cmd
+
+    @property
+    def succeeded(self) -> Dict[str, subprocess.CompletedProcess]:
+        """The results of the hosts where the command exited with code 0."""
+        return {h: res for h, res in self.items() if res.returncode == 0}
+
+    @property
+    def failed(self) -> Dict[str, subprocess.CompletedProcess]:
+        """The results of the hosts where the command failed."""
+        return {h: res for h, res in self.items() if res.returncode != 0}
+
+    def summary(self) -> str:
+        """Get a human-readable summary of the failures.
+
+        Returns:
+            str: One line per failed host with its exit code, prefixed by the
+            number of failed hosts.
+        """
+        failed = self.failed
+        lines = ['%d/%d hosts failed.' % (len(failed), len(self))]
+        for host, res in failed.items():
+            lines.append('  * %s: exit code %d' % (host, res.returncode))
+        return '\n'.join(lines)
+
+    def check_returncode(self):
+        """Raise a FanOutError if the command failed on at least one host.
+
+        Raises:
+            kitipy.FanOutError: When the command failed on some hosts.
+        """
+        if len(self.failed) > 0:
+            raise FanOutError(self.cmd, dict(self))
+
+
+class ParallelResult(FanOutResult):
+    """ParallelResult is returned by Executor.local_many() and maps the label
+    of each command to its subprocess.CompletedProcess. The labels of the
+    commands cancelled before they started (in fail-fast mode) are listed in
+    the skipped attribute.
+    """
+    def __init__(self,
+                 cmd: str,
+                 results: Dict[str, subprocess.CompletedProcess],
+                 skipped: Optional[List[str]] = None):
+        super().__init__(cmd, results)
+        self.skipped = skipped if skipped else []
+
+    def summary(self) -> str:
+        """Get a human-readable summary of the failures.
+
+        Returns:
+            str: One line per failed command with its exit code, prefixed by
+            the number of failed commands.
+        """
+        failed = self.failed
+        lines = ['%d/%d commands failed.' % (len(failed), len(self))]
+        for label, res in failed.items():
+            lines.append('  * %s: exit code %d' % (label, res.returncode))
+        if len(self.skipped) > 0:
+            lines.append('%d commands skipped: %s.' %
+                         (len(self.skipped), ', '.join(self.skipped)))
+        return '\n'.join(lines)
+
+    def check_returncode(self):
+        """Raise a ParallelError if at least one command failed.
+
+        Raises:
+            kitipy.ParallelError: When some commands failed.
+        """
+        if len(self.failed) > 0:
+            raise ParallelError(self.cmd, dict(self))
+
+
+class _PrefixedOutput(object):
+    """Output the stdout/stderr of concurrent commands line by line, each
+    line being prefixed by the label of its command.
+    """
+    COLORS = ['cyan', 'magenta', 'yellow', 'green', 'blue', 'red']
+
+    def __init__(self, labels: List[str], encoding: str):
+        width = max([len(label) for label in labels] + [0])
+        self._encoding = encoding
+        self._lock = threading.Lock()
+        self._prefixes = {
+            label: click.style('[%s] ' % (label.ljust(width)),
+                               fg=self.COLORS[i % len(self.COLORS)])
+            for i, label in enumerate(labels)
+        }
+
+    def stream(self, label: str, chunks: Iterator[Tuple[str, bytes]]
+               ) -> Iterator[Tuple[str, bytes]]:
+        """Output the chunks of a command as complete lines arrive, and pass
+        them through.
+        """
+        decoder = _StreamDecoder(False, self._encoding, True)
+        for stream, chunk in chunks:
+            self._write(label, stream, decoder.feed(stream, chunk))
+            yield (stream, chunk)
+
+        for stream, line in decoder.flush():
+            self._write(label, stream, [line])
+
+    def _write(self, label: str, stream: str, lines: List[Any]):
+        if len(lines) == 0:
+            return
+
+        text = ''.join(
+            self._prefixes[label] +
+            line.decode(self._encoding, 'replace').rstrip('\r\n') + '\n'
+            for line in lines)
+        with self._lock:
+            click.echo(text, nl=False, err=stream == 'stderr')
+
+
+def _expand_host_patterns(patterns: List[str],
+                          ssh_config_file: str) -> List[str]:
+    """Expand ssh_config Host patterns (e.g. "app-*") into the list of
+    concrete hosts declared in the given ssh_config file. Entries without
+    wildcards are kept as is.
+
+    Args:
+        patterns (List[str]):
+            Hostnames, host aliases or Host patterns to expand.
+        ssh_config_file (str):
+            Path to the ssh_config file declaring the hosts.
+
+    Raises:
+        RuntimeError: When a pattern matches no host.
+
+    Returns:
+        List[str]: The expanded hosts, without duplicates.
+    """
+    hostnames = []  # type: List[str]
+    declared = None  # type: Optional[List[str]]
+    is_pattern = lambda host: any(c in host for c in '*?!')
+
+    for pattern in patterns:
+        if not is_pattern(pattern):
+            matches = [pattern]
+        else:
+            if declared is None:
+                ssh_config = paramiko.SSHConfig()
+                with open(os.path.expanduser(ssh_config_file)) as f:
+                    ssh_config.parse(f)
+                declared = sorted(h for h in ssh_config.get_hostnames()
+                                  if not is_pattern(h))
+            matches = [h for h in declared if fnmatch.fnmatch(h, pattern)]
+
+        if len(matches) == 0:
+            raise RuntimeError('No host declared in %s matches "%s".' %
+                               (ssh_config_file, pattern))
+
+        hostnames += [h for h in matches if h not in hostnames]
+
+    return hostnames
 
 
 def _create_executor(config: Dict, stage_name: str,
@@ -738,17 +2208,29 @@ def _create_executor(config: Dict, stage_name: str,
     if stage['type'] == 'local':
         return Executor(dispatcher)
 
-    if 'hostname' not in stage:
+    if 'hostname' not in stage and 'hostnames' not in stage:
         raise click.BadParameter(
             'Remote stage "%s" has no hostname field defined.' % (stage))
 
     # @TODO: verify and explain better all the mess around basedir/cwd
     basedir = stage.get('basedir')
     params = {
-        'hostname': stage['hostname'],
+        'hostname': stage.get('hostname'),
         'local_basedir': stage.get('local_basedir'),
         'remote_basedir': stage.get('remote_basedir'),
-    }
+    }  # type: Dict[str, Any]
+
+    if 'hostnames' in stage:
+        hostnames = stage['hostnames']
+        # A single Host pattern could be used instead of a list of hosts.
+        params['hostnames'] = [hostnames] if isinstance(hostnames,
+                                                        str) else hostnames
+    if 'concurrency' in stage:
+        params['concurrency'] = stage['concurrency']
+    if 'persistent_session' in stage:
+        params['persistent_session'] = stage['persistent_session']
+    if 'output_limit' in stage:
+        params['output_limit'] = stage['output_limit']
 
     if 'ssh_config' in config:
         params['ssh_config_file'] = config['ssh_config']
@@ -759,11 +2241,15 @@ def _create_executor(config: Dict, stage_name: str,
     return Executor(dispatcher, **params)
 
 
-class InteractiveWarningPolicy(paramiko.MissingHostKeyPolicy):
+class InteractiveWarningPolicy(object):
     """InteractiveWarningPolicy implements a paramiko MissingHostKeyPolicy
     that uses click.confirmation() helper to ask for confirmation when a new
     host_key is detected. This is the default paramiko MissingHostKeyPolicy
     used by kitipy.
+
+    It doesn't inherit from paramiko.MissingHostKeyPolicy, such that paramiko
+    is not loaded until a SSH connection is opened, but it implements the
+    same interface.
     """
 
     def missing_host_key(self, client, hostname, key):
@@ -794,9 +2280,10 @@ class ProxyExecutor(BaseExecutor):
             encoding: Optional[str] = None,
             pipe: bool = False,
             check: bool = True,
+            tee: bool = False,
     ) -> subprocess.CompletedProcess:
         return self._executor.local(cmd, env, cwd, shell, input, text, encoding,
-                                    pipe, check)
+                                    pipe, check, tee)
 
     def run(
             self,
@@ -809,13 +2296,86 @@ class ProxyExecutor(BaseExecutor):
             encoding: Optional[str] = None,
             pipe: bool = False,
             check: bool = True,
+            tee: bool = False,
     ) -> subprocess.CompletedProcess:
         return self._executor.run(cmd, env, cwd, shell, input, text, encoding,
-                                  pipe, check)
+                                  pipe, check, tee)
+
+    def run_stream(
+            self,
+            cmd: str,
+            env: Optional[Dict[str, str]] = None,
+            cwd: Optional[str] = None,
+            input: Optional[str] = None,
+            text: bool = True,
+            encoding: Optional[str] = None,
+            lines: bool = True,
+            tee: bool = False,
+            check: bool = True,
+    ) -> Iterator[Tuple[str, Union[str, bytes]]]:
+        return self._executor.run_stream(cmd, env, cwd, input, text, encoding,
+                                         lines, tee, check)
+
+    def run_all(
+            self,
+            cmd: str,
+            env: Optional[Dict[str, str]] = None,
+            cwd: Optional[str] = None,
+            input: Optional[str] = None,
+            text: bool = True,
+            encoding: Optional[str] = None,
+            pipe: bool = False,
+            check: bool = True,
+    ) -> FanOutResult:
+        return self._executor.run_all(cmd, env, cwd, input, text, encoding,
+                                      pipe, check)
+
+    def local_many(
+            self,
+            cmds: Union[List[str], Dict[str, str]],
+            env: Optional[Dict[str, str]] = None,
+            cwd: Optional[str] = None,
+            concurrency: Optional[int] = None,
+            text: bool = True,
+            encoding: Optional[str] = None,
+            pipe: bool = False,
+            check: bool = True,
+            fail_fast: bool = False,
+    ) -> ParallelResult:
+        return self._executor.local_many(cmds, env, cwd, concurrency, text,
+                                         encoding, pipe, check, fail_fast)
 
     def copy(self, local_path: str, remote_path: str):
         return self._executor.copy(local_path, remote_path)
 
+    def copy_many(self, paths: Dict[str, str], concurrency: int = 4):
+        return self._executor.copy_many(paths, concurrency)
+
+    def fetch(self, remote_path: str, local_path: str, resume: bool = True):
+        return self._executor.fetch(remote_path, local_path, resume)
+
+    def upload_tree(self,
+                    local_dir: str,
+                    remote_dir: str,
+                    compression: Optional[str] = 'gzip',
+                    treeish: Optional[str] = None):
+        return self._executor.upload_tree(local_dir, remote_dir, compression,
+                                          treeish)
+
+    def sync(self,
+             local_dir: str,
+             remote_dir: str,
+             delete: bool = False,
+             concurrency: int = 4) -> SyncPlan:
+        return self._executor.sync(local_dir, remote_dir, delete,
+                                   concurrency)
+
+    def copy_tree(self,
+                  local_dir: str,
+                  remote_dir: str,
+                  concurrency: int = 4):
+        return self._executor.copy_tree(local_dir, remote_dir, concurrency)
+
     def mkdtemp(self,
                 suffix: Optional[str] = None,
                 prefix: Optional[str] = None,
@@ -834,6 +2394,10 @@ class ProxyExecutor(BaseExecutor):
     def path_exists(self, path: str) -> bool:
         return self._executor.path_exists(path)
 
+    @property
+    def fs(self) -> RemoteFS:
+        return self._executor.fs
+
     @property
     def is_local(self) -> bool:
         return self._executor.is_local
@@ -853,3 +2417,7 @@ class ProxyExecutor(BaseExecutor):
     @property
     def remote_cwd(self) -> Optional[str]:
         return self._executor.remote_cwd
+
+    @property
+    def hostnames(self) -> List[str]:
+        return self._executor.hostnames
@@ -4,6 +4,8 @@ import kitipy
 def ensure_tag_exists(kctx: kitipy.Context, tag: str):
     """Check if the given Git tag exists on both local copy and remote origin.
     This is mostly useful to ensure no invalid tag is going to be deployed.
+    The lookups can be memoized by calling this function within
+    kctx.cached().
     
     Args:
         kctx (kitipy.Context): Kitipy context.
@@ -16,6 +18,7 @@ def ensure_tag_exists(kctx: kitipy.Context, tag: str):
     res = kctx.local(
         'git ls-remote --exit-code --tags origin refs/tags/%s >/dev/null 2>&1'
         % (tag),
+        pipe=True,
         check=False)
     if res.returncode != 0:
         kctx.fail("The given tag is not available on Git remote origin.")
@@ -23,6 +26,7 @@ def ensure_tag_exists(kctx: kitipy.Context, tag: str):
     res = kctx.local(
         'git ls-remote --exit-code --tags ./. refs/tags/%s >/dev/null 2>&1' %
         (tag),
+        pipe=True,
         check=False)
     if res.returncode != 0:
         kctx.fail(
@@ -3,13 +3,17 @@ import contextlib
 import functools
 import os
 import subprocess
+import sys
 from typing import Any, Callable, Dict, List, Optional, Tuple, Union
-from . import filters
+from . import completion, filters
 from .context import Context, pass_context, get_current_context
 from .dispatcher import Dispatcher
 from .exceptions import TaskError
+from .incremental import is_incremental, run_incremental
 from .executor import Executor, _create_executor
-from .utils import load_config_file, normalize_config, set_up_file_transfer_listeners
+from .metrics import FORMATS as METRICS_FORMATS, CommandMetrics
+from .ssh import get_connection_pool
+from .utils import load_config, normalize_config, set_up_file_transfer_listeners
 
 
 class Task(click.Command):
@@ -29,6 +33,12 @@ class Task(click.Command):
             name: str,
             filters: Optional[List[Callable[[click.Context], bool]]] = None,
             cwd: Optional[str] = None,
+            depends_on: Optional[List[click.Command]] = None,
+            inputs: Optional[List[str]] = None,
+            outputs: Optional[List[str]] = None,
+            input_env: Optional[List[str]] = None,
+            input_config: Optional[List[str]] = None,
+            prefetch: Optional[List[str]] = None,
             **kwargs):
         """
         Args:
@@ -49,6 +59,28 @@ class Task(click.Command):
                 It's recommended to use this parameter instead of calling
                 kctx.cd() directly as the Task cwd can be easily changed, thus
                 increasing the Task reusability.
+            depends_on (Optional[List[click.Command]]):
+                Tasks that should be run before this one. They're run
+                concurrently when they don't depend on each other, and each
+                of them is run only once (see kitipy.TaskScheduler).
+            inputs (Optional[List[str]]):
+                Glob patterns (relative to the local basedir, ** is
+                supported) of the files the task reads. When a task declares
+                any input or output, it's skipped if none of them changed
+                since its last successful run (see kitipy.incremental). A
+                --force flag is then added to the task to run it anyway.
+            outputs (Optional[List[str]]):
+                Glob patterns of the files the task writes. The task is run
+                if any of them matches no file.
+            input_env (Optional[List[str]]):
+                Names of the env vars the task depends on.
+            input_config (Optional[List[str]]):
+                Dotted paths of the kitipy config keys the task depends on
+                (e.g. "stages.prod.hostname").
+            prefetch (Optional[List[str]]):
+                Names of the stack/stage config values used by the task,
+                whose sources are fetched concurrently before the task runs
+                (see kitipy.Context.prefetch()).
             **kwargs:
                 Accept any other parameters also supported by click.Command()
                 constructor.
@@ -56,6 +88,20 @@ class Task(click.Command):
         super().__init__(name, **kwargs)
         self.filters = filters if filters else []
         self.cwd = cwd
+        self.depends_on = depends_on if depends_on else []
+        self.inputs = inputs if inputs else []
+        self.outputs = outputs if outputs else []
+        self.input_env = input_env if input_env else []
+        self.input_config = input_config if input_config else []
+        self.prefetch = prefetch if prefetch else []
+
+        if is_incremental(self):
+            self.params.append(
+                click.Option(['--force'],
+                             is_flag=True,
+                             expose_value=False,
+                             callback=_store_force_flag,
+                             help='Run the task even if it is up-to-date.'))
 
     def is_enabled(self, click_ctx: click.Context) -> bool:
         """Check if the that Task should be filtered out based on click Context.
@@ -85,13 +131,38 @@ class Task(click.Command):
         if not self.is_enabled(click_ctx):
             raise TaskError('Task "%s" is filtered out.' % self.name)
 
+        if len(self.depends_on) > 0:
+            kctx = get_current_context(click_ctx)
+            with click_ctx.scope(cleanup=False):
+                kctx.invoke_parallel(self.depends_on)
+
+        if len(self.prefetch) > 0:
+            get_current_context(click_ctx).prefetch(self.prefetch)
+
         cm = contextlib.nullcontext()
         if self.cwd:
             kctx = get_current_context(click_ctx)
             cm = kctx.cd(self.cwd)
 
         with cm:
-            return super().invoke(click_ctx)
+            if not is_incremental(self):
+                return super().invoke(click_ctx)
+
+            return run_incremental(
+                get_current_context(click_ctx), self, click_ctx.command_path,
+                click_ctx.params, lambda: super(Task, self).invoke(click_ctx),
+                self in click_ctx.meta.get(_FORCE_FLAG, set()))
+
+
+_FORCE_FLAG = 'kitipy.force'
+
+
+def _store_force_flag(click_ctx: click.Context, param: click.Parameter,
+                      value: bool):
+    # The flag is not exposed to the task callback, so the forced tasks are
+    # kept in the meta dict (shared by the whole context tree).
+    if value:
+        click_ctx.meta.setdefault(_FORCE_FLAG, set()).add(click_ctx.command)
 
 
 class Group(click.Group):
@@ -666,6 +737,9 @@ class StackGroup(click.MultiCommand):
 def task(name: Optional[str] = None,
          filters: List[Callable[[click.Context], bool]] = [],
          cwd: Optional[str] = None,
+         depends_on: Optional[List[click.Command]] = None,
+         inputs: Optional[List[str]] = None,
+         outputs: Optional[List[str]] = None,
          **attrs):
     """This decorator creates a new kitipy Task. It automatically sets
     the requested filter depending on local_only/remote_only kwargs.
@@ -683,6 +757,13 @@ def task(name: Optional[str] = None,
             It's recommended to use this parameter instead of calling
             kctx.cd() directly as the Task cwd can be easily changed, thus
             increasing the Task reusability.
+        depends_on (Optional[List[click.Command]]):
+            Tasks that should be run before this one. See kitipy.Task().
+        inputs (Optional[List[str]]):
+            Glob patterns of the files read by the task. See kitipy.Task().
+        outputs (Optional[List[str]]):
+            Glob patterns of the files written by the task. See
+            kitipy.Task().
         **attrs:
             Any other parameters supported by click.Command is also supported.
             In addition, it also supports local_only and remote_only
@@ -694,6 +775,12 @@ def task(name: Optional[str] = None,
     """
     if cwd:
         attrs['cwd'] = cwd
+    if depends_on:
+        attrs['depends_on'] = depends_on
+    if inputs:
+        attrs['inputs'] = inputs
+    if outputs:
+        attrs['outputs'] = outputs
     attrs['filters'] = filters
     attrs.setdefault('cls', Task)
     return click.command(name, **attrs)
@@ -764,7 +851,11 @@ class RootCommand(Group):
     default. However, if there're multiple stacks, no default stacks will be
     loaded.
     """
-    def __init__(self, config: Dict, basedir: str = '', **kwargs):
+    def __init__(self,
+                 config: Dict,
+                 basedir: str = '',
+                 config_file: Optional[str] = None,
+                 **kwargs):
         """
         Args:
             config (Dict):
@@ -777,6 +868,9 @@ class RootCommand(Group):
                 or a subset of your tasks in a specific subdirectory of your
                 project (for instance if your project is composed of multiple
                 components/services).
+            config_file (Optional[str]):
+                The file the config has been loaded from, if any. The shell
+                completion index is invalidated when it changes.
             **kwargs:
                 Accept any valid argument for click.Group().
 
@@ -789,10 +883,25 @@ class RootCommand(Group):
         super().__init__(**kwargs)
 
         self.click_ctx = None
+        self.config_file = config_file
         self._config = normalize_config(config)
         self._dispatcher = Dispatcher()
         set_up_file_transfer_listeners(self._dispatcher)
 
+        self._metrics = None  # type: Optional[CommandMetrics]
+        if 'metrics' in self._config:
+            metrics_cfg = self._config['metrics']
+            if 'path' not in metrics_cfg:
+                raise click.BadParameter(
+                    'Metrics config has no "path" field defined.')
+            if metrics_cfg.get('format', 'jsonl') not in METRICS_FORMATS:
+                raise click.BadParameter(
+                    'Metrics format should be one of: %s.' %
+                    (', '.join(METRICS_FORMATS)))
+
+            self._metrics = CommandMetrics()
+            self._metrics.attach(self._dispatcher)
+
         stages = config['stages'].values()
         if len(stages) == 1:
             stage = list(stages)[0]
@@ -840,15 +949,82 @@ class RootCommand(Group):
 
         return self.click_ctx
 
+    def main(self, args=None, prog_name=None, complete_var=None, **extra):
+        """See main() method from click.BaseCommand. Shell completion
+        requests are answered from the index of the command tree when
+        possible. Otherwise, this method also stores that index, used to
+        answer the next requests without resolving the command tree (see
+        kitipy.completion).
+        """
+        script = sys.argv[0] if len(sys.argv) > 0 else ''
+        prog_name = prog_name or os.path.basename(script)
+        completion.complete_from_cache(prog_name, complete_var)
+
+        instr = os.environ.get(
+            complete_var or completion.complete_var(prog_name), '')
+        if completion.parse_instruction(
+                instr) is not None and completion.load_index(script) is None:
+            self._save_completion_index(script, prog_name)
+
+        return super().main(args, prog_name, complete_var, **extra)
+
+    def _save_completion_index(self, script: str, prog_name: str):
+        try:
+            click_ctx = self.make_context(prog_name, [],
+                                          resilient_parsing=True)
+            with click_ctx.scope(cleanup=False):
+                tree = completion.index_command(click_ctx)
+            completion.save_index(script, tree, self.config_file)
+        except Exception:
+            # Completion still works without the index, it's just slower.
+            pass
+
     def invoke(self, click_ctx: click.Context):
+        failed = True
         try:
             super().invoke(click_ctx)
+            failed = False
         except TaskError as err:
             if err.click_ctx is None:
                 err.click_ctx = self.click_ctx
             raise err
         except subprocess.CalledProcessError as err:
             raise TaskError(str(err), self.click_ctx, err.returncode)
+        finally:
+            self._tear_down(click_ctx, failed)
+
+    def _tear_down(self, click_ctx: click.Context, failed: bool):
+        # SSH connections are deterministically closed once the task tree has
+        # been executed instead of waiting for the process to exit. Then,
+        # listeners running in the background catch up before exporting
+        # anything they collected.
+        steps = [get_connection_pool().close, self._dispatcher.close]
+        if self._metrics is not None:
+            metrics_cfg = self._config['metrics']
+            steps.append(
+                functools.partial(self._metrics.write, metrics_cfg['path'],
+                                  metrics_cfg.get('format', 'jsonl')))
+
+        # All the steps are run even if one of them fails. Their errors are
+        # reported rather than raised when the task failed, such that they
+        # don't hide the error of the task.
+        error = None  # type: Optional[Exception]
+        for step in steps:
+            try:
+                step()
+            except Exception as err:
+                if failed:
+                    message = 'Failed to clean up after the task: %s' % (err)
+                    kctx = click_ctx.find_object(Context)
+                    if kctx is not None:
+                        kctx.error(message)
+                    else:
+                        click.echo('ERROR: ' + message, err=True)
+                elif error is None:
+                    error = err
+
+        if error is not None:
+            raise error
 
 
 def root(config: Optional[Dict] = None,
@@ -878,7 +1054,7 @@ def root(config: Optional[Dict] = None,
         Callable: The decorator to apply to the task function.
     """
     if config_file is not None:
-        config = load_config_file(config_file)
+        config = load_config(config_file)
     if basedir is None:
         basedir = os.getcwd()
 
@@ -889,4 +1065,5 @@ def root(config: Optional[Dict] = None,
                        cls=RootCommand,
                        config=config,
                        basedir=basedir,
+                       config_file=config_file,
                        **kwargs)
@@ -0,0 +1,193 @@
+"""This module provides the up-to-date checks of incremental tasks, i.e. tasks
+declaring their inputs and outputs (see kitipy.Task).
+
+The fingerprint of a task is made of the content of its input and output
+files, the value of its input env vars and config keys, and its parameters.
+It's stored in a local state directory after each successful run, such that
+the task can be skipped on the next run if its fingerprint didn't change.
+Input and output files are hashed, but their digests are stored along with
+their size and mtime, such that unchanged files don't get rehashed.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import os.path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .sync import hash_file
+
+DEFAULT_STATE_DIR = '.kitipy/state'
+"""Directory where task states are stored, relative to the local basedir.
+It can be changed through the state_dir config key."""
+
+FileEntries = Dict[str, Tuple[int, int, str]]
+
+
+def is_incremental(task: Any) -> bool:
+    """Check if a task declares any input or output."""
+    return any(
+        len(getattr(task, attr, None) or []) > 0
+        for attr in ('inputs', 'outputs', 'input_env', 'input_config'))
+
+
+class TaskState(object):
+    """TaskState computes the fingerprint of an incremental task and stores
+    the fingerprint of its last successful run.
+    """
+    def __init__(self, task: Any, command_path: str, params: Dict[str, Any],
+                 config: Dict, basedir: str):
+        """
+        Args:
+            task (kitipy.Task):
+                The task declaring its inputs and outputs.
+            command_path (str):
+                The full command path of the task, used to identify its
+                state.
+            params (Dict[str, Any]):
+                The parameters the task is invoked with.
+            config (Dict):
+                The kitipy config, where input config keys are looked up.
+            basedir (str):
+                The directory input and output globs are relative to.
+        """
+        self.task = task
+        self.params = params
+        self.config = config
+        self.basedir = basedir
+
+        state_dir = os.path.join(basedir,
+                                 config.get('state_dir', DEFAULT_STATE_DIR))
+        key = hashlib.sha1(command_path.encode('utf-8')).hexdigest()
+        self.path = os.path.join(state_dir, key + '.json')
+        self._saved = self._load()
+
+    def _load(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # A missing or corrupted state only means the task gets run.
+            return {}
+
+    def fingerprint(self) -> Tuple[Optional[str], FileEntries]:
+        """Compute the current fingerprint of the task.
+
+        Returns:
+            Tuple[Optional[str], FileEntries]:
+                The fingerprint, or None when one of the output globs matches
+                no file, and the size, mtime and digest of the hashed files.
+        """
+        cached = {
+            path: tuple(entry)
+            for path, entry in self._saved.get('files', {}).items()
+        }  # type: Dict[str, Any]
+        entries = {}  # type: FileEntries
+
+        inputs = self._hash_globs(self.task.inputs, cached, entries)
+        outputs = self._hash_globs(self.task.outputs, cached, entries)
+        data = {
+            'inputs': inputs,
+            'outputs': outputs,
+            'env': {name: os.environ.get(name)
+                    for name in self.task.input_env},
+            'config': {
+                key: _config_value(self.config, key)
+                for key in self.task.input_config
+            },
+            'params': self.params,
+        }
+        digest = hashlib.sha256(
+            json.dumps(data, sort_keys=True, default=str).encode('utf-8'))
+
+        if any(len(files) == 0 for files in outputs):
+            return (None, entries)
+        return (digest.hexdigest(), entries)
+
+    def _hash_globs(self, patterns: List[str], cached: Dict[str, Any],
+                    entries: FileEntries) -> List[Dict[str, str]]:
+        hashed = []  # type: List[Dict[str, str]]
+        for pattern in patterns:
+            files = {}  # type: Dict[str, str]
+            for path in glob.glob(os.path.join(self.basedir, pattern),
+                                  recursive=True):
+                if not os.path.isfile(path):
+                    continue
+
+                relpath = os.path.relpath(path, self.basedir)
+                stat = os.stat(path)
+                entry = entries.get(relpath, cached.get(relpath))
+                if entry is None or (entry[0], entry[1]) != (stat.st_size,
+                                                             stat.st_mtime_ns):
+                    entry = (stat.st_size, stat.st_mtime_ns, hash_file(path))
+
+                entries[relpath] = entry
+                files[relpath] = entry[2]
+            hashed.append(files)
+        return hashed
+
+    def is_up_to_date(self) -> bool:
+        """Check if the fingerprint of the task matches the one of its last
+        successful run.
+        """
+        fingerprint, _ = self.fingerprint()
+        return fingerprint is not None and fingerprint == self._saved.get(
+            'fingerprint')
+
+    def save(self):
+        """Store the current fingerprint of the task. This should be called
+        once the task has successfully run.
+        """
+        fingerprint, entries = self.fingerprint()
+        self._saved = {'fingerprint': fingerprint, 'files': entries}
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_file = self.path + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(self._saved, f)
+        os.replace(tmp_file, self.path)
+
+
+def _config_value(config: Dict, key: str) -> Any:
+    value = config  # type: Any
+    for part in key.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def run_incremental(kctx,
+                    task: Any,
+                    command_path: str,
+                    params: Dict[str, Any],
+                    fn: Callable[[], Any],
+                    force: bool = False) -> Any:
+    """Run the body of an incremental task, unless it's up-to-date.
+
+    Args:
+        kctx (kitipy.Context):
+            The current kitipy Context.
+        task (kitipy.Task):
+            The task declaring its inputs and outputs.
+        command_path (str):
+            The full command path of the task.
+        params (Dict[str, Any]):
+            The parameters the task is invoked with.
+        fn (Callable[[], Any]):
+            The function running the body of the task.
+        force (bool):
+            Whether the task should be run even if it's up-to-date.
+
+    Returns:
+        Any: The value returned by fn, or None when the task is skipped.
+    """
+    basedir = kctx.local_cwd or os.getcwd()
+    state = TaskState(task, command_path, params, kctx.config, basedir)
+    if not force and state.is_up_to_date():
+        kctx.info('Task "%s" is up-to-date.' % (task.name))
+        return None
+
+    res = fn()
+    state.save()
+    return res
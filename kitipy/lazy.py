@@ -0,0 +1,85 @@
+"""This module provides the helpers used by kitipy to defer the import of
+heavy modules (e.g. paramiko, boto3 or requests) until they're actually used,
+such that running a local task or printing the help message of a task tree
+doesn't pay for them.
+"""
+
+import importlib
+import importlib.util
+import sys
+import types
+from typing import Any, Callable, Dict, List, Tuple
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """Get a module that is actually loaded when one of its attributes is
+    accessed for the first time. The module is registered in sys.modules, so
+    later imports of the same module get it as well.
+
+    Note that using attributes of a lazy module in function annotations or as
+    base classes at the module level defeats the purpose, as they're evaluated
+    at import time.
+
+    Args:
+        name (str): The absolute name of the module.
+
+    Returns:
+        types.ModuleType: The module, which might not be loaded yet.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        raise ImportError('No module named %r' % (name), name=name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def lazy_attributes(
+        package: str, attributes: Dict[str, str]
+) -> Tuple[Callable[[str], Any], Callable[[], List[str]]]:
+    """Build the module-level __getattr__() and __dir__() functions (see PEP
+    562) of a package whose attributes are imported on first access:
+
+        __getattr__, __dir__ = lazy_attributes(__name__, {
+            'tasks': '.tasks',
+            'AsyncExecutor': '.async_executor:AsyncExecutor',
+        })
+
+    Args:
+        package (str):
+            The name of the package (i.e. __name__).
+        attributes (Dict[str, str]):
+            Maps the name of each lazy attribute to the module providing it,
+            relative to the package, optionally followed by a colon and the
+            name of the attribute in that module. The module itself is used
+            when there's no attribute name.
+
+    Returns:
+        Tuple[Callable[[str], Any], Callable[[], List[str]]]:
+            The __getattr__() and __dir__() functions of the package.
+    """
+    def __getattr__(name: str) -> Any:
+        if name not in attributes:
+            raise AttributeError('module %r has no attribute %r' %
+                                 (package, name))
+
+        module_name, _, attr = attributes[name].partition(':')
+        value = importlib.import_module(module_name, package)  # type: Any
+        if attr:
+            value = getattr(value, attr)
+        # Cache the value in the package, such that __getattr__() is not
+        # called anymore for that name.
+        setattr(sys.modules[package], name, value)
+        return value
+
+    def __dir__() -> List[str]:
+        return sorted(set(vars(sys.modules[package])) | set(attributes))
+
+    return __getattr__, __dir__
@@ -1,2 +1,8 @@
-from . import aws
-from . import terraform, tfcloud
+from ..lazy import lazy_attributes
+
+__getattr__, __dir__ = lazy_attributes(
+    __name__, {
+        'aws': '.aws',
+        'terraform': '.terraform',
+        'tfcloud': '.tfcloud',
+    })
@@ -1 +1,10 @@
-from . import cloudfront, ecr, ecs, secretsmanager, sts
+from ...lazy import lazy_attributes
+
+__getattr__, __dir__ = lazy_attributes(
+    __name__, {
+        'cloudfront': '.cloudfront',
+        'ecr': '.ecr',
+        'ecs': '.ecs',
+        'secretsmanager': '.secretsmanager',
+        'sts': '.sts',
+    })
@@ -1,9 +1,17 @@
+import concurrent.futures
 import functools
+import hashlib
 import json
 import kitipy
+import mmap
 import os
-from .tfcloud import get_current_state_version_outputs
-from typing import Any, Dict, List, Optional, Union
+import os.path
+import threading
+from .tfcloud import get_current_state_version, get_state_version_outputs, read_state_outputs
+from ..cache import cache_dir
+from typing import Any, Callable, Dict, List, Optional, Union
+
+OutputBackend = Callable[[kitipy.Context, Dict], Dict[str, Any]]
 
 
 def _get_token():
@@ -13,33 +21,195 @@ def _get_token():
     return os.getenv("TFCLOUD_API_TOKEN")
 
 
+def tfcloud_backend(kctx: kitipy.Context, stage: Dict) -> Dict[str, Any]:
+    """Output backend reading the outputs of the Terraform Cloud workspace
+    set in the tfcloud_workspace_id stage parameter.
+
+    Note that it expects the API token for Terraform Cloud to be specified
+    via the env var TFCLOUD_API_TOKEN.
+    """
+    workspace_id = stage["tfcloud_workspace_id"]
+    token = _get_token()
+
+    # Fetching the metadata of the current state version is cheap, whereas
+    # the state file itself might be huge. The outputs are thus cached on
+    # disk, along with the ID of the state version they come from.
+    state_version = get_current_state_version(token, workspace_id)
+    version = state_version["data"]["id"]
+    cached = _load_cached_outputs(workspace_id, version)
+    if cached is not None:
+        return cached
+
+    outputs = get_state_version_outputs(token, state_version)
+    _save_cached_outputs(workspace_id, version, outputs)
+    return outputs
+
+
+def local_state_backend(kctx: kitipy.Context, stage: Dict) -> Dict[str, Any]:
+    """Output backend reading the outputs of the local state file set in the
+    terraform_state_file stage parameter (relative to the local basedir).
+
+    The state file is memory-mapped and only its outputs are decoded. The
+    outputs are cached on disk along with the mtime and size of the state
+    file, such that it's read again only when it changes.
+    """
+    path = os.path.join(kctx.local_cwd or os.getcwd(),
+                        stage["terraform_state_file"])
+    path = os.path.abspath(path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        raise RuntimeError("Terraform state file %s not found." % (path))
+
+    key = "local-" + hashlib.sha1(path.encode("utf-8")).hexdigest()
+    version = "%d-%d" % (stat.st_mtime_ns, stat.st_size)
+    cached = _load_cached_outputs(key, version)
+    if cached is not None:
+        return cached
+
+    if stat.st_size == 0:
+        raise RuntimeError("Terraform state file %s is empty." % (path))
+
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            chunks = (m[i:i + 65536] for i in range(0, len(m), 65536))
+            outputs = read_state_outputs(chunks)
+
+    outputs = {k: v["value"] for k, v in outputs.items()}
+    _save_cached_outputs(key, version, outputs)
+    return outputs
+
+
+def cli_backend(kctx: kitipy.Context, stage: Dict) -> Dict[str, Any]:
+    """Output backend running `terraform output -json` locally, in the
+    directory set in the terraform_dir stage parameter (defaults to the local
+    basedir). Terraform takes care of reading the state, wherever it's
+    stored.
+    """
+    res = kctx.local("terraform output -json",
+                     cwd=stage.get("terraform_dir"),
+                     pipe=True)
+    outputs = json.loads(res.stdout)
+    return {k: v["value"] for k, v in outputs.items()}
+
+
+_backends = {
+    "tfcloud": tfcloud_backend,
+    "local": local_state_backend,
+    "cli": cli_backend,
+}  # type: Dict[str, OutputBackend]
+
+
+def register_backend(name: str, backend: OutputBackend):
+    """Register an output backend, such that stages can select it through the
+    terraform_backend parameter.
+
+    Args:
+        name (str):
+            Name of the backend.
+        backend (OutputBackend):
+            Function taking the current kitipy Context and the stage config,
+            and returning the output values indexed by output name.
+    """
+    _backends[name] = backend
+
+
+def _backend_name(stage: Dict) -> Optional[str]:
+    if "terraform_backend" in stage:
+        return stage["terraform_backend"]
+    if "tfcloud_workspace_id" in stage:
+        return "tfcloud"
+    if "terraform_state_file" in stage:
+        return "local"
+    return None
+
+
 def _output(kctx: kitipy.Context, stage: str) -> dict:
-    workspace_id = kctx.stage["tfcloud_workspace_id"]
-    return get_current_state_version_outputs(_get_token(), workspace_id)
+    stage_cfg = kctx.config["stages"][stage]
+    name = _backend_name(stage_cfg)
+    if name is None:
+        raise RuntimeError(
+            "No Terraform output backend configured for stage %s." % (stage))
+    if name not in _backends:
+        raise RuntimeError("Terraform output backend %s is not supported." %
+                           (name))
+
+    return _backends[name](kctx, stage_cfg)
+
+
+def _cache_file(key: str) -> str:
+    return cache_dir("terraform", key + ".json")
+
+
+def _load_cached_outputs(key: str, version: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(_cache_file(key), "r") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if cached.get("version") != version:
+        return None
+    return cached["outputs"]
+
+
+def _save_cached_outputs(key: str, version: str, outputs: Dict[str, Any]):
+    path = _cache_file(key)
+    tmp_file = "%s.%d.tmp" % (path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Outputs might hold sensitive values, so the cache file is only
+        # readable by the current user.
+        fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump({"version": version, "outputs": outputs}, f)
+        os.replace(tmp_file, path)
+    except OSError:
+        # The cache is only an optimization, tasks shouldn't fail because it
+        # can't be written.
+        pass
 
 
 def _memoize(fn):
     memo = {}
+    locks = {}
+    lock = threading.Lock()
 
     def helper(kctx: kitipy.Context,
                stage: Optional[str] = None) -> Dict[str, Any]:
         if stage is None:
-            stage == kctx.stage['name']
+            stage = kctx.stage['name']
 
-        if stage not in memo:
-            memo[stage] = fn(kctx, stage)
-        return memo[stage]
+        # Concurrent calls for the same stage wait for each other, such that
+        # outputs are fetched only once.
+        with lock:
+            stage_lock = locks.setdefault(stage, threading.Lock())
+        with stage_lock:
+            if stage not in memo:
+                memo[stage] = fn(kctx, stage)
+            return memo[stage]
 
     return helper
 
 
 output = _memoize(_output)
-"""Get the Terraform outputs associated with a Terraform workspace from Terraform
-Cloud. The workspace ID is looked for in the config of the given stage, in the
-kitipy Context.
+"""Get the Terraform outputs of a stage. They're read through the output
+backend selected by the terraform_backend parameter of the stage config:
+
+* `tfcloud`: reads the outputs of the Terraform Cloud workspace whose ID is
+  set in tfcloud_workspace_id (this is the default when that parameter is
+  set). Only the metadata of the current state version is fetched when it
+  didn't change since the last call, instead of the whole state file ;
+* `local`: reads the state file set in terraform_state_file (this is the
+  default when that parameter is set) ;
+* `cli`: runs `terraform output -json` in terraform_dir ;
 
-Note that this lib expects the API token for Terraform Cloud to be specified
-via the env var TFCLOUD_API_TOKEN.
+Other backends can be added through register_backend(). Outputs are memoized
+per stage, and the tfcloud and local backends cache them on disk (in
+$XDG_CACHE_HOME/kitipy/terraform).
+
+Note that the tfcloud backend expects the API token for Terraform Cloud to be
+specified via the env var TFCLOUD_API_TOKEN.
 
 Args:
     kctx (kitipy.Context):
@@ -53,6 +223,39 @@ Returns:
 """
 
 
+def outputs_by_stage(kctx: kitipy.Context,
+                     stages: Optional[List[str]] = None,
+                     concurrency: Optional[int] = None) -> Dict[str, Dict]:
+    """Get the Terraform outputs of many stages at once. Workspaces are
+    queried concurrently, and the outputs are memoized like output() does.
+
+    Args:
+        kctx (kitipy.Context):
+            The current kitipy context.
+        stages (Optional[List[str]]):
+            Names of the stages whose outputs are fetched. Defaults to all the
+            stages having an output backend.
+        concurrency (Optional[int]):
+            Maximum number of workspaces queried at the same time. Defaults
+            to the number of stages.
+
+    Returns:
+        Dict[str, Dict]: The outputs of each stage, indexed by stage name.
+    """
+    if stages is None:
+        stages = [
+            name for name, stage in kctx.config["stages"].items()
+            if _backend_name(stage) is not None
+        ]
+    if len(stages) == 0:
+        return {}
+
+    workers = max(1, min(concurrency or len(stages), len(stages)))
+    with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        results = pool.map(lambda stage: output(kctx, stage), stages)
+        return dict(zip(stages, results))
+
+
 def find_deep_output_value(
         kctx: kitipy.Context,
         path: List[str],
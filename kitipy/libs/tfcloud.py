@@ -1,6 +1,60 @@
+import codecs
+import json
+import re
 import requests
+import requests.adapters
 import sys
-from typing import Callable, Dict, List
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+from urllib3.util.retry import Retry
+
+DEFAULT_TIMEOUT = (10.0, 60.0)
+"""Default connect and read timeouts, in seconds, of the requests made to
+Terraform Cloud."""
+
+Timeout = Union[float, Tuple[float, float]]
+
+_session = None  # type: Optional[requests.Session]
+_session_lock = threading.Lock()
+
+
+def new_session(retries: int = 5, backoff_factor: float = 0.5) -> requests.Session:
+    """Create a requests Session retrying requests that failed due to
+    connection errors, rate limiting (429) or server errors (5xx), with an
+    exponential backoff between each try. The Retry-After header sent along
+    with 429/503 responses is honored.
+
+    Args:
+        retries (int):
+            Maximum number of retries of a request.
+        backoff_factor (float):
+            Factor of the exponential backoff (see urllib3 Retry).
+
+    Returns:
+        requests.Session: The new session.
+    """
+    retry = Retry(total=retries,
+                  backoff_factor=backoff_factor,
+                  status_forcelist=(429, 500, 502, 503, 504),
+                  raise_on_status=False)
+    adapter = requests.adapters.HTTPAdapter(max_retries=retry)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """Get the session shared by the functions of this module, such that
+    connections to Terraform Cloud are kept alive and reused between
+    requests. It's created through new_session() on first call.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = new_session()
+        return _session
 
 
 def _headers(token: str):
@@ -14,18 +68,22 @@ def _build_url(pattern: str, **kwargs):
     return "https://app.terraform.io/api/v2/" + endpoint
 
 
-def get_current_state_version_outputs(
-    token: str,
-    workspace_id: str,
-) -> Dict:
-    """Fetch the outputs for the current state version.
+def get_current_state_version(token: str,
+                              workspace_id: str,
+                              timeout: Timeout = DEFAULT_TIMEOUT) -> Dict:
+    """Fetch the metadata of the current state version of a workspace. This
+    is a cheap call compared to downloading the state file itself, so it can
+    be used to find out whether the outputs changed since they were last
+    fetched (the state version ID is in data.id).
 
     Args:
         token (str):
             The bearer token to use when calling the API.
         workspace_id (str):
             ID of the Terraform Cloud workspace that should be queried.
-    
+        timeout (Timeout):
+            Connect and read timeouts of the request, in seconds.
+
     Returns:
         Dict: The raw API response.
     """
@@ -39,18 +97,199 @@ def get_current_state_version_outputs(
     # response have their underscores transformed into hyphens for whatever
     # reason. Thus, we fetch it only to get the URL of the raw state file 
     # as stored by Terraform.
-    current_r = requests.get(current_url, headers=_headers(token))
+    current_r = get_session().get(current_url,
+                                  headers=_headers(token),
+                                  timeout=timeout)
     if current_r.status_code != requests.codes.ok:
         raise RuntimeError(
             "Request to %s failed with code %d" % (current_url, current_r.status_code))
 
-    # We then download the raw state file and extract the outputs from there.
-    current_state = current_r.json()
-    state_url = current_state["data"]["attributes"]["hosted-state-download-url"]
-    state_r = requests.get(state_url, headers=_headers(workspace_id))
-    if current_r.status_code != requests.codes.ok:
-        raise RuntimeError(
-            "Request to %s failed with code %d" % (state_url, state_r.status_code))
+    return current_r.json()
+
+
+def get_state_version_outputs(token: str,
+                              state_version: Dict,
+                              timeout: Timeout = DEFAULT_TIMEOUT) -> Dict:
+    """Download the raw state file of a state version and extract its outputs.
+
+    The state file is parsed while it's downloaded and only its outputs are
+    decoded: the rest of the file is skipped, and the download stops as soon
+    as the outputs are found.
+
+    Args:
+        token (str):
+            The bearer token to use when calling the API.
+        state_version (Dict):
+            The state version, as returned by get_current_state_version().
+        timeout (Timeout):
+            Connect and read timeouts of the request, in seconds.
+
+    Returns:
+        Dict: The output values, indexed by output name.
+    """
+
+    state_url = state_version["data"]["attributes"]["hosted-state-download-url"]
+    state_r = get_session().get(state_url,
+                                headers=_headers(token),
+                                timeout=timeout,
+                                stream=True)
+    with state_r:
+        if state_r.status_code != requests.codes.ok:
+            raise RuntimeError(
+                "Request to %s failed with code %d" % (state_url, state_r.status_code))
+
+        outputs = read_state_outputs(state_r.iter_content(chunk_size=65536))
+
+    return {k: v["value"] for k, v in outputs.items()}
+
+
+def get_current_state_version_outputs(
+    token: str,
+    workspace_id: str,
+    timeout: Timeout = DEFAULT_TIMEOUT,
+) -> Dict:
+    """Fetch the outputs for the current state version.
+
+    Args:
+        token (str):
+            The bearer token to use when calling the API.
+        workspace_id (str):
+            ID of the Terraform Cloud workspace that should be queried.
+        timeout (Timeout):
+            Connect and read timeouts of each request, in seconds.
     
-    state = state_r.json()
-    return {k: v["value"] for k, v in state["outputs"].items()}
+    Returns:
+        Dict: The output values, indexed by output name.
+    """
+
+    # We download the raw state file and extract the outputs from there.
+    current_state = get_current_state_version(token, workspace_id, timeout)
+    return get_state_version_outputs(token, current_state, timeout)
+
+
+def read_state_outputs(chunks: Iterable[bytes]) -> Dict:
+    """Extract the outputs object of a Terraform state document without
+    decoding the rest of it. The document is read chunk by chunk, and reading
+    stops as soon as the outputs object is found (Terraform writes it before
+    the resources).
+
+    Args:
+        chunks (Iterable[bytes]): The chunks of the UTF-8 encoded document.
+
+    Raises:
+        ValueError: When the document is not a valid JSON object.
+
+    Returns:
+        Dict: The raw outputs object, or an empty dict when the state has no
+        outputs.
+    """
+    return _StateReader(chunks).read_outputs()
+
+
+_WHITESPACES_RE = re.compile(r'[\s,:]*')
+_STRING_RE = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+# Matches everything up to the next bracket, except brackets within strings.
+_SKIP_RE = re.compile(r'[^"{}\[\]]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"{}\[\]]*)*')
+_SCALAR_RE = re.compile(r'[^,}\]\s]+')
+
+
+class _StateReader(object):
+    """_StateReader walks the top-level object of a JSON document until it
+    finds the outputs key. Skipped values are only scanned for their
+    boundaries (quotes and brackets), and consumed text is dropped as new
+    chunks are read, such that the document is never fully held in memory.
+    """
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        # Start of the text that should be kept when reading more chunks.
+        self._mark = None  # type: Optional[int]
+
+    def read_outputs(self) -> Dict:
+        if self._skip_whitespaces() != "{":
+            raise ValueError("The state document is not a JSON object.")
+        self._pos += 1
+
+        while self._skip_whitespaces() != "}":
+            key = self._read_string()
+            self._skip_whitespaces()
+
+            if key != "outputs":
+                self._skip_value()
+                continue
+
+            self._mark = self._pos
+            self._skip_value()
+            return json.loads(self._buf[self._mark:self._pos])
+
+        return {}
+
+    def _fill(self):
+        """Read the next chunk and drop the text already consumed."""
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            raise ValueError("Unexpected end of the state document.")
+
+        keep = self._pos if self._mark is None else self._mark
+        self._buf = self._buf[keep:] + self._decoder.decode(chunk)
+        self._pos -= keep
+        if self._mark is not None:
+            self._mark = 0
+
+    def _skip_whitespaces(self) -> str:
+        while True:
+            self._pos = _WHITESPACES_RE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            self._fill()
+
+    def _read_string(self) -> str:
+        return json.loads(self._skip_string())
+
+    def _skip_string(self) -> str:
+        if self._buf[self._pos] != '"':
+            raise ValueError("Expected a string at: %r" %
+                             (self._buf[self._pos:self._pos + 20]))
+
+        while True:
+            m = _STRING_RE.match(self._buf, self._pos)
+            if m is not None:
+                self._pos = m.end()
+                return m.group()
+            # The string is split across chunks: the current position is
+            # kept on its opening quote until it's complete.
+            self._fill()
+
+    def _skip_value(self):
+        c = self._buf[self._pos]
+        if c == '"':
+            self._skip_string()
+            return
+
+        if c not in "{[":
+            while True:
+                m = _SCALAR_RE.match(self._buf, self._pos)
+                if m is not None and m.end() < len(self._buf):
+                    self._pos = m.end()
+                    return
+                self._fill()
+
+        depth = 0
+        while True:
+            self._pos = _SKIP_RE.match(self._buf, self._pos).end()
+            if self._pos == len(self._buf):
+                self._fill()
+                continue
+
+            c = self._buf[self._pos]
+            if c == '"':
+                # The string is split across chunks.
+                self._skip_string()
+                continue
+
+            depth += 1 if c in "{[" else -1
+            self._pos += 1
+            if depth == 0:
+                return
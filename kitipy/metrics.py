@@ -0,0 +1,176 @@
+"""This module provides CommandMetrics, a collector of the command events
+emitted by kitipy Executors, which can export them for later analysis.
+
+Executors emit the following events through their Dispatcher:
+
+  * command.start, with the cmd, host and cwd arguments, when a command is
+    about to be run ;
+  * command.end, with the cmd, host, cwd, start (a Unix timestamp), duration
+    (in seconds), returncode, bytes_in and bytes_out arguments, once the
+    command has ended. The returncode is None when the command could not be
+    run at all. bytes_out only accounts for the captured output (i.e. when
+    the command is run with pipe or tee mode).
+
+Host is 'localhost' for local commands.
+"""
+
+import json
+import os.path
+import threading
+from typing import Any, Dict, List
+from .dispatcher import Dispatcher
+
+FORMATS = ('jsonl', 'chrome', 'openmetrics')
+"""The formats supported by CommandMetrics.write()."""
+
+
+class CommandMetrics(object):
+    """CommandMetrics records the command.end events emitted through a
+    dispatcher, and writes them as:
+
+      * a JSON-lines file (format "jsonl"), with one JSON object per command ;
+      * a Chrome trace file (format "chrome"), which can be loaded into
+        chrome://tracing or https://ui.perfetto.dev, with one track per host ;
+      * an OpenMetrics text file (format "openmetrics"), with counters and
+        cumulative durations per host, as expected by node_exporter textfile
+        collector or a StatsD/Prometheus bridge.
+
+    It's set up by RootCommand when the "metrics" config key is defined:
+
+        metrics:
+          path: .kitipy/metrics.jsonl
+          format: jsonl
+    """
+    def __init__(self):
+        self.commands = []  # type: List[Dict[str, Any]]
+        self._lock = threading.Lock()
+
+    def attach(self, dispatcher: Dispatcher):
+        """Start recording the commands run by the executors using the given
+        dispatcher.
+        """
+        dispatcher.on('command.end', self._on_end)
+
+    def _on_end(self, **kwargs) -> bool:
+        with self._lock:
+            self.commands.append(kwargs)
+        # Let other listeners get the event.
+        return True
+
+    def write(self, path: str, format: str = 'jsonl'):
+        """Write the recorded commands to a file. JSON-lines files are
+        appended to, such that a single file can collect many runs, whereas
+        other formats are overwritten.
+
+        Args:
+            path (str): Path to the file to write.
+            format (str): Either jsonl, chrome or openmetrics.
+
+        Raises:
+            ValueError: When the format is not supported.
+        """
+        if format not in FORMATS:
+            raise ValueError('Metrics format "%s" is not supported.' %
+                             (format))
+
+        with self._lock:
+            commands = list(self.commands)
+
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        if format == 'jsonl':
+            with open(path, 'a') as f:
+                for command in commands:
+                    f.write(json.dumps(command) + '\n')
+            return
+
+        if format == 'chrome':
+            content = json.dumps(_chrome_trace(commands))
+        else:
+            content = _openmetrics(commands)
+
+        with open(path, 'w') as f:
+            f.write(content)
+
+
+def _chrome_trace(commands: List[Dict[str, Any]]) -> Dict[str, Any]:
+    hosts = sorted(set(str(c['host']) for c in commands))
+    events = [{
+        'name': 'thread_name',
+        'ph': 'M',
+        'pid': 1,
+        'tid': tid,
+        'args': {
+            'name': host
+        },
+    } for tid, host in enumerate(hosts)]
+
+    for command in commands:
+        events.append({
+            'name': command['cmd'],
+            'cat': 'command',
+            'ph': 'X',
+            'pid': 1,
+            'tid': hosts.index(str(command['host'])),
+            'ts': int(command['start'] * 1e6),
+            'dur': int(command['duration'] * 1e6),
+            'args': {
+                'cwd': command['cwd'],
+                'returncode': command['returncode'],
+                'bytes_in': command['bytes_in'],
+                'bytes_out': command['bytes_out'],
+            },
+        })
+
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def _openmetrics(commands: List[Dict[str, Any]]) -> str:
+    stats = {}  # type: Dict[str, Dict[str, float]]
+    for command in commands:
+        host = str(command['host'])
+        if host not in stats:
+            stats[host] = {
+                'total': 0,
+                'failed': 0,
+                'seconds': 0.0,
+                'bytes_in': 0,
+                'bytes_out': 0,
+            }
+        stats[host]['total'] += 1
+        stats[host]['failed'] += 1 if command['returncode'] != 0 else 0
+        stats[host]['seconds'] += command['duration']
+        stats[host]['bytes_in'] += command['bytes_in']
+        stats[host]['bytes_out'] += command['bytes_out']
+
+    metrics = [
+        ('kitipy_commands', 'total', 'Number of commands run.'),
+        ('kitipy_commands_failed', 'failed',
+         'Number of commands that failed.'),
+        ('kitipy_command_duration_seconds', 'seconds',
+         'Time spent running commands.'),
+        ('kitipy_command_input_bytes', 'bytes_in',
+         'Bytes written to commands stdin.'),
+        ('kitipy_command_output_bytes', 'bytes_out',
+         'Bytes captured from commands stdout/stderr.'),
+    ]
+
+    lines = []  # type: List[str]
+    for name, key, help in metrics:
+        lines.append('# TYPE %s counter' % (name))
+        lines.append('# HELP %s %s' % (name, help))
+        for host in sorted(stats.keys()):
+            label = host.replace('\\', '\\\\').replace('"', '\\"')
+            lines.append('%s_total{host="%s"} %s' %
+                         (name, label, _format_number(stats[host][key])))
+    lines.append('# EOF')
+
+    return '\n'.join(lines) + '\n'
+
+
+def _format_number(value: float) -> str:
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
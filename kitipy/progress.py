@@ -0,0 +1,118 @@
+"""This module provides TransferProgress, the model used by Executors to
+report the progress of file transfers through the file_transfer.* events of
+their Dispatcher.
+"""
+
+import threading
+import time
+from typing import Callable, Optional
+from .dispatcher import Dispatcher
+
+
+class TransferProgress(object):
+    """TransferProgress tracks the number of bytes transferred by one or many
+    concurrent transfers and reports them as a single progress.
+
+    It's used as a context manager: file_transfer.start is emitted when
+    entering it and file_transfer.end when exiting. In between, progress is
+    coalesced: file_transfer.update is emitted at most once per interval
+    (and when min_bytes more bytes have been transferred, if provided),
+    instead of once per transferred block, and a last time when the transfer
+    ends.
+
+        with TransferProgress(dispatcher, size, label) as progress:
+            sftp.put(local_path, remote_path, callback=progress.callback())
+
+    It's thread-safe, such that concurrent transfers can share it.
+    """
+    def __init__(self,
+                 dispatcher: Dispatcher,
+                 size: int,
+                 label: str,
+                 interval: float = 0.1,
+                 min_bytes: Optional[int] = None,
+                 initial: int = 0):
+        """
+        Args:
+            dispatcher (Dispatcher):
+                The dispatcher used to emit file_transfer.* events.
+            size (int):
+                The total number of bytes to transfer.
+            label (str):
+                The label of the transfer.
+            interval (float):
+                Minimum number of seconds between two update events.
+            min_bytes (Optional[int]):
+                When provided, an update event is also emitted once that many
+                bytes have been transferred since the last one, regardless of
+                interval.
+            initial (int):
+                The number of bytes already transferred (e.g. when resuming a
+                download).
+        """
+        self.size = size
+        self.label = label
+        self.interval = interval
+        self.min_bytes = min_bytes
+        self.current = initial
+        self._dispatcher = dispatcher
+        self._lock = threading.Lock()
+        self._emitted = initial
+        self._emitted_at = 0.0
+
+    def __enter__(self):
+        self._dispatcher.emit('file_transfer.start',
+                              size=self.size,
+                              label=self.label)
+        self._emitted_at = time.monotonic()
+        return self
+
+    def __exit__(self, *args):
+        try:
+            self.flush()
+        finally:
+            self._dispatcher.emit('file_transfer.end')
+
+    def advance(self, n: int):
+        """Account for n more bytes transferred.
+
+        Args:
+            n (int): Number of bytes transferred since the last call.
+        """
+        with self._lock:
+            self.current += n
+            now = time.monotonic()
+            due = now - self._emitted_at >= self.interval
+            if self.min_bytes is not None:
+                due = due or self.current - self._emitted >= self.min_bytes
+            if due:
+                self._emit(now)
+
+    def callback(self) -> Callable[[int, int], None]:
+        """Get a callback for a single transfer, as expected by paramiko SFTP
+        methods (i.e. taking the bytes transferred so far and the size of the
+        file).
+        """
+        done = 0
+
+        def callback(current: int, total: int):
+            nonlocal done
+            self.advance(current - done)
+            done = current
+
+        return callback
+
+    def flush(self):
+        """Emit an update event if some bytes were transferred since the last
+        one.
+        """
+        with self._lock:
+            if self.current != self._emitted:
+                self._emit(time.monotonic())
+
+    def _emit(self, now: float):
+        self._emitted = self.current
+        self._emitted_at = now
+        self._dispatcher.emit('file_transfer.update',
+                              current=self.current,
+                              total=self.size)
@@ -0,0 +1,288 @@
+"""This module provides RemoteFS, a facade over the SFTP client of a remote
+Executor used to inspect and manipulate the remote filesystem without
+spawning a new command for each operation.
+"""
+
+import errno
+import os.path
+import posixpath
+import shlex
+import stat
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from .lazy import lazy_import
+
+paramiko = lazy_import('paramiko')
+
+_STAT_BATCH_SIZE = 500
+"""Maximum number of paths passed to a single stat command by stat_many()."""
+
+
+class RemoteFS(object):
+    """RemoteFS provides the common filesystem operations on the remote host
+    of an Executor, through its SFTP session.
+
+    The results of stat() are cached for a short time, such that checking the
+    same paths over and over doesn't cost a round trip each time. The cache is
+    invalidated by the mutations done through RemoteFS, as well as by every
+    command run and every file uploaded by the Executor.
+    Many paths can also be checked at once through stat_many() and
+    exists_many().
+
+    Temporary directories created through mkdtemp() are removed by cleanup(),
+    which is called when the RemoteFS is used as a context manager and when
+    the Executor is closed.
+
+    Relative paths are resolved from the remote working directory of the
+    Executor.
+    """
+    def __init__(self, executor, ttl: float = 2.0):
+        """
+        Args:
+            executor (kitipy.Executor):
+                The remote Executor providing the SFTP session.
+            ttl (float):
+                Number of seconds stat results are cached.
+        """
+        self._executor = executor
+        self.ttl = ttl
+        self._cache = {
+        }  # type: Dict[str, Tuple[float, Optional[paramiko.SFTPAttributes]]]
+        self._tempdirs = []  # type: List[str]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.cleanup()
+
+    def _path(self, path: str) -> str:
+        if not posixpath.isabs(path) and self._executor.remote_cwd:
+            path = posixpath.join(self._executor.remote_cwd, path)
+        return posixpath.normpath(path)
+
+    def _cached(self, path: str):
+        entry = self._cache.get(path)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            raise KeyError(path)
+        return entry[1]
+
+    def _store(self, path: str, attrs: 'Optional[paramiko.SFTPAttributes]'):
+        self._cache[path] = (time.monotonic(), attrs)
+
+    def invalidate(self, path: Optional[str] = None):
+        """Drop the cached stat results of a path and everything below it, or
+        the whole cache when no path is provided.
+        """
+        if path is None:
+            self._cache = {}
+            return
+
+        path = self._path(path)
+        prefix = path.rstrip('/') + '/'
+        for cached in list(self._cache.keys()):
+            if cached == path or cached.startswith(prefix):
+                del self._cache[cached]
+
+    def stat(self, path: str) -> 'paramiko.SFTPAttributes':
+        """Get the attributes of a remote file, following symlinks.
+
+        Raises:
+            FileNotFoundError: When the path doesn't exist.
+
+        Returns:
+            paramiko.SFTPAttributes: The file attributes.
+        """
+        path = self._path(path)
+        try:
+            attrs = self._cached(path)
+        except KeyError:
+            try:
+                attrs = self._executor.sftp.stat(path)
+            except IOError as err:
+                if err.errno != errno.ENOENT:
+                    raise
+                attrs = None
+            self._store(path, attrs)
+
+        if attrs is None:
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT),
+                                    path)
+        return attrs
+
+    def exists(self, path: str) -> bool:
+        """Check if a remote path exists."""
+        try:
+            self.stat(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def isdir(self, path: str) -> bool:
+        """Check if a remote path exists and is a directory."""
+        try:
+            return stat.S_ISDIR(self.stat(path).st_mode)
+        except FileNotFoundError:
+            return False
+
+    def stat_many(
+            self,
+            paths: Iterable[str]) -> 'Dict[str, Optional[paramiko.SFTPAttributes]]':
+        """Get the attributes of many remote files at once. The paths that
+        aren't cached are checked through a single `stat` command (per batch
+        of 500 paths), instead of a round trip per path.
+
+        Args:
+            paths (Iterable[str]): The paths to check.
+
+        Returns:
+            Dict[str, Optional[paramiko.SFTPAttributes]]:
+                The attributes of each path, or None when it doesn't exist.
+        """
+        resolved = {path: self._path(path) for path in paths}
+        found = {}  # type: Dict[str, Optional[paramiko.SFTPAttributes]]
+        missing = []  # type: List[str]
+        for path in set(resolved.values()):
+            try:
+                found[path] = self._cached(path)
+            except KeyError:
+                missing.append(path)
+
+        for i in range(0, len(missing), _STAT_BATCH_SIZE):
+            batch = missing[i:i + _STAT_BATCH_SIZE]
+            # The stat command doesn't change anything, so it shouldn't drop
+            # the results cached by the previous batches.
+            res = self._executor._remote(
+                "stat -L -c '%%s %%f %%Y %%u %%g %%n' -- %s 2>/dev/null" %
+                (' '.join(shlex.quote(p) for p in batch)),
+                pipe=True,
+                check=False,
+                invalidate=False)
+            stats = _parse_stat(res.stdout)
+            for path in batch:
+                found[path] = stats.get(path)
+                self._store(path, found[path])
+
+        return {path: found[full] for path, full in resolved.items()}
+
+    def exists_many(self, paths: Iterable[str]) -> Dict[str, bool]:
+        """Check if many remote paths exist at once. See stat_many()."""
+        return {
+            path: attrs is not None
+            for path, attrs in self.stat_many(paths).items()
+        }
+
+    def listdir(self, path: str) -> List[str]:
+        """List the entries of a remote directory. The attributes of the
+        entries are cached along the way.
+        """
+        path = self._path(path)
+        entries = self._executor.sftp.listdir_attr(path)
+        names = []  # type: List[str]
+        for attrs in entries:
+            names.append(attrs.filename)
+            # Symlinks are not cached as stat() follows them.
+            if not stat.S_ISLNK(attrs.st_mode or 0):
+                self._store(posixpath.join(path, attrs.filename), attrs)
+        return names
+
+    def mkdir(self, path: str, parents: bool = False, mode: int = 0o777):
+        """Create a remote directory.
+
+        Args:
+            path (str): The directory to create.
+            parents (bool):
+                Whether missing parent directories should be created as well.
+                No error is raised if the directory already exists in that
+                case, like `mkdir -p`.
+            mode (int): The permissions of the new directories.
+        """
+        path = self._path(path)
+        self.invalidate(path)
+        if parents:
+            if self.isdir(path):
+                return
+            parent = posixpath.dirname(path)
+            if parent != path:
+                self.mkdir(parent, True, mode)
+
+        try:
+            self._executor.sftp.mkdir(path, mode)
+        except IOError:
+            # Like `mkdir -p`, a directory created in the meantime is fine.
+            self.invalidate(path)
+            if not parents or not self.isdir(path):
+                raise
+        else:
+            # The path was checked and cached as missing by isdir().
+            self.invalidate(path)
+
+    def remove(self, path: str):
+        """Remove a remote file."""
+        path = self._path(path)
+        self.invalidate(path)
+        self._executor.sftp.remove(path)
+
+    def rename(self, src: str, dest: str):
+        """Rename a remote file or directory, overwriting the destination if
+        it exists.
+        """
+        src, dest = self._path(src), self._path(dest)
+        self.invalidate(src)
+        self.invalidate(dest)
+        self._executor.sftp.posix_rename(src, dest)
+
+    def mkdtemp(self,
+                suffix: Optional[str] = None,
+                prefix: Optional[str] = None,
+                dir: Optional[str] = None) -> str:
+        """Create a remote temporary directory, removed by cleanup().
+
+        Args:
+            suffix (Optional[str]): Suffix of the directory name.
+            prefix (Optional[str]): Prefix of the directory name.
+            dir (Optional[str]):
+                Directory where the temporary directory should be created
+                (/tmp by default).
+
+        Returns:
+            str: The path to the temporary directory.
+        """
+        template = posixpath.join(dir or '/tmp', (prefix or '') + 'XXXXXXXX' +
+                                  (suffix or ''))
+        res = self._executor.run('mktemp -d %s' % (shlex.quote(template)),
+                                 pipe=True)
+        path = res.stdout.strip()
+        self._tempdirs.append(path)
+        return path
+
+    def cleanup(self):
+        """Remove the temporary directories created through mkdtemp()."""
+        if len(self._tempdirs) == 0:
+            return
+
+        tempdirs, self._tempdirs = self._tempdirs, []
+        self._executor.run('rm -rf %s' %
+                           (' '.join(shlex.quote(p) for p in tempdirs)),
+                           pipe=True,
+                           check=False)
+        for path in tempdirs:
+            self.invalidate(path)
+
+
+def _parse_stat(output: str) -> 'Dict[str, paramiko.SFTPAttributes]':
+    found = {}  # type: Dict[str, paramiko.SFTPAttributes]
+    for line in output.split('\n'):
+        parts = line.split(' ', 5)
+        if len(parts) != 6:
+            continue
+
+        attrs = paramiko.SFTPAttributes()
+        attrs.st_size = int(parts[0])
+        attrs.st_mode = int(parts[1], 16)
+        attrs.st_mtime = int(parts[2])
+        attrs.st_atime = attrs.st_mtime
+        attrs.st_uid = int(parts[3])
+        attrs.st_gid = int(parts[4])
+        found[posixpath.normpath(parts[5])] = attrs
+    return found
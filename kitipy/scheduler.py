@@ -0,0 +1,134 @@
+"""This module provides TaskScheduler, used to run kitipy tasks concurrently
+while honoring their dependencies.
+"""
+
+import click
+import concurrent.futures
+import os
+from typing import Any, Dict, List, Optional
+from .exceptions import TaskError
+
+
+class TaskScheduler(object):
+    """TaskScheduler builds the dependency graph of a set of tasks, through
+    their depends_on attribute (see kitipy.Task), and runs them on a pool of
+    threads: a task is started as soon as all of its dependencies are done,
+    such that independent tasks run concurrently. Tasks appearing many times
+    in the graph (e.g. a dependency shared by two tasks) are run only once.
+    Dependencies that already completed in the same kitipy Context, for the
+    same stage and stack, are not run again.
+
+    When a task fails, no more tasks are started, the running ones are waited
+    for and the error of the first failed task is raised.
+
+    Note that tasks share the same kitipy Context: tasks run concurrently
+    shouldn't change its state (e.g. through kctx.cd() or
+    kctx.using_stage()). Their outputs might also be interleaved.
+
+    You generally don't need to use it directly, as it's used by
+    Context.invoke_parallel() and by tasks with dependencies.
+    """
+    def __init__(self, kctx, concurrency: Optional[int] = None):
+        """
+        Args:
+            kctx (kitipy.Context):
+                The kitipy Context used to invoke the tasks.
+            concurrency (Optional[int]):
+                Maximum number of tasks running at the same time. Defaults to
+                the number of CPUs.
+        """
+        self._kctx = kctx
+        self.concurrency = concurrency or os.cpu_count() or 1
+
+    def run(self, tasks: List[click.Command]) -> List[Any]:
+        """Run the given tasks, and their dependencies, concurrently.
+
+        Args:
+            tasks (List[click.Command]): The tasks to run.
+
+        Raises:
+            kitipy.TaskError: When the dependencies of the tasks are circular.
+
+        Returns:
+            List[Any]: The values returned by the given tasks, in the same
+            order (the values returned by their dependencies are dropped).
+        """
+        pending = _build_graph(tasks)
+        click_ctx = click.get_current_context()
+        results = {}  # type: Dict[click.Command, Any]
+
+        # Dependencies already run through the same kitipy Context (e.g. by a
+        # previous kctx.invoke()) are not run again.
+        for task in list(pending.keys()):
+            if task not in tasks and self._kctx._has_completed(task):
+                del pending[task]
+                results[task] = None
+        running = {}  # type: Dict[concurrent.futures.Future, click.Command]
+        error = None  # type: Optional[BaseException]
+
+        workers = max(1, min(self.concurrency, len(pending)))
+        with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+            while len(pending) > 0 or len(running) > 0:
+                ready = [] if error is not None else [
+                    task for task, deps in pending.items()
+                    if all(dep in results for dep in deps)
+                ]
+                for task in ready:
+                    del pending[task]
+                    future = pool.submit(self._invoke, click_ctx, task)
+                    running[future] = task
+
+                if len(running) == 0:
+                    break
+
+                done, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    try:
+                        results[task] = future.result()
+                    except BaseException as err:
+                        error = error if error is not None else err
+
+        if error is not None:
+            raise error
+
+        return [results[task] for task in tasks]
+
+    def _invoke(self, click_ctx: click.Context, task: click.Command) -> Any:
+        # The click Context stack is thread-local, so the current Context has
+        # to be pushed again in the worker thread.
+        with click_ctx.scope(cleanup=False):
+            return self._kctx._invoke(task, (), {}, False)
+
+
+def _build_graph(
+        tasks: List[click.Command]) -> Dict[click.Command, List[click.Command]]:
+    """Collect the given tasks and their transitive dependencies, and map each
+    of them to its direct dependencies.
+
+    Raises:
+        kitipy.TaskError: When the dependencies are circular.
+    """
+    graph = {}  # type: Dict[click.Command, List[click.Command]]
+    visiting = []  # type: List[click.Command]
+
+    def visit(task: click.Command):
+        if task in graph:
+            return
+        if task in visiting:
+            cycle = visiting[visiting.index(task):] + [task]
+            raise TaskError('Tasks have circular dependencies: %s.' %
+                            (' -> '.join(str(t.name) for t in cycle)))
+
+        visiting.append(task)
+        deps = list(getattr(task, 'depends_on', []))
+        for dep in deps:
+            visit(dep)
+        visiting.pop()
+        graph[task] = deps
+
+    for task in tasks:
+        visit(task)
+
+    return graph
@@ -0,0 +1,450 @@
+"""This module provides the SSH connection pool shared by all the kitipy
+Executors of a process, as well as the persistent shell sessions used by
+Executors running in session mode.
+
+Executors are created every time a stage-scoped task group is invoked or
+its help message is generated. Without a pool, each of them would open its
+own SSH connection and pay for a new TCP handshake, key exchange and
+authentication. Instead, executors borrow connections from the pool and give
+them back when they're destroyed, such that the live connections can be
+reused by the next executor targeting the same host.
+"""
+
+import atexit
+import codecs
+import select
+import shlex
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+from .capture import CaptureBuffer
+from .lazy import lazy_import
+
+paramiko = lazy_import('paramiko')
+
+ConnectionKey = Tuple[str, int, Optional[str], Optional[str]]
+"""ConnectionKey identifies a pooled connection by the resolved connection
+parameters: hostname, port, username and proxy command.
+"""
+
+
+def connection_key(params: Dict[str, Any]) -> ConnectionKey:
+    """Get the key identifying a connection in the pool from the parameters
+    passed to paramiko.
+
+    Args:
+        params (Dict[str, Any]):
+            The parameters passed to paramiko.SSHClient.connect(), as
+            resolved by the Executor from the ssh_config file.
+
+    Returns:
+        ConnectionKey: The hostname, port, username and proxy command.
+    """
+    return (params['hostname'], int(params.get('port', 22)),
+            params.get('username'), params.get('proxycommand'))
+
+
+class _PooledConnection(object):
+    def __init__(self):
+        self.client = None  # type: Optional[paramiko.SSHClient]
+        self.refcount = 0
+        self.idle_since = time.monotonic()
+        self.lock = threading.Lock()
+
+
+class ConnectionPool(object):
+    """ConnectionPool keeps SSH connections opened and shares them between
+    the Executors targeting the same host.
+
+    Connections are reference counted: they're acquired by Executors when
+    they run their first command and released when the Executors are
+    destroyed. Connections not used by any Executor for more than
+    idle_timeout seconds are closed the next time the pool is used. All
+    the connections are closed when the CLI exits.
+    """
+    def __init__(self, idle_timeout: float = 60.0):
+        """
+        Args:
+            idle_timeout (float):
+                Number of seconds an unused connection is kept opened.
+        """
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._connections = {}  # type: Dict[ConnectionKey, _PooledConnection]
+        # The pool key of each client handed out and the number of times it's
+        # been handed out. Clients are looked up there when they're released
+        # since they might have been replaced in the pool by a new connection
+        # in the meantime.
+        self._borrowed = {}  # type: Dict[paramiko.SSHClient, List[Any]]
+
+    def __len__(self):
+        return len(self._connections)
+
+    def acquire(
+            self, params: Dict[str, Any],
+            missing_host_key_policy: 'paramiko.MissingHostKeyPolicy'
+    ) -> 'paramiko.SSHClient':
+        """Borrow a live connection to the host described by params, or open
+        it if there's none.
+
+        Args:
+            params (Dict[str, Any]):
+                The parameters passed to paramiko.SSHClient.connect(). The
+                "proxycommand" parameter is turned into a
+                paramiko.ProxyCommand when the connection is opened.
+            missing_host_key_policy (paramiko.MissingHostKeyPolicy):
+                The policy used by paramiko when the host key is unknown.
+
+        Raises:
+            paramiko.SSHException: When it fails to open the connection.
+
+        Returns:
+            paramiko.SSHClient: The connected SSH client.
+        """
+        key = connection_key(params)
+
+        with self._lock:
+            self._evict_idle()
+            if key not in self._connections:
+                self._connections[key] = _PooledConnection()
+            conn = self._connections[key]
+            conn.refcount += 1
+
+        # Connections are opened outside of the pool lock, such that
+        # concurrent Executors targeting different hosts don't wait for each
+        # other.
+        try:
+            with conn.lock:
+                if conn.client is None or not _is_active(conn.client):
+                    conn.client = _connect(params, missing_host_key_policy)
+                client = conn.client
+        except Exception:
+            with self._lock:
+                self._release(key)
+            raise
+
+        with self._lock:
+            borrowed = self._borrowed.setdefault(client, [key, 0])
+            borrowed[1] += 1
+
+        return client
+
+    def release(self, client: 'paramiko.SSHClient'):
+        """Give back a connection previously acquired. The connection is kept
+        opened until it gets evicted.
+
+        Args:
+            client (paramiko.SSHClient): The client returned by acquire().
+        """
+        with self._lock:
+            borrowed = self._borrowed.get(client)
+            if borrowed is None:
+                return
+
+            key, count = borrowed
+            if count > 1:
+                borrowed[1] -= 1
+            else:
+                del self._borrowed[client]
+            self._release(key)
+
+    def _release(self, key: ConnectionKey):
+        conn = self._connections.get(key)
+        if conn is None:
+            # The pool got closed in the meantime.
+            return
+        conn.refcount = max(0, conn.refcount - 1)
+        if conn.refcount == 0:
+            conn.idle_since = time.monotonic()
+        self._evict_idle()
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        for key, conn in list(self._connections.items()):
+            if conn.refcount > 0:
+                continue
+            idle_for = now - conn.idle_since
+            if conn.client is not None and idle_for < self.idle_timeout:
+                continue
+
+            if conn.client is not None:
+                conn.client.close()
+            del self._connections[key]
+
+    def close(self):
+        """Close all the connections, including the ones still in use."""
+        with self._lock:
+            for conn in self._connections.values():
+                if conn.client is not None:
+                    conn.client.close()
+            self._connections = {}
+            self._borrowed = {}
+
+
+def _is_active(client: 'paramiko.SSHClient') -> bool:
+    transport = client.get_transport()
+    return transport is not None and transport.is_active()
+
+
+def _connect(
+        params: Dict[str, Any],
+        missing_host_key_policy: 'paramiko.MissingHostKeyPolicy'
+) -> 'paramiko.SSHClient':
+    params = dict(params)
+    proxycommand = params.pop('proxycommand', None)
+    if proxycommand is not None:
+        params['sock'] = paramiko.ProxyCommand(proxycommand)
+
+    client = paramiko.SSHClient()
+    client.load_system_host_keys()
+    client.set_missing_host_key_policy(missing_host_key_policy)
+    client.connect(**params)
+    return client
+
+
+def quote_path(path: str) -> str:
+    """Quote a remote path for use in a shell command. A leading ~ is left
+    unquoted such that it still expands to the home directory.
+    """
+    if path == '~':
+        return path
+    if path.startswith('~/'):
+        return '~/' + shlex.quote(path[2:])
+    return shlex.quote(path)
+
+
+class ShellSession(object):
+    """ShellSession keeps a single shell running on a remote host and runs
+    commands through it, instead of opening a new SSH channel per command.
+
+    Each command is written to the shell stdin, followed by a unique sentinel
+    printed on both stdout and stderr, along with the exit code of the
+    command. The output of the command is read until the sentinels are found.
+    Commands are run in a subshell with their stdin closed, such that they
+    can't alter the session state (e.g. cwd, env vars) or consume the next
+    commands.
+    """
+    def __init__(self, client: 'paramiko.SSHClient', shell: str = '/bin/sh'):
+        """
+        Args:
+            client (paramiko.SSHClient):
+                The connected SSH client used to open the session channel.
+            shell (str):
+                The shell started on the remote host.
+        """
+        self._client = client
+        self._shell = shell
+        self._channel = None  # type: Optional[paramiko.Channel]
+        self._lock = threading.Lock()
+
+    @property
+    def channel(self) -> 'paramiko.Channel':
+        """Get the channel of the session, or open it if it's not opened yet
+        or has been closed.
+        """
+        if self._channel is None or self._channel.closed:
+            transport = self._client.get_transport()
+            if transport is None:
+                raise paramiko.SSHException('SSH connection is not opened.')
+
+            self._channel = transport.open_session()
+            self._channel.exec_command(self._shell)
+
+        return self._channel
+
+    def run(self,
+            cmd: str,
+            env: Optional[Dict[str, str]] = None,
+            cwd: Optional[str] = None,
+            text: bool = True,
+            encoding: Optional[str] = None,
+            pipe: bool = False,
+            max_size: Optional[int] = None) -> subprocess.CompletedProcess:
+        """Run a command through the session.
+
+        Args:
+            cmd (str):
+                Command and args to run.
+            env (Optional[Dict[str, str]]):
+                Env vars exported before running the command.
+            cwd (Optional[str]):
+                Working directory where the command should be run.
+            text (bool):
+                Whether stdout/stderr should be decoded into strings.
+            encoding (Optional[str]):
+                Encoding used to decode stdout/stderr.
+            pipe (bool):
+                Whether the command output should be captured (when True), or
+                outputted to kitipy stdout/stderr (when False).
+            max_size (Optional[int]):
+                When set, only the last max_size bytes of stdout/stderr are
+                captured.
+
+        Raises:
+            paramiko.SSHException: When the session ends before the command
+                completes.
+
+        Returns:
+            subprocess.CompletedProcess
+        """
+        encoding = encoding if encoding else sys.getdefaultencoding()
+        sentinel = 'KITIPY_%s' % (uuid.uuid4().hex)
+
+        script = ['(']
+        if cwd:
+            script.append('cd %s || exit 1' % (quote_path(cwd)))
+        for name, value in (env or {}).items():
+            script.append('export %s=%s' % (name, shlex.quote(value)))
+        script.append(cmd)
+        script.append(') </dev/null')
+        script.append("printf '%%s %%d\\n' %s $?" % (sentinel))
+        script.append("printf '%%s\\n' %s >&2" % (sentinel))
+
+        with self._lock:
+            try:
+                channel = self.channel
+                channel.sendall(('\n'.join(script) + '\n').encode(encoding))
+                stdout, stderr = self._read_until(channel, sentinel.encode(),
+                                                  encoding, pipe, max_size)
+            except BaseException:
+                # The shell might still be running the command, or its output
+                # is partly read: the next command can't use the channel.
+                self.close()
+                raise
+
+        # stdout ends with "<sentinel> <exit code>\n".
+        returncode = int(stdout[1].split()[0])
+        out = stdout[0]  # type: Any
+        err = stderr[0]  # type: Any
+        if not pipe:
+            out, err = b'', b''
+        if text:
+            out, err = out.decode(encoding), err.decode(encoding)
+
+        return subprocess.CompletedProcess(cmd, returncode, out, err)
+
+    def _read_until(self, channel: 'paramiko.Channel', sentinel: bytes,
+                    encoding: str, pipe: bool,
+                    max_size: Optional[int]) -> List[Tuple[bytes, bytes]]:
+        streams = [
+            _SentinelReader(channel.recv, channel.recv_ready, sentinel,
+                            None if pipe else sys.stdout, encoding, b'\n',
+                            max_size),
+            _SentinelReader(channel.recv_stderr, channel.recv_stderr_ready,
+                            sentinel, None if pipe else sys.stderr, encoding,
+                            b'\n', max_size),
+        ]
+
+        while not all(stream.done for stream in streams):
+            ready = [s for s in streams if not s.done and s.ready()]
+            for stream in ready:
+                stream.read()
+
+            if len(ready) > 0:
+                continue
+            if channel.exit_status_ready() or channel.closed:
+                raise paramiko.SSHException(
+                    'The remote shell session ended unexpectedly.')
+
+            select.select([channel], [], [], 1)
+
+        return [(s.output, s.trailer) for s in streams]
+
+    def close(self):
+        if self._channel is not None:
+            self._channel.close()
+            self._channel = None
+
+
+class _SentinelReader(object):
+    """Read a stream of a ShellSession until the sentinel is found. When an
+    output file is provided, the data read are written there as they arrive,
+    except the trailing bytes that might be the beginning of the sentinel.
+    Otherwise, they're captured in a CaptureBuffer, keeping only the last
+    max_size bytes when it's set.
+
+    Only the bytes that might be the beginning of the sentinel are kept
+    between two reads, such that the memory used doesn't depend on the size of
+    the output.
+    """
+    def __init__(self,
+                 recv,
+                 ready,
+                 sentinel: bytes,
+                 output,
+                 encoding: str,
+                 terminator: Optional[bytes],
+                 max_size: Optional[int] = None):
+        self.ready = ready
+        self.done = False
+        self.trailer = b''
+        self._recv = recv
+        self._sentinel = sentinel
+        self._terminator = terminator
+        self._buffer = bytearray()
+        self._file = output
+        self._decoder = codecs.getincrementaldecoder(encoding)('replace')
+        self._capture = None  # type: Optional[CaptureBuffer]
+        if output is None:
+            self._capture = CaptureBuffer(None, max_size, True)
+
+    @property
+    def output(self) -> bytes:
+        """The captured output, or empty bytes when it's been printed."""
+        if self._capture is None:
+            return b''
+        return self._capture.getvalue()  # type: ignore
+
+    def read(self):
+        self._buffer += self._recv(32768)
+
+        pos = self._buffer.find(self._sentinel)
+        if pos == -1:
+            # The end of the buffer might be the beginning of the sentinel,
+            # thus it's kept until more data are received.
+            self._consume(len(self._buffer) - len(self._sentinel) + 1)
+            return
+
+        self._consume(pos)
+        trailer = bytes(self._buffer[len(self._sentinel):])
+        if self._terminator is not None and self._terminator not in trailer:
+            return
+
+        self.trailer = trailer
+        self._buffer = bytearray()
+        self.done = True
+        if self._file is not None:
+            print(self._decoder.decode(b'', True), file=self._file, end='')
+            self._file.flush()
+
+    def _consume(self, end: int):
+        if end <= 0:
+            return
+
+        chunk = bytes(self._buffer[:end])
+        del self._buffer[:end]
+        if self._capture is not None:
+            self._capture.write(chunk)
+        else:
+            print(self._decoder.decode(chunk), file=self._file, end='')
+
+
+_pool = None  # type: Optional[ConnectionPool]
+
+
+def get_connection_pool() -> ConnectionPool:
+    """Get the process-wide connection pool used by default by Executors.
+    It's lazily created and all its connections are closed when the process
+    exits.
+
+    Returns:
+        ConnectionPool: The process-wide connection pool.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ConnectionPool()
+        atexit.register(_pool.close)
+    return _pool
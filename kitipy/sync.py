@@ -0,0 +1,147 @@
+"""This module provides the manifests used by Executor.sync() to find out
+which files of a directory tree have to be transferred to a remote target.
+
+A manifest maps the path of each file of a tree, relative to its root, to
+the SHA-256 digest of its content. Building the manifest of a local tree
+requires to hash all its files, so digests are cached along with the size
+and mtime of each file, such that unchanged files don't get rehashed on the
+next run.
+"""
+
+import hashlib
+import json
+import os
+import os.path
+import shlex
+import string
+from typing import Dict, List, Optional, Tuple
+from .exceptions import TaskError
+
+Manifest = Dict[str, str]
+"""Manifest maps relative file paths to the SHA-256 digest of their content."""
+
+
+def build_manifest(root: str, cache_dir: Optional[str] = None) -> Manifest:
+    """Build the manifest of a local directory tree.
+
+    Args:
+        root (str):
+            Path to the root of the tree.
+        cache_dir (Optional[str]):
+            Directory where the digests are cached between runs. When None,
+            every file is hashed.
+
+    Returns:
+        Manifest: The digest of each file of the tree.
+    """
+    root = os.path.abspath(root)
+    cache_file = None
+    cached = {}  # type: Dict[str, Tuple[int, int, str]]
+    if cache_dir is not None:
+        key = hashlib.sha1(root.encode('utf-8')).hexdigest()
+        cache_file = os.path.join(cache_dir, key + '.json')
+        cached = _load_cache(cache_file)
+
+    manifest = {}  # type: Manifest
+    entries = {}  # type: Dict[str, Tuple[int, int, str]]
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            relpath = os.path.relpath(path, root)
+            stat = os.stat(path)
+
+            entry = cached.get(relpath)
+            if entry is None or (entry[0], entry[1]) != (stat.st_size,
+                                                         stat.st_mtime_ns):
+                entry = (stat.st_size, stat.st_mtime_ns, hash_file(path))
+
+            entries[relpath] = entry
+            manifest[relpath] = entry[2]
+
+    if cache_file is not None:
+        _save_cache(cache_file, entries)
+
+    return manifest
+
+
+def hash_file(path: str) -> str:
+    """Compute the SHA-256 digest of a file content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _load_cache(cache_file: str) -> Dict[str, Tuple[int, int, str]]:
+    try:
+        with open(cache_file, 'r') as f:
+            return {k: tuple(v) for k, v in json.load(f).items()}
+    except (OSError, ValueError):
+        # A missing or corrupted cache only means files get rehashed.
+        return {}
+
+
+def _save_cache(cache_file: str, entries: Dict[str, Tuple[int, int, str]]):
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp_file = cache_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(entries, f)
+    os.replace(tmp_file, cache_file)
+
+
+def remote_manifest_cmd(root: str) -> str:
+    """Get the shell command printing the manifest of a remote tree, in
+    sha256sum format. Nothing is printed when the tree doesn't exist.
+    """
+    root = shlex.quote(root)
+    return ('if [ -d %s ]; then cd %s && find . -type f -exec sha256sum {} +; '
+            'fi') % (root, root)
+
+
+def parse_sha256sum(output: str) -> Manifest:
+    """Parse the output of sha256sum run on paths relative to the root of a
+    tree into a Manifest.
+
+    Raises:
+        kitipy.TaskError: When a line is malformed (e.g. the output got
+            truncated).
+    """
+    manifest = {}  # type: Manifest
+    for line in output.split('\n'):
+        if len(line) == 0:
+            continue
+        digest, _, path = line.partition(' ')
+        hexdigest = digest[1:] if digest.startswith('\\') else digest
+        if (len(hexdigest) == 0 or hexdigest.strip(string.hexdigits)
+                or len(path) < 2 or path[0] not in ' *'):
+            raise TaskError('Malformed line in the remote manifest: %r.' %
+                            (line))
+        path = path[1:]
+        # sha256sum prefixes the line with a backslash when the filename
+        # contains backslashes or newlines, which are then escaped.
+        if digest.startswith('\\'):
+            digest = digest[1:]
+            path = path.replace('\\\\', '\0').replace('\\n', '\n')
+            path = path.replace('\0', '\\')
+        manifest[os.path.normpath(path)] = digest
+    return manifest
+
+
+class SyncPlan(object):
+    """SyncPlan lists the files that have to be uploaded to, or deleted from,
+    a remote tree to make it identical to a local one.
+    """
+    def __init__(self, local: Manifest, remote: Manifest):
+        """
+        Args:
+            local (Manifest): The manifest of the local tree.
+            remote (Manifest): The manifest of the remote tree.
+        """
+        self.upload = sorted(path for path, digest in local.items()
+                             if remote.get(path) != digest)  # type: List[str]
+        self.delete = sorted(path for path in remote
+                             if path not in local)  # type: List[str]
+
+    def __bool__(self):
+        return len(self.upload) > 0 or len(self.delete) > 0
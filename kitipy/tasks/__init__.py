@@ -1 +1,6 @@
-from . import aws
+from ..lazy import lazy_attributes
+
+__getattr__, __dir__ = lazy_attributes(
+    __name__, {
+        'aws': '.aws',
+    })
@@ -1 +1,7 @@
-from . import ecs, secrets
+from ...lazy import lazy_attributes
+
+__getattr__, __dir__ = lazy_attributes(
+    __name__, {
+        'ecs': '.ecs',
+        'secrets': '.secrets',
+    })
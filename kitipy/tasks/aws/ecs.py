@@ -28,6 +28,11 @@ Also, it expects following stack parameters:
 * `ecs_service_definition` (Callable[[kitipy.Context], dict]):
     A function returning the ECS service definition. See https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/ecs.html#ECS.Client.create_service ;
 
+These functions are called many times by the tasks below. Wrap them with
+kitipy.lazy_value() to compute them only once, and declare the remote sources
+they need (e.g. kitipy.libs.terraform.output) such that these sources are
+fetched concurrently before the tasks run.
+
 Example:
 
 config = {
@@ -90,7 +95,9 @@ def task_group():
     pass
 
 
-@task_group.task()
+@task_group.task(prefetch=[
+    "ecs_service_definition", "ecs_task_definition", "ecs_container_transformer"
+])
 @click.argument("version", nargs=1, type=str, envvar="IMAGE_TAG")
 def deploy(kctx: kitipy.Context, version: str):
     """Deploy a given version to ECS."""
@@ -126,7 +133,10 @@ def deploy(kctx: kitipy.Context, version: str):
                                                    message=message))
 
 
-@task_group.task()
+@task_group.task(prefetch=[
+    "ecs_service_definition", "ecs_task_definition",
+    "ecs_container_transformer", "ecs_oneoff_container_transformer"
+])
 @click.option(
     "--version",
     nargs=1,
@@ -8,6 +8,9 @@ parameters:
 * `secret_arn_resolver`: a function that takes a kctx and a `secret_name`
   parameter and returns the ARN of that secret ;
 
+Both can be wrapped with kitipy.lazy_value() to memoize them and fetch their
+sources before the tasks run.
+
 @TODO:
 
 * Add support for binary secrets ;
@@ -36,7 +39,7 @@ def secrets():
     pass
 
 
-@secrets.task()
+@secrets.task(prefetch=["secrets_resolver"])
 @click.option("--show-values",
               default=False,
               help="Whether secret values should be disaplyed.")
@@ -60,7 +63,7 @@ def show(kctx: kitipy.Context, show_values: bool):
                   (format_secret_value(secret["SecretString"], show_values)))
 
 
-@secrets.task()
+@secrets.task(prefetch=["secret_arn_resolver"])
 @click.argument('secret-name', type=str, nargs=1)
 def edit(kctx: kitipy.Context, secret_name):
     """Edit secrets stored by AWS Secrets Manager."""
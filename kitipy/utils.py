@@ -1,40 +1,206 @@
 import click
+import hashlib
 import kitipy
+import os
 import os.path
+import pickle
 import time
 import yaml
 import subprocess
 import sys
-from typing import Callable, Dict, List, Optional, TypeVar
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+from .cache import cache_dir
 from .exceptions import TaskError
 
+CONFIG_CACHE_VERSION = 1
+"""Version of the config cache format. Cache entries with a different version
+(or written by another version of kitipy) are ignored."""
 
-def load_config_file(path: str) -> Dict:
-    """Load the YAML config file at the given path. Note that this function
-    doesn't normalize the config, this is handled by normalize_config().
+# The libyaml-based loader is much faster than the pure-Python one, but it's
+# only available when PyYAML has been built against libyaml.
+_YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+def load_config_file(path: str, use_cache: bool = True) -> Dict:
+    """Load the YAML config file at the given path, along with the fragments
+    it includes (see load_config()). Note that this function doesn't normalize
+    the config, this is handled by normalize_config().
 
     Args:
         path (str):
             The path to the config file to load. It could be either relative or
             absolute.
+        use_cache (bool):
+            Whether parsed files should be looked up in and stored into the
+            config cache.
     
     Raises:
-        click.BadParameter: When the given path does not exist.
+        click.BadParameter: When the given path or an included file does not
+            exist.
+        RuntimeError: When config files include each other.
 
     Returns:
         Dict: The loaded and parsed config file
     """
 
+    config = _load_config_tree(path, {}, [], use_cache)
+    config['path'] = path
+
+    return config
+
+
+def load_config(path: str, use_cache: bool = True) -> Dict:
+    """Load and normalize the YAML config file at the given path.
+
+    Config files can include other files through the include key, either a
+    single path or a list of paths relative to the including file:
+
+        include:
+          - stages.yml
+          - stacks/api.yml
+
+    Included files are merged in order, and the including file is merged
+    on top of them: dicts are merged recursively whereas other values are
+    replaced. Included files can include other files as well.
+
+    The normalized config is stored in a binary cache, located in
+    $XDG_CACHE_HOME/kitipy/config, along with the mtime and size of every file
+    it's made of. It's reused as long as none of these files change. Each file
+    is also cached on its own, such that only the files that changed get
+    parsed again.
+
+    Args:
+        path (str):
+            The path to the config file to load. It could be either relative or
+            absolute.
+        use_cache (bool):
+            Whether the config cache should be used.
+
+    Raises:
+        click.BadParameter: When the given path or an included file does not
+            exist.
+        RuntimeError: When config files include each other.
+
+    Returns:
+        Dict: The normalized config.
+    """
+    cache_file = _config_cache_file('compiled', path)
+    if use_cache:
+        entry = _read_config_cache(cache_file)
+        if entry is not None and all(
+                _file_stamp(f) == stamp
+                for f, stamp in entry['files'].items()):
+            config = entry['config']
+            config['path'] = path
+            return config
+
+    files = {}  # type: Dict[str, Optional[Tuple[int, int]]]
+    config = normalize_config(_load_config_tree(path, files, [], use_cache))
+
+    if use_cache:
+        _write_config_cache(cache_file, {'files': files, 'config': config})
+
+    config['path'] = path
+    return config
+
+
+def _load_config_tree(path: str, files: Dict[str, Optional[Tuple[int, int]]],
+                      including: List[str], use_cache: bool) -> Dict:
+    """Load a config file and merge it with the files it includes. The stamp
+    of every loaded file is added to files.
+    """
     if not os.path.exists(path):
         raise click.BadParameter('No file "%s" found.' % (path))
 
-    with open(path, 'r') as f:
-        config = yaml.safe_load(f)
-        config['path'] = path
+    path = os.path.abspath(path)
+    if path in including:
+        raise RuntimeError('Config files have circular includes: %s.' %
+                           (' -> '.join(including + [path])))
+
+    files[path] = _file_stamp(path)
+    data = _load_config_fragment(path, files[path], use_cache)
+
+    includes = data.pop('include', [])
+    if isinstance(includes, str):
+        includes = [includes]
+
+    config = {}  # type: Dict
+    for include in includes:
+        fragment = _load_config_tree(
+            os.path.join(os.path.dirname(path), include), files,
+            including + [path], use_cache)
+        _merge_config(config, fragment)
+    _merge_config(config, data)
 
     return config
 
 
+def _load_config_fragment(path: str, stamp: Optional[Tuple[int, int]],
+                          use_cache: bool) -> Dict:
+    cache_file = _config_cache_file('fragments', path)
+    if use_cache:
+        entry = _read_config_cache(cache_file)
+        if entry is not None and entry['stamp'] == stamp:
+            return entry['data']
+
+    with open(path, 'r') as f:
+        data = yaml.load(f, Loader=_YamlLoader) or {}
+
+    if use_cache:
+        _write_config_cache(cache_file, {'stamp': stamp, 'data': data})
+
+    return data
+
+
+def _merge_config(base: Dict, override: Dict):
+    for k, v in override.items():
+        if isinstance(v, dict) and isinstance(base.get(k), dict):
+            _merge_config(base[k], v)
+        else:
+            base[k] = v
+
+
+def _file_stamp(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _config_cache_file(kind: str, path: str) -> str:
+    key = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()
+    return cache_dir('config', kind, key + '.pickle')
+
+
+def _read_config_cache(cache_file: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(cache_file, 'rb') as f:
+            entry = pickle.load(f)
+    except Exception:
+        # A missing or corrupted cache entry only means the config gets
+        # parsed again.
+        return None
+
+    if entry.get('version') != (CONFIG_CACHE_VERSION, kitipy.__version__):
+        return None
+    return entry
+
+
+def _write_config_cache(cache_file: str, entry: Dict[str, Any]):
+    entry['version'] = (CONFIG_CACHE_VERSION, kitipy.__version__)
+    tmp_file = '%s.%d.tmp' % (cache_file, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        # The cache is only an optimization, tasks shouldn't fail because it
+        # can't be written.
+        pass
+
+
 def normalize_config(config: Dict) -> Dict:
     """Normalize kitipy config
 
@@ -115,27 +281,51 @@ def set_up_file_transfer_listeners(dispatcher: kitipy.Dispatcher):
             will be registered.
     """
     progressbar = None
+    started_at = 0.0
+    previous = 0
 
     def on_start(size: int, label: str):
-        nonlocal progressbar
+        nonlocal progressbar, started_at, previous
         if progressbar is not None:
-            progressbar.close()
-        progressbar = click.progressbar(length=size, label=label)
+            progressbar.render_finish()
+        progressbar = click.progressbar(length=size,
+                                        label=label,
+                                        show_eta=True,
+                                        item_show_func=lambda rate: rate)
+        started_at = time.monotonic()
+        previous = 0
 
     def on_update(current: int, total: int):
-        nonlocal progressbar
-        if progressbar is not None:
-            progressbar.update(current)
+        nonlocal previous
+        if progressbar is None:
+            return
+
+        elapsed = time.monotonic() - started_at
+        if elapsed > 0:
+            progressbar.current_item = '%s/s' % (_format_bytes(current /
+                                                               elapsed))
+        # Update events carry the bytes transferred so far whereas the
+        # progressbar expects the number of steps made since last update.
+        progressbar.update(current - previous)
+        previous = current
 
     def on_end():
         nonlocal progressbar
         if progressbar is not None:
-            progressbar.close()
+            progressbar.render_finish()
             progressbar = None
 
     dispatcher.on('file_transfer.start', on_start)
     dispatcher.on('file_transfer.update', on_update)
-    dispatcher.on('filter_transfer.end', on_end)
+    dispatcher.on('file_transfer.end', on_end)
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return '%.1f %s' % (size, unit)
+        size /= 1024
+    return '%.1f TB' % (size)
 
 
 def append_cmd_flags(cmd: str, **kwargs) -> str:
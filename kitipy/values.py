@@ -0,0 +1,178 @@
+"""This module provides LazyValue, the config values resolved on first access
+and memoized per stage and stack, as well as prefetch() which concurrently
+fetches what they depend on.
+
+Stage and stack configs often hold callables taking the kitipy Context, such
+as ecs_task_definition or secrets_resolver (see kitipy.tasks.aws), which look
+up remote sources like Terraform outputs or AWS secrets. Wrapping them with
+lazy_value() ensures they're computed only once per stage and stack, and lets
+them declare the sources they need such that these can be fetched
+concurrently before the task body runs, instead of one after another:
+
+    @kitipy.lazy_value(sources=[kitipy.libs.terraform.output])
+    def vpc_subnet_ids(kctx):
+        return kitipy.libs.terraform.find_deep_output_value(
+            kctx, ['vpc', 'value', 'subnet_ids'])
+
+    config = {
+        'stacks': {
+            'api': {
+                'ecs_service_definition': kitipy.lazy_value(
+                    lambda kctx: {...},
+                    sources=[vpc_subnet_ids]),
+            },
+        },
+    }
+
+Sources are callables taking the kitipy Context. They should memoize their
+results (e.g. LazyValue or kitipy.libs.terraform.output), otherwise fetching
+them ahead of time is useless.
+"""
+
+import concurrent.futures
+import copy
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+class LazyValue(object):
+    """LazyValue wraps a config value computed from the kitipy Context. It's
+    called like the function it wraps, but the value is computed on first call
+    and memoized per stage, stack and extra arguments.
+
+    A deep copy of the memoized value is returned on each call, such that
+    callers can freely alter it (e.g. the ECS tasks add tags to the task
+    definition they get).
+    """
+    def __init__(self,
+                 fn: Callable[..., Any],
+                 sources: Optional[List[Callable[[Any], Any]]] = None):
+        """
+        Args:
+            fn (Callable[..., Any]):
+                The function computing the value. It takes the kitipy Context
+                as first argument, and optionally extra arguments.
+            sources (Optional[List[Callable[[Any], Any]]]):
+                The callables fetching what the value depends on (e.g.
+                kitipy.libs.terraform.output). They take the kitipy Context
+                and are called concurrently by prefetch().
+        """
+        self.fn = fn
+        self.sources = sources if sources else []
+        self._memo = {}  # type: Dict[Tuple, Any]
+        self._lock = threading.RLock()
+
+    def __call__(self, kctx, *args, **kwargs) -> Any:
+        try:
+            key = (_scope(kctx), args, tuple(sorted(kwargs.items())))
+            hash(key)
+        except TypeError:
+            # Values called with unhashable arguments can't be memoized.
+            return self.fn(kctx, *args, **kwargs)
+
+        with self._lock:
+            if key not in self._memo:
+                self._memo[key] = self.fn(kctx, *args, **kwargs)
+            return copy.deepcopy(self._memo[key])
+
+    def clear(self):
+        """Drop the memoized values."""
+        with self._lock:
+            self._memo.clear()
+
+
+def lazy_value(fn: Optional[Callable[..., Any]] = None,
+               sources: Optional[List[Callable[[Any], Any]]] = None) -> Any:
+    """Wrap a config value into a LazyValue. It can be either called with the
+    function to wrap, or used as a decorator:
+
+        'secrets_resolver': kitipy.lazy_value(list_secrets, sources=[...])
+
+        @kitipy.lazy_value(sources=[kitipy.libs.terraform.output])
+        def vpc_subnet_ids(kctx):
+            ...
+
+    Args:
+        fn (Optional[Callable[..., Any]]):
+            The function computing the value. When it's not provided, a
+            decorator is returned.
+        sources (Optional[List[Callable[[Any], Any]]]):
+            The callables fetching what the value depends on.
+
+    Returns:
+        Any: The LazyValue, or the decorator creating it.
+    """
+    if fn is None:
+        return lambda f: LazyValue(f, sources)
+    return LazyValue(fn, sources)
+
+
+def collect_sources(values: Iterable[Any]) -> List[Callable[[Any], Any]]:
+    """Collect the sources of the given values, and transitively the sources
+    of the sources that are LazyValues. Values that aren't LazyValues are
+    ignored.
+
+    Returns:
+        List[Callable[[Any], Any]]: The sources, without duplicates, in
+        discovery order.
+    """
+    sources = []  # type: List[Callable[[Any], Any]]
+    pending = [v for v in values if isinstance(v, LazyValue)]
+    while len(pending) > 0:
+        value = pending.pop(0)
+        for source in value.sources:
+            if source in sources:
+                continue
+            sources.append(source)
+            if isinstance(source, LazyValue):
+                pending.append(source)
+    return sources
+
+
+def prefetch(kctx,
+             values: Iterable[Any],
+             concurrency: Optional[int] = None) -> None:
+    """Call the sources of the given values concurrently, such that they're
+    memoized by the time the values are resolved.
+
+    Args:
+        kctx (kitipy.Context):
+            The kitipy Context passed to the sources.
+        values (Iterable[Any]):
+            The config values. Values that aren't LazyValues are ignored.
+        concurrency (Optional[int]):
+            Maximum number of sources fetched at the same time. Defaults to
+            the number of CPUs, with a minimum of 4 as sources are generally
+            I/O bound.
+
+    Raises:
+        Exception: The error raised by the first failed source, once all of
+            them are done.
+    """
+    sources = collect_sources(values)
+    if len(sources) == 0:
+        return
+
+    # LazyValues used as sources are fetched along with their own sources:
+    # they wait for each other through their lock rather than fetching the
+    # same thing twice.
+    workers = concurrency or max(4, os.cpu_count() or 1)
+    workers = max(1, min(workers, len(sources)))
+    error = None  # type: Optional[BaseException]
+    with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        futures = [pool.submit(source, kctx) for source in sources]
+        for future in futures:
+            try:
+                future.result()
+            except Exception as err:
+                error = error if error is not None else err
+
+    if error is not None:
+        raise error
+
+
+def _scope(kctx) -> Tuple[Optional[str], Optional[str]]:
+    stage = kctx.stage['name'] if kctx.stage else None
+    stack = kctx.stack.name if kctx.stack else None
+    return (stage, stack)
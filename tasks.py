@@ -1,4 +1,10 @@
 #!/usr/bin/env python3
+from kitipy import completion
+
+# Shell completion requests are answered from the index of the command tree,
+# before the task modules are imported and the tree is built.
+completion.complete_from_cache()
+
 import click
 import kitipy
 import kitipy.docker
@@ -0,0 +1,170 @@
+import asyncio
+import kitipy
+import os
+import os.path
+import pytest
+import subprocess
+import time
+from unittest import mock
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def test_async_executor_runs_local_commands_concurrently():
+    aexec = kitipy.AsyncExecutor(kitipy.Executor(kitipy.Dispatcher()))
+
+    async def run_all():
+        return await asyncio.gather(
+            aexec.arun('sleep 0.2; echo foo', pipe=True),
+            aexec.arun('sleep 0.2; echo bar >&2', pipe=True),
+            aexec.alocal('cat', input='baz', pipe=True))
+
+    loop = asyncio.get_event_loop()
+    started = loop.time()
+    foo, bar, baz = run(run_all())
+
+    assert loop.time() - started < 0.4
+    assert foo.stdout == 'foo\n'
+    assert bar.stderr == 'bar\n'
+    assert baz.stdout == 'baz'
+
+
+def test_async_executor_checks_exit_code():
+    aexec = kitipy.AsyncExecutor(kitipy.Executor(kitipy.Dispatcher()))
+
+    with pytest.raises(subprocess.CalledProcessError):
+        run(aexec.arun('exit 3', pipe=True))
+
+    res = run(aexec.arun('exit 3', pipe=True, check=False))
+    assert res.returncode == 3
+
+
+def test_async_executor_path_exists():
+    aexec = kitipy.AsyncExecutor(kitipy.Executor(kitipy.Dispatcher()))
+
+    assert run(aexec.apath_exists(__file__)) is True
+    assert run(aexec.apath_exists('/some/missing/path')) is False
+
+
+def test_async_executor_submit():
+    aexec = kitipy.AsyncExecutor(kitipy.Executor(kitipy.Dispatcher()))
+
+    try:
+        futures = [
+            aexec.submit(aexec.arun, 'echo %d' % (i), pipe=True)
+            for i in range(3)
+        ]
+        assert [f.result(timeout=5).stdout for f in futures] == \
+            ['0\n', '1\n', '2\n']
+    finally:
+        aexec.close()
+
+
+
+def test_async_executor_emits_command_events():
+    events = []
+    dispatcher = kitipy.Dispatcher({})
+    dispatcher.on('command.start',
+                  lambda **kwargs: events.append(('start', kwargs)))
+    dispatcher.on('command.end',
+                  lambda **kwargs: events.append(('end', kwargs)))
+    aexec = kitipy.AsyncExecutor(kitipy.Executor(dispatcher))
+
+    run(aexec.arun('cat', input='foo', pipe=True))
+    with pytest.raises(subprocess.CalledProcessError):
+        run(aexec.arun('exit 3', pipe=True))
+
+    assert [e[0] for e in events] == ['start', 'end', 'start', 'end']
+    assert events[0][1] == {'cmd': 'cat', 'host': 'localhost', 'cwd': None}
+    assert events[1][1]['bytes_out'] == 3
+    assert events[3][1]['returncode'] == 3
+
+
+class FakeChannel(object):
+    def __init__(self, stdout, stderr, returncode=0):
+        self.closed = False
+        self._stdout = list(stdout)
+        self._stderr = list(stderr)
+        self._returncode = returncode
+        self._pipe = os.pipe()
+        os.write(self._pipe[1], b'x')
+
+    def fileno(self):
+        return self._pipe[0]
+
+    def recv_ready(self):
+        return len(self._stdout) > 0
+
+    def recv_stderr_ready(self):
+        return len(self._stderr) > 0
+
+    def recv(self, size):
+        return self._stdout.pop(0)
+
+    def recv_stderr(self, size):
+        return self._stderr.pop(0)
+
+    def exit_status_ready(self):
+        return len(self._stdout) == 0 and len(self._stderr) == 0
+
+    def recv_exit_status(self):
+        return self._returncode
+
+    def shutdown_write(self):
+        pass
+
+    def close(self):
+        self.closed = True
+        os.close(self._pipe[0])
+        os.close(self._pipe[1])
+
+
+def test_async_executor_runs_remote_commands():
+    ssh_config_file = os.path.join(os.path.dirname(__file__), '..', '.ssh',
+                                   'config')
+    executor = kitipy.Executor(kitipy.Dispatcher(),
+                               hostname='testhost',
+                               ssh_config_file=ssh_config_file)
+    aexec = kitipy.AsyncExecutor(executor)
+    data = 'héllo'.encode('utf-8')
+    channel = FakeChannel([data[:2], data[2:]], [b'oops\n'], 1)
+
+    with mock.patch.object(kitipy.Executor, '_exec_remote',
+                           return_value=channel):
+        res = run(aexec.arun('some cmd', pipe=True, check=False))
+
+    assert res.stdout == 'héllo'
+    assert res.stderr == 'oops\n'
+    assert res.returncode == 1
+    assert channel.closed
+
+
+
+def test_async_executor_shares_the_ssh_connection():
+    ssh_config_file = os.path.join(os.path.dirname(__file__), '..', '.ssh',
+                                   'config')
+    client = mock.Mock()
+    client.exec_command.side_effect = lambda cmd, environment=None: (
+        mock.Mock(channel=FakeChannel([b'ok\n'], [])), None, None)
+    pool = mock.Mock()
+    pool.acquire.side_effect = lambda *args: time.sleep(0.1) or client
+    events = []
+    dispatcher = kitipy.Dispatcher({})
+    dispatcher.on('command.end', lambda **kwargs: events.append(kwargs))
+    executor = kitipy.Executor(dispatcher,
+                               hostname='testhost',
+                               ssh_config_file=ssh_config_file,
+                               connection_pool=pool)
+    aexec = kitipy.AsyncExecutor(executor)
+
+    async def run_all():
+        return await asyncio.gather(
+            *[aexec.arun('cmd %d' % (i), pipe=True) for i in range(4)])
+
+    results = run(run_all())
+
+    pool.acquire.assert_called_once()
+    assert [r.stdout for r in results] == ['ok\n'] * 4
+    assert [e['host'] for e in events] == ['testhost'] * 4
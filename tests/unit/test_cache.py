@@ -0,0 +1,98 @@
+import kitipy
+import os
+import subprocess
+import time
+from kitipy.cache import CachingExecutor, ResultCache
+from unittest import mock
+
+
+def test_result_cache_roundtrip(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    key = ResultCache.key('cmd', {'FOO': 'bar'}, '/app', 'localhost')
+    cache.set(key, subprocess.CompletedProcess('cmd', 0, 'out', b'\xff'))
+
+    res = cache.get(key, 60)
+    assert res.args == 'cmd'
+    assert res.stdout == 'out'
+    assert res.stderr == b'\xff'
+
+    assert cache.get(key, 0) is None
+    assert cache.get('unknown', 60) is None
+
+
+def test_result_cache_keys_depend_on_host_and_env():
+    keys = set([
+        ResultCache.key('cmd', None, None, 'localhost'),
+        ResultCache.key('cmd', None, None, 'testhost'),
+        ResultCache.key('cmd', {'FOO': 'bar'}, None, 'localhost'),
+        ResultCache.key('cmd', None, '/app', 'localhost'),
+        ResultCache.key('cmd', None, None, 'localhost', False),
+    ])
+    assert len(keys) == 5
+
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path), max_entries=2)
+    res = subprocess.CompletedProcess('cmd', 0, '', '')
+
+    cache.set('a', res)
+    cache.set('b', res)
+    old = time.time() - 60
+    os.utime(str(tmp_path / 'a.json'), (old, old))
+    os.utime(str(tmp_path / 'b.json'), (old - 10, old - 10))
+    cache.get('b', 3600)
+    cache.set('c', res)
+
+    assert cache.get('a', 3600) is None
+    assert cache.get('b', 3600) is not None
+    assert cache.get('c', 3600) is not None
+
+
+def test_caching_executor_memoizes_successful_piped_commands(tmp_path):
+    executor = mock.Mock(spec=kitipy.Executor)
+    executor.local_cwd = None
+    executor.local.side_effect = lambda cmd, *args: subprocess.CompletedProcess(
+        cmd, 0 if cmd != 'fail' else 1, 'out', '')
+    caching = CachingExecutor(executor, 60, ResultCache(str(tmp_path)))
+
+    assert caching.local('git ls-remote', pipe=True).stdout == 'out'
+    assert caching.local('git ls-remote', pipe=True).stdout == 'out'
+    assert executor.local.call_count == 1
+
+    caching.local('git ls-remote')
+    caching.local('fail', pipe=True, check=False)
+    caching.local('fail', pipe=True, check=False)
+    assert executor.local.call_count == 4
+
+
+def test_context_cached(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+    kctx = kitipy.Context({}, kitipy.Executor(kitipy.Dispatcher()),
+                          kitipy.Dispatcher())
+
+    with kctx.cached():
+        first = kctx.local('date +%s%N', pipe=True)
+        second = kctx.local('date +%s%N', pipe=True)
+
+    assert first.stdout == second.stdout
+    assert kctx.local('date +%s%N', pipe=True).stdout != first.stdout
+
+
+def test_caching_executor_keys_depend_on_current_directory(
+        tmp_path, monkeypatch):
+    repo_a = tmp_path / 'a'
+    repo_b = tmp_path / 'b'
+    for repo in (repo_a, repo_b):
+        repo.mkdir()
+        (repo / 'name').write_text(repo.name)
+    executor = kitipy.Executor(kitipy.Dispatcher())
+    caching = CachingExecutor(executor, 60,
+                              ResultCache(str(tmp_path / 'cache')))
+
+    outputs = []
+    for repo in (repo_a, repo_b):
+        monkeypatch.chdir(str(repo))
+        outputs.append(caching.local('cat name', pipe=True).stdout)
+        outputs.append(caching.run('cat name', pipe=True).stdout)
+
+    assert outputs == ['a', 'a', 'b', 'b']
@@ -0,0 +1,52 @@
+import pytest
+from kitipy.capture import CaptureBuffer
+
+
+def test_capture_buffer_decodes_split_characters():
+    buf = CaptureBuffer('utf-8')
+    data = 'héllo wörld'.encode('utf-8')
+    for i in range(len(data)):
+        buf.write(data[i:i + 1])
+
+    assert buf.getvalue() == 'héllo wörld'
+    assert len(buf) == len(data)
+    assert buf.truncated is False
+
+
+def test_capture_buffer_returns_bytes_without_encoding():
+    buf = CaptureBuffer()
+    buf.write(b'foo')
+    buf.write(b'bar')
+
+    assert buf.getvalue() == b'foobar'
+
+
+def test_capture_buffer_keeps_head_when_capped():
+    buf = CaptureBuffer(max_size=5)
+    buf.write(b'foo')
+    buf.write(b'barbaz')
+
+    assert buf.getvalue() == b'fooba'
+    assert len(buf) == 9
+    assert buf.truncated is True
+
+
+def test_capture_buffer_keeps_tail_in_ring_mode():
+    buf = CaptureBuffer(max_size=5, ring=True)
+    for chunk in (b'line1\n', b'line2\n', b'line3\n'):
+        buf.write(chunk)
+
+    assert buf.getvalue() == b'ine3\n'
+    assert buf.truncated is True
+
+
+def test_capture_buffer_replaces_truncated_characters():
+    buf = CaptureBuffer('utf-8', max_size=3, ring=True)
+    buf.write('aéé'.encode('utf-8'))
+
+    assert buf.getvalue() == '�é'
+
+
+def test_capture_buffer_rejects_invalid_max_size():
+    with pytest.raises(ValueError):
+        CaptureBuffer(max_size=0)
@@ -0,0 +1,203 @@
+import click
+import kitipy
+import os
+import subprocess
+import sys
+import textwrap
+from kitipy import completion
+
+
+def build_tree():
+    @kitipy.root(config={})
+    def root():
+        pass
+
+    @root.task()
+    @click.option('--force/--no-force', help='Force it.')
+    def build(kctx, force):
+        """Build the project."""
+        pass
+
+    @root.task()
+    @click.argument('suites', nargs=-1)
+    def test(kctx, suites):
+        """Run the tests."""
+        pass
+
+    @root.group()
+    def release():
+        pass
+
+    click_ctx = root.make_context('tasks.py', [], resilient_parsing=True)
+    return completion.index_command(click_ctx)
+
+
+def test_complete_subcommands_from_index():
+    tree = build_tree()
+
+    assert completion.complete(tree, [], 'b') == [('build',
+                                                   'Build the project.')]
+    assert [c for c, _ in completion.complete(tree, [], '')] == [
+        'build', 'release', 'test'
+    ]
+    assert completion.complete(tree, ['release'], '') == []
+
+
+def test_complete_options_from_index():
+    tree = build_tree()
+
+    assert completion.complete(tree, ['build'], '--') == [
+        ('--force', 'Force it.'), ('--no-force', 'Force it.')
+    ]
+
+
+def test_complete_falls_back_when_the_index_cannot_tell():
+    tree = build_tree()
+
+    # Arguments and option values depend on the actual parsing.
+    assert completion.complete(tree, ['test'], '') is None
+    assert completion.complete(tree, ['build', '--force'], '') is None
+    assert completion.complete(tree, ['unknown'], '') is None
+
+
+def test_index_is_stale_when_task_files_change(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    script = tmp_path / 'tasks.py'
+    script.write_text('')
+
+    completion.save_index(str(script), {'commands': {}})
+    assert completion.load_index(str(script)) == {'commands': {}}
+
+    os.utime(str(script), ns=(0, 0))
+    assert completion.load_index(str(script)) is None
+
+
+def run_completion(tmp_path, instr, comp_words, comp_cword):
+    env = dict(os.environ,
+               PYTHONPATH=os.path.dirname(os.path.dirname(kitipy.__file__)),
+               XDG_CACHE_HOME=str(tmp_path / 'cache'),
+               COMP_WORDS=comp_words,
+               COMP_CWORD=comp_cword)
+    env['_TASKS.PY_COMPLETE'] = instr
+    return subprocess.run([sys.executable, 'tasks.py'],
+                          cwd=str(tmp_path),
+                          env=env,
+                          stdout=subprocess.PIPE,
+                          text=True)
+
+
+def write_script(tmp_path):
+    marker = tmp_path / 'resolved'
+    (tmp_path / 'tasks.py').write_text(
+        textwrap.dedent('''
+        import click
+        import kitipy
+
+        def touch_marker(click_ctx):
+            open(%r, 'a').close()
+            return True
+
+        @kitipy.root(config={})
+        def root():
+            pass
+
+        @root.task(filters=[touch_marker])
+        def build(kctx):
+            """Build the project."""
+
+        root()
+        ''' % (str(marker))))
+    return marker
+
+
+def test_completion_requests_are_answered_without_resolving_the_tree(
+        tmp_path):
+    marker = write_script(tmp_path)
+
+    outputs = []
+    for _ in range(2):
+        if marker.exists():
+            marker.unlink()
+        res = run_completion(tmp_path, 'complete_zsh', 'tasks.py b', '1')
+        outputs.append((res.returncode, res.stdout))
+
+    assert outputs == [(1, 'build\nBuild the project.\n')] * 2
+    # The second request was answered from the index.
+    assert not marker.exists()
+
+
+def test_completion_supports_click8_protocol(tmp_path):
+    write_script(tmp_path)
+    run_completion(tmp_path, 'complete_bash', 'tasks.py b', '1')
+
+    bash = run_completion(tmp_path, 'bash_complete', 'tasks.py b', '1')
+    zsh = run_completion(tmp_path, 'zsh_complete', 'tasks.py b', '1')
+    fish = run_completion(tmp_path, 'fish_complete', 'tasks.py b', 'b')
+
+    assert (bash.returncode, bash.stdout) == (0, 'plain,build\n')
+    assert zsh.stdout == 'plain\nbuild\nBuild the project.\n'
+    assert fish.stdout == 'plain,build\tBuild the project.\n'
+
+
+
+def test_task_modules_are_not_imported_when_answered_from_cache(tmp_path):
+    marker = tmp_path / 'imported'
+    (tmp_path / 'deploy_tasks.py').write_text(
+        textwrap.dedent('''
+        import kitipy
+
+        open(%r, 'a').close()
+
+        @kitipy.task()
+        def deploy(kctx):
+            """Deploy the project."""
+        ''' % (str(marker))))
+    (tmp_path / 'tasks.py').write_text(
+        textwrap.dedent('''
+        from kitipy import completion
+        completion.complete_from_cache()
+
+        import deploy_tasks
+        import kitipy
+
+        @kitipy.root(config={})
+        def root():
+            pass
+
+        root.add_command(deploy_tasks.deploy)
+        root()
+        '''))
+
+    first = run_completion(tmp_path, 'complete_bash', 'tasks.py d', '1')
+    assert marker.exists()
+    marker.unlink()
+
+    second = run_completion(tmp_path, 'complete_bash', 'tasks.py d', '1')
+    assert first.stdout == second.stdout == 'deploy\n'
+    assert not marker.exists()
+
+
+def test_importing_kitipy_does_not_answer_completion_requests(
+        tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    env = dict(os.environ,
+               PYTHONPATH=os.path.dirname(os.path.dirname(kitipy.__file__)),
+               COMP_WORDS='tasks.py b',
+               COMP_CWORD='1')
+    env['_TASKS.PY_COMPLETE'] = 'complete_bash'
+    script = tmp_path / 'tasks.py'
+    script.write_text('import kitipy\nprint("imported")\n')
+    completion.save_index(str(script), {
+        'commands': {'build': {'name': 'build', 'help': ''}},
+        'options': [],
+        'arguments': False,
+        'chain': False,
+    })
+
+    res = subprocess.run([sys.executable, 'tasks.py'],
+                         cwd=str(tmp_path),
+                         env=env,
+                         stdout=subprocess.PIPE,
+                         text=True)
+
+    assert (res.returncode, res.stdout) == (0, 'imported\n')
@@ -1,3 +1,4 @@
+import threading
 import pytest
 import kitipy
 from unittest import mock
@@ -29,3 +30,90 @@ def test_dispatcher_calls_early_stop():
 
     listener1.assert_called_once_with(some='args')
     listener2.assert_not_called()
+
+
+def test_dispatcher_listeners_are_not_shared_between_instances():
+    dispatcher1 = kitipy.Dispatcher()
+    dispatcher1.on('test', mock.Mock(return_value=True))
+
+    dispatcher2 = kitipy.Dispatcher()
+
+    assert dispatcher2.listeners('test') == []
+
+
+def test_dispatcher_calls_listeners_by_priority():
+    calls = []
+    dispatcher = kitipy.Dispatcher()
+    dispatcher.on('test', lambda: calls.append('low') or True, priority=-1)
+    dispatcher.on('test', lambda: calls.append('default') or True)
+    dispatcher.on('test', lambda: calls.append('high') or True, priority=10)
+
+    dispatcher.emit('test')
+
+    assert calls == ['high', 'default', 'low']
+
+
+def test_dispatcher_calls_wildcard_listeners_with_event_name():
+    listener = mock.Mock(return_value=True)
+    other = mock.Mock(return_value=True)
+
+    dispatcher = kitipy.Dispatcher()
+    dispatcher.on('file_transfer.*', listener)
+    dispatcher.on('command.*', other)
+
+    dispatcher.emit('file_transfer.update', current=1, total=2)
+
+    listener.assert_called_once_with(event_name='file_transfer.update',
+                                     current=1,
+                                     total=2)
+    other.assert_not_called()
+
+
+def test_dispatcher_in_async_mode_calls_listeners_in_background():
+    calls = []
+    dispatcher = kitipy.Dispatcher(async_mode=True)
+    dispatcher.on('test', lambda n: calls.append(n) or True)
+
+    for n in range(10):
+        dispatcher.emit('test', n=n)
+    dispatcher.flush()
+
+    assert calls == list(range(10))
+    dispatcher.close()
+
+
+def test_dispatcher_in_async_mode_reraises_listener_errors_on_flush():
+    dispatcher = kitipy.Dispatcher(async_mode=True)
+    dispatcher.on('test', mock.Mock(side_effect=ValueError('boom')))
+
+    dispatcher.emit('test')
+
+    with pytest.raises(ValueError, match='boom'):
+        dispatcher.close()
+
+
+def test_dispatcher_in_async_mode_drops_events_when_queue_is_full():
+    unblock = threading.Event()
+    listener = mock.Mock(side_effect=lambda: unblock.wait() or True)
+
+    dispatcher = kitipy.Dispatcher(async_mode=True,
+                                   queue_size=1,
+                                   overflow='drop')
+    dispatcher.on('test', listener)
+
+    dispatcher.emit('test')
+    # Wait for the worker to pick up the first event.
+    while listener.call_count == 0:
+        pass
+    dispatcher.emit('test')
+    dispatcher.emit('test')
+    unblock.set()
+    dispatcher.close()
+
+    assert listener.call_count == 2
+    assert dispatcher.dropped == 1
+
+
+def test_dispatcher_raises_an_error_for_unsupported_overflow_policy():
+    with pytest.raises(ValueError):
+        kitipy.Dispatcher(overflow='explode')
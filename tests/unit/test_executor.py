@@ -5,7 +5,9 @@ import pathlib
 import pytest
 import shutil
 import socket
+import subprocess
 import tempfile
+import threading
 from kitipy import InteractiveWarningPolicy
 from unittest import mock
 
@@ -98,3 +100,530 @@ def test_interactive_warning_policy_refused():
         confirm.assert_called_once()
         client._host_keys.add.assert_not_called()
         client.save_host_keys.assert_not_called()
+
+
+def test_executor_expands_host_patterns():
+    ssh_config_file = os.path.join(os.path.dirname(__file__), '..', '.ssh',
+                                   'config')
+    executor = kitipy.Executor(kitipy.Dispatcher(),
+                               hostnames=['testhost*', 'jumphost'],
+                               ssh_config_file=ssh_config_file)
+
+    assert executor.is_remote
+    assert executor.hostnames == [
+        'testhost', 'testhost-via-jumphost', 'jumphost'
+    ]
+
+
+def test_executor_fails_to_expand_unknown_host_pattern():
+    ssh_config_file = os.path.join(os.path.dirname(__file__), '..', '.ssh',
+                                   'config')
+
+    with pytest.raises(RuntimeError):
+        kitipy.Executor(kitipy.Dispatcher(),
+                        hostnames=['app-*'],
+                        ssh_config_file=ssh_config_file)
+
+
+def test_executor_run_all_fans_out_to_all_hosts():
+    ssh_config_file = os.path.join(os.path.dirname(__file__), '..', '.ssh',
+                                   'config')
+    executor = kitipy.Executor(kitipy.Dispatcher(),
+                               hostnames=['testhost', 'jumphost'],
+                               ssh_config_file=ssh_config_file)
+
+    def fake_remote(self, cmd, **kwargs):
+        returncode = 0 if self._hostname == 'testhost' else 2
+        return subprocess.CompletedProcess(cmd, returncode, self._hostname,
+                                           '')
+
+    with mock.patch.object(kitipy.Executor, '_remote', fake_remote):
+        results = executor.run_all('hostname', pipe=True, check=False)
+
+        assert results['testhost'].stdout == 'testhost'
+        assert results['jumphost'].stdout == 'jumphost'
+        assert list(results.failed.keys()) == ['jumphost']
+        assert results.summary().startswith('1/2 hosts failed.')
+
+        with pytest.raises(kitipy.FanOutError) as excinfo:
+            executor.run_all('hostname', pipe=True)
+        assert excinfo.value.returncode == 2
+
+
+
+def test_executor_run_all_prefixes_output_lines_with_hosts(capsys):
+    ssh_config_file = os.path.join(os.path.dirname(__file__), '..', '.ssh',
+                                   'config')
+    executor = kitipy.Executor(kitipy.Dispatcher(),
+                               hostnames=['testhost', 'jumphost'],
+                               ssh_config_file=ssh_config_file)
+
+    def fake_exec_remote(self, cmd, env, cwd, input):
+        return FakeChannel([b'hello ', b'from\n', self._hostname.encode()],
+                           [b'oops\n'])
+
+    with mock.patch.object(kitipy.Executor, '_exec_remote',
+                           fake_exec_remote):
+        results = executor.run_all('hello', pipe=False)
+
+    out, err = capsys.readouterr()
+    assert sorted(out.splitlines()) == [
+        '[jumphost] hello from',
+        '[jumphost] jumphost',
+        '[testhost] hello from',
+        '[testhost] testhost',
+    ]
+    assert sorted(err.splitlines()) == ['[jumphost] oops', '[testhost] oops']
+    assert results['testhost'].stdout == 'hello from\ntesthost'
+
+
+def test_local_executor_run_all():
+    executor = kitipy.Executor(kitipy.Dispatcher())
+    results = executor.run_all('echo yolo', pipe=True)
+
+    assert list(results.keys()) == ['localhost']
+    assert results['localhost'].stdout == 'yolo\n'
+
+
+def test_local_executor_run_stream():
+    executor = kitipy.Executor(kitipy.Dispatcher())
+    cmd = 'printf "foo\\nbar"; echo baz >&2'
+    returned = list(executor.run_stream(cmd))
+
+    assert sorted(returned) == [('stderr', 'baz\n'), ('stdout', 'bar'),
+                                ('stdout', 'foo\n')]
+
+
+def test_local_executor_run_stream_decodes_split_characters():
+    executor = kitipy.Executor(kitipy.Dispatcher())
+    # The two bytes of "é" are written separately.
+    cmd = "printf '\\303'; sleep 0.1; printf '\\251\\n'"
+    returned = list(executor.run_stream(cmd, encoding='utf-8'))
+
+    assert returned == [('stdout', 'é\n')]
+
+
+def test_local_executor_run_stream_checks_exit_code():
+    executor = kitipy.Executor(kitipy.Dispatcher())
+
+    with pytest.raises(subprocess.CalledProcessError):
+        list(executor.run_stream('echo foo; exit 2'))
+
+
+def test_local_executor_tee(capfd):
+    executor = kitipy.Executor(kitipy.Dispatcher())
+    returned = executor.run('echo yolo; echo oops >&2', tee=True)
+
+    assert returned.stdout == 'yolo\n'
+    assert returned.stderr == 'oops\n'
+
+    captured = capfd.readouterr()
+    assert captured.out == 'yolo\n'
+    assert captured.err == 'oops\n'
+
+
+class FakeChannel(object):
+    """FakeChannel replays stdout/stderr chunks as if they were received from
+    a remote command.
+    """
+    def __init__(self, stdout, stderr, returncode=0):
+        self.closed = False
+        self._stdout = list(stdout)
+        self._stderr = list(stderr)
+        self._returncode = returncode
+
+    def recv_ready(self):
+        return len(self._stdout) > 0
+
+    def recv_stderr_ready(self):
+        return len(self._stderr) > 0
+
+    def recv(self, size):
+        return self._stdout.pop(0)
+
+    def recv_stderr(self, size):
+        return self._stderr.pop(0)
+
+    def exit_status_ready(self):
+        return True
+
+    def recv_exit_status(self):
+        return self._returncode
+
+    def shutdown_write(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def test_remote_executor_captures_split_characters():
+    ssh_config_file = os.path.join(os.path.dirname(__file__), '..', '.ssh',
+                                   'config')
+    executor = kitipy.Executor(kitipy.Dispatcher(),
+                               hostname='testhost',
+                               ssh_config_file=ssh_config_file)
+    data = 'héllo'.encode('utf-8')
+    channel = FakeChannel([data[:2], data[2:]], [b'oops\n'], 1)
+
+    with mock.patch.object(kitipy.Executor, '_exec_remote',
+                           return_value=channel):
+        res = executor.run('some cmd', pipe=True, check=False)
+
+    assert res.stdout == 'héllo'
+    assert res.stderr == 'oops\n'
+    assert res.returncode == 1
+    assert channel.closed
+
+
+def test_remote_executor_keeps_output_tail_when_limited():
+    ssh_config_file = os.path.join(os.path.dirname(__file__), '..', '.ssh',
+                                   'config')
+    executor = kitipy.Executor(kitipy.Dispatcher(),
+                               hostname='testhost',
+                               ssh_config_file=ssh_config_file,
+                               output_limit=6)
+    channel = FakeChannel([b'line1\n', b'line2\n', b'line3\n'], [])
+
+    with mock.patch.object(kitipy.Executor, '_exec_remote',
+                           return_value=channel):
+        res = executor.run('some cmd', pipe=True)
+
+    assert res.stdout == 'line3\n'
+
+
+
+def test_remote_executor_limits_session_output():
+    ssh_config_file = os.path.join(os.path.dirname(__file__), '..', '.ssh',
+                                   'config')
+    executor = kitipy.Executor(kitipy.Dispatcher(),
+                               hostname='testhost',
+                               ssh_config_file=ssh_config_file,
+                               output_limit=6,
+                               persistent_session=True)
+    session = mock.Mock()
+    session.run.return_value = subprocess.CompletedProcess(
+        'some cmd', 0, 'line3\n', '')
+
+    with mock.patch.object(kitipy.Executor, 'session', session):
+        res = executor.run('some cmd', pipe=True, cwd='/srv/my app')
+
+    session.run.assert_called_once_with('some cmd',
+                                        env=None,
+                                        cwd='/srv/my app',
+                                        text=True,
+                                        encoding=None,
+                                        pipe=True,
+                                        max_size=6)
+    assert res.stdout == 'line3\n'
+
+
+
+def test_remote_executor_invalidates_remote_fs_cache():
+    ssh_config_file = os.path.join(os.path.dirname(__file__), '..', '.ssh',
+                                   'config')
+    executor = kitipy.Executor(kitipy.Dispatcher(),
+                               hostname='testhost',
+                               ssh_config_file=ssh_config_file)
+    executor._fs = mock.Mock()
+
+    with mock.patch.object(kitipy.Executor, 'ssh') as ssh, \
+            mock.patch.object(kitipy.Executor, 'sftp'):
+        ssh.exec_command.side_effect = lambda *args, **kwargs: (mock.Mock(
+            channel=FakeChannel([], [])), None, None)
+
+        executor._remote('stat foo', pipe=True, invalidate=False)
+        executor._fs.invalidate.assert_not_called()
+
+        executor.run('touch foo', pipe=True)
+        executor._fs.invalidate.assert_called_once()
+
+        executor.copy(__file__, '/app/test.py')
+        assert executor._fs.invalidate.call_count == 2
+
+
+def test_local_executor_copy_tree(tmp_path):
+    src = tmp_path / 'src'
+    (src / 'assets' / 'img').mkdir(parents=True)
+    (src / 'index.html').write_text('index')
+    (src / 'assets' / 'img' / 'logo.png').write_text('logo')
+
+    executor = kitipy.Executor(kitipy.Dispatcher())
+    executor.copy_tree(str(src), str(tmp_path / 'dest'))
+
+    assert (tmp_path / 'dest' / 'index.html').read_text() == 'index'
+    assert (tmp_path / 'dest' / 'assets' / 'img' /
+            'logo.png').read_text() == 'logo'
+
+
+def test_remote_executor_copy_many(tmp_path):
+    ssh_config_file = os.path.join(os.path.dirname(__file__), '..', '.ssh',
+                                   'config')
+    events = []
+    dispatcher = kitipy.Dispatcher({})
+    dispatcher.on('file_transfer.start',
+                  lambda **kwargs: events.append(('start', kwargs)))
+    dispatcher.on('file_transfer.end', lambda: events.append(('end', {})))
+    executor = kitipy.Executor(dispatcher,
+                               hostname='testhost',
+                               ssh_config_file=ssh_config_file)
+
+    paths = {}
+    for i in range(10):
+        (tmp_path / str(i)).write_text('x' * i)
+        paths[str(tmp_path / str(i))] = '/app/dir%d/file' % (i % 2)
+
+    ssh = mock.Mock()
+    executor._ssh = ssh
+    with mock.patch.object(kitipy.Executor, '_remote') as remote:
+        executor.copy_many(paths, concurrency=3)
+
+    remote.assert_called_once_with('mkdir -p /app/dir0 /app/dir1')
+    assert ssh.open_sftp.call_count == 3
+    sftp = ssh.open_sftp.return_value
+    assert sftp.put.call_count == 10
+    assert events == [('start', {
+        'size': 45,
+        'label': 'Transfer 10 files'
+    }), ('end', {})]
+
+
+@pytest.mark.parametrize("compression", [None, 'gzip'])
+def test_local_executor_upload_tree(tmp_path, compression):
+    src = tmp_path / 'src'
+    (src / 'sub').mkdir(parents=True)
+    (src / 'a.txt').write_text('a')
+    (src / 'sub' / 'b.txt').write_text('b')
+
+    executor = kitipy.Executor(kitipy.Dispatcher())
+    executor.upload_tree(str(src), str(tmp_path / 'dest'), compression)
+
+    assert (tmp_path / 'dest' / 'a.txt').read_text() == 'a'
+    assert (tmp_path / 'dest' / 'sub' / 'b.txt').read_text() == 'b'
+
+
+
+def test_local_executor_upload_tree_drains_producers_stderr(
+        tmp_path, monkeypatch):
+    # This tar writes more to its stderr than a pipe can hold before it
+    # creates the archive, then gets piped into gzip.
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    (bin_dir / 'tar').write_text(
+        '#!/bin/sh\n'
+        'if [ "$1" = "-cf" ]; then head -c 200000 /dev/zero >&2; fi\n'
+        'exec %s "$@"\n' % (shutil.which('tar')))
+    (bin_dir / 'tar').chmod(0o755)
+    monkeypatch.setenv('PATH', '%s:%s' % (bin_dir, os.environ['PATH']))
+
+    src = tmp_path / 'src'
+    src.mkdir()
+    (src / 'a.txt').write_text('a')
+
+    executor = kitipy.Executor(kitipy.Dispatcher())
+    upload = threading.Thread(target=executor.upload_tree,
+                              args=(str(src), str(tmp_path / 'dest')),
+                              daemon=True)
+    upload.start()
+    upload.join(10)
+
+    assert not upload.is_alive()
+    assert (tmp_path / 'dest' / 'a.txt').read_text() == 'a'
+
+
+
+def test_remote_executor_upload_tree_reports_transfer_errors(tmp_path):
+    ssh_config_file = os.path.join(os.path.dirname(__file__), '..', '.ssh',
+                                   'config')
+    executor = kitipy.Executor(kitipy.Dispatcher(),
+                               hostname='testhost',
+                               ssh_config_file=ssh_config_file)
+    (tmp_path / 'a.txt').write_text('a')
+    channel = mock.Mock()
+    channel.recv_ready.return_value = False
+    channel.recv_stderr_ready.return_value = False
+    channel.recv_exit_status.return_value = 0
+    channel.sendall.side_effect = OSError('Socket is closed')
+
+    with mock.patch.object(kitipy.Executor, 'ssh') as ssh:
+        ssh.get_transport.return_value.open_session.return_value = channel
+        with pytest.raises(OSError, match='Socket is closed'):
+            executor.upload_tree(str(tmp_path), '/app')
+
+    assert channel.close.called
+
+
+
+def test_remote_executor_sync_reads_the_whole_manifest(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    ssh_config_file = os.path.join(os.path.dirname(__file__), '..', '.ssh',
+                                   'config')
+    executor = kitipy.Executor(kitipy.Dispatcher(),
+                               hostname='testhost',
+                               ssh_config_file=ssh_config_file,
+                               output_limit=10)
+    src = tmp_path / 'src'
+    src.mkdir()
+    (src / 'a.txt').write_text('a')
+    manifest = '%s  ./a.txt\n%s  ./extra.txt\n' % (
+        kitipy.sync.hash_file(str(src / 'a.txt')), 'f' * 64)
+    channel = FakeChannel([manifest[:50].encode(), manifest[50:].encode()],
+                          [])
+
+    with mock.patch.object(kitipy.Executor, '_exec_remote',
+                           return_value=channel), \
+            mock.patch.object(kitipy.Executor, 'copy_many'), \
+            mock.patch.object(kitipy.Executor, '_remote_batch'):
+        plan = executor.sync(str(src), '/app', delete=True)
+
+    assert plan.upload == []
+    assert plan.delete == ['extra.txt']
+    assert (tmp_path / 'cache' / 'kitipy' / 'sync').is_dir()
+
+
+def test_local_executor_upload_git_treeish(tmp_path):
+    repo = tmp_path / 'repo'
+    repo.mkdir()
+    git = 'git -c user.name=test -c user.email=test@example.com '
+    subprocess.run(
+        'git init -q . && echo v1 > VERSION && git add VERSION && ' + git +
+        'commit -qm v1 && git tag v1 && echo v2 > VERSION',
+        shell=True,
+        cwd=str(repo),
+        check=True)
+
+    executor = kitipy.Executor(kitipy.Dispatcher())
+    executor.upload_tree(str(repo), str(tmp_path / 'dest'), treeish='v1')
+
+    assert (tmp_path / 'dest' / 'VERSION').read_text() == 'v1\n'
+
+
+def test_executor_upload_tree_fails_on_unknown_treeish(tmp_path):
+    repo = tmp_path / 'repo'
+    repo.mkdir()
+    subprocess.run('git init -q .', shell=True, cwd=str(repo), check=True)
+
+    executor = kitipy.Executor(kitipy.Dispatcher())
+    with pytest.raises(subprocess.CalledProcessError):
+        executor.upload_tree(str(repo),
+                             str(tmp_path / 'dest'),
+                             treeish='unknown')
+
+
+def test_executor_upload_tree_rejects_unknown_compression(tmp_path):
+    executor = kitipy.Executor(kitipy.Dispatcher())
+    with pytest.raises(ValueError):
+        executor.upload_tree(str(tmp_path), str(tmp_path / 'dest'), 'rar')
+
+
+class LocalSFTP(object):
+    """LocalSFTP serves local files as if they were read over SFTP."""
+    def stat(self, path):
+        return os.stat(path)
+
+    def open(self, path, mode):
+        f = open(path, mode)
+        f.prefetch = lambda size: None
+        return f
+
+
+def run_locally(cmd, **kwargs):
+    return subprocess.run(cmd,
+                          shell=True,
+                          text=True,
+                          stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE)
+
+
+@pytest.mark.parametrize("partial", [None, b'0123', b'XXXX'])
+def test_remote_executor_fetch(tmp_path, partial):
+    ssh_config_file = os.path.join(os.path.dirname(__file__), '..', '.ssh',
+                                   'config')
+    updates = []
+    dispatcher = kitipy.Dispatcher({})
+    dispatcher.on('file_transfer.update',
+                  lambda current, total: updates.append(current))
+    executor = kitipy.Executor(dispatcher,
+                               hostname='testhost',
+                               ssh_config_file=ssh_config_file)
+    executor._sftp = LocalSFTP()
+
+    remote = tmp_path / 'dump.sql'
+    remote.write_bytes(b'0123456789')
+    local = tmp_path / 'local.sql'
+    if partial is not None:
+        local.write_bytes(partial)
+
+    with mock.patch.object(kitipy.Executor, '_remote', side_effect=run_locally):
+        executor.fetch(str(remote), str(local))
+
+    assert local.read_bytes() == b'0123456789'
+    assert updates == [10]
+    executor._sftp = None
+
+
+def test_remote_executor_fetch_skips_identical_files(tmp_path):
+    ssh_config_file = os.path.join(os.path.dirname(__file__), '..', '.ssh',
+                                   'config')
+    executor = kitipy.Executor(kitipy.Dispatcher(),
+                               hostname='testhost',
+                               ssh_config_file=ssh_config_file)
+    sftp = mock.Mock(wraps=LocalSFTP())
+    executor._sftp = sftp
+
+    remote = tmp_path / 'dump.sql'
+    remote.write_bytes(b'0123456789')
+    local = tmp_path / 'local.sql'
+    local.write_bytes(b'0123456789')
+
+    with mock.patch.object(kitipy.Executor, '_remote', side_effect=run_locally):
+        executor.fetch(str(remote), str(local))
+
+    sftp.open.assert_not_called()
+    executor._sftp = None
+
+
+def test_local_executor_local_many_prefixes_output(capsys):
+    executor = kitipy.Executor(kitipy.Dispatcher())
+    results = executor.local_many({
+        'foo': 'echo foo',
+        'bar': 'printf bar; echo err >&2',
+    })
+
+    assert isinstance(results, kitipy.ParallelResult)
+    assert results['foo'].stdout == 'foo\n'
+    assert results['bar'].stdout == 'bar'
+    assert results['bar'].stderr == 'err\n'
+
+    captured = capsys.readouterr()
+    assert sorted(captured.out.splitlines()) == ['[bar] bar', '[foo] foo']
+    assert captured.err == '[bar] err\n'
+
+
+def test_local_executor_local_many_collects_all_results():
+    executor = kitipy.Executor(kitipy.Dispatcher())
+    results = executor.local_many(['exit 3', 'echo ok'],
+                                  pipe=True,
+                                  check=False)
+
+    assert results['exit 3'].returncode == 3
+    assert results['echo ok'].stdout == 'ok\n'
+    assert results.summary().startswith('1/2 commands failed.')
+
+    with pytest.raises(kitipy.ParallelError) as excinfo:
+        executor.local_many(['exit 3', 'echo ok'], pipe=True)
+    assert excinfo.value.returncode == 3
+
+
+def test_local_executor_local_many_fails_fast():
+    executor = kitipy.Executor(kitipy.Dispatcher())
+    results = executor.local_many(['exit 1', 'sleep 10', 'echo skipped'],
+                                  concurrency=2,
+                                  pipe=True,
+                                  check=False,
+                                  fail_fast=True)
+
+    assert results['exit 1'].returncode == 1
+    # The running command has been terminated.
+    assert results['sleep 10'].returncode < 0
+    assert results.skipped == ['echo skipped']
@@ -487,3 +487,51 @@ def test_invoking_a_stacks_group_is_not_supported(click_ctx):
 
     with pytest.raises(RuntimeError):
         stacks.invoke(click_ctx)
+
+
+def metrics_root(tmp_path, fail: bool):
+    # The metrics can't be written as the path points to a directory.
+    path = str(tmp_path)
+
+    @kitipy.root(config={'metrics': {'path': path}})
+    def root():
+        pass
+
+    @root.task()
+    def deploy(kctx):
+        if fail:
+            raise kitipy.TaskError('Deployment failed.')
+
+    return root
+
+
+def test_root_command_reports_tear_down_errors_when_the_task_fails(
+        tmp_path, capsys):
+    root = metrics_root(tmp_path, fail=True)
+
+    with pytest.raises(kitipy.TaskError, match='Deployment failed.'):
+        root.main(['deploy'], standalone_mode=False)
+
+    assert 'Failed to clean up after the task' in capsys.readouterr().err
+
+
+def test_root_command_raises_tear_down_errors_when_the_task_succeeds(
+        tmp_path):
+    root = metrics_root(tmp_path, fail=False)
+
+    with pytest.raises(IsADirectoryError):
+        root.main(['deploy'], standalone_mode=False)
+
+
+def test_root_command_reports_tear_down_errors_without_kitipy_context(
+        tmp_path, capsys):
+    root = metrics_root(tmp_path, fail=True)
+    click_ctx = click.Context(root)
+
+    with pytest.raises(kitipy.TaskError, match='Deployment failed.'):
+        with mock.patch.object(kitipy.Group, 'invoke',
+                               side_effect=kitipy.TaskError(
+                                   'Deployment failed.')):
+            root.invoke(click_ctx)
+
+    assert 'Failed to clean up after the task' in capsys.readouterr().err
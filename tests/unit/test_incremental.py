@@ -0,0 +1,99 @@
+import click
+import kitipy
+import os
+import pytest
+from unittest import mock
+from kitipy.incremental import TaskState
+
+
+@pytest.fixture
+def click_ctx(tmp_path):
+    executor = kitipy.Executor(kitipy.Dispatcher(),
+                               local_basedir=str(tmp_path))
+    kctx = kitipy.Context({}, executor, kitipy.Dispatcher())
+    ctx = click.Context(click.Command('root'), obj=kctx)
+    with ctx.scope(cleanup=False):
+        yield ctx
+
+
+def invoke(task, click_ctx, args=[]):
+    ctx = task.make_context(task.name, list(args), parent=click_ctx)
+    with ctx:
+        return task.invoke(ctx)
+
+
+def build_task(tmp_path, callback):
+    def build():
+        callback()
+        (tmp_path / 'out.txt').write_text('built')
+
+    return kitipy.task(name='build',
+                       inputs=['src/**/*.txt'],
+                       outputs=['out.txt'])(build)
+
+
+def test_incremental_task_is_skipped_when_inputs_did_not_change(
+        tmp_path, click_ctx):
+    os.makedirs(str(tmp_path / 'src' / 'sub'))
+    (tmp_path / 'src' / 'sub' / 'a.txt').write_text('a')
+    callback = mock.Mock()
+    task = build_task(tmp_path, callback)
+
+    invoke(task, click_ctx)
+    invoke(task, click_ctx)
+    assert callback.call_count == 1
+
+    (tmp_path / 'src' / 'sub' / 'a.txt').write_text('changed')
+    invoke(task, click_ctx)
+    assert callback.call_count == 2
+
+
+def test_incremental_task_is_run_when_outputs_are_missing(tmp_path, click_ctx):
+    callback = mock.Mock()
+    task = build_task(tmp_path, callback)
+
+    invoke(task, click_ctx)
+    os.remove(str(tmp_path / 'out.txt'))
+    invoke(task, click_ctx)
+
+    assert callback.call_count == 2
+
+
+def test_incremental_task_is_run_with_force_flag(tmp_path, click_ctx):
+    callback = mock.Mock()
+    task = build_task(tmp_path, callback)
+
+    invoke(task, click_ctx)
+    invoke(task, click_ctx, ['--force'])
+
+    assert callback.call_count == 2
+
+
+def test_incremental_task_is_run_when_it_fails(tmp_path, click_ctx):
+    callback = mock.Mock(side_effect=[RuntimeError('boom'), None])
+    task = build_task(tmp_path, callback)
+
+    with pytest.raises(RuntimeError):
+        invoke(task, click_ctx)
+    invoke(task, click_ctx)
+
+    assert callback.call_count == 2
+
+
+def test_task_state_fingerprint_depends_on_env_and_config(tmp_path):
+    task = kitipy.Task(name='deploy',
+                       input_env=['KITIPY_TEST_VERSION'],
+                       input_config=['stages.prod.hostname'])
+    config = {'stages': {'prod': {'hostname': 'prod-1'}}}
+
+    with mock.patch.dict(os.environ, {'KITIPY_TEST_VERSION': '1'}):
+        state = TaskState(task, 'root deploy', {}, config, str(tmp_path))
+        state.save()
+        assert state.is_up_to_date()
+
+    with mock.patch.dict(os.environ, {'KITIPY_TEST_VERSION': '2'}):
+        assert not state.is_up_to_date()
+
+    config['stages']['prod']['hostname'] = 'prod-2'
+    with mock.patch.dict(os.environ, {'KITIPY_TEST_VERSION': '1'}):
+        assert not state.is_up_to_date()
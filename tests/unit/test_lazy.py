@@ -0,0 +1,49 @@
+import kitipy
+import subprocess
+import sys
+
+# paramiko itself is registered in sys.modules as a lazy module, but none of
+# its submodules is imported until it's actually used.
+HEAVY_MODULES = [
+    'asyncio', 'boto3', 'botocore', 'container_transform', 'paramiko.client',
+    'paramiko.transport', 'requests', 'kitipy.ansible_actions',
+    'kitipy.async_executor', 'kitipy.docker', 'kitipy.git_actions',
+    'kitipy.libs', 'kitipy.tasks'
+]
+
+
+def test_importing_kitipy_does_not_load_heavy_modules():
+    # A new interpreter is used as other tests import these modules.
+    res = subprocess.run([
+        sys.executable, '-c',
+        'import kitipy, sys; '
+        'print(" ".join(m for m in %r if m in sys.modules))' % (HEAVY_MODULES)
+    ],
+                         stdout=subprocess.PIPE,
+                         check=True,
+                         text=True)
+
+    assert res.stdout.strip() == ''
+
+
+def test_lazy_attributes_are_loaded_on_first_access():
+    assert kitipy.libs.aws.ecs.__name__ == 'kitipy.libs.aws.ecs'
+    assert kitipy.docker.docker_tasks is kitipy.docker.tasks
+    assert kitipy.AsyncExecutor.__module__ == 'kitipy.async_executor'
+    assert 'tasks' in dir(kitipy)
+
+
+def test_submodules_are_still_reachable_as_attributes():
+    # A new interpreter is used such that the submodules are not already
+    # bound to their package by other tests.
+    names = [
+        'docker.actions', 'docker.filters', 'docker.tasks',
+        'docker.docker_actions', 'docker.docker_filters',
+        'docker.docker_tasks', 'libs.aws.ecs', 'libs.terraform',
+        'libs.tfcloud', 'tasks.aws.ecs', 'tasks.aws.secrets'
+    ]
+    subprocess.run([
+        sys.executable, '-c',
+        'import kitipy; [eval("kitipy." + n) for n in %r]' % (names)
+    ],
+                   check=True)
@@ -0,0 +1,112 @@
+import json
+import kitipy
+import pytest
+import subprocess
+from kitipy.metrics import CommandMetrics
+
+
+def test_executor_emits_command_events():
+    events = []
+    dispatcher = kitipy.Dispatcher({})
+    dispatcher.on('command.start',
+                  lambda **kwargs: events.append(('start', kwargs)))
+    dispatcher.on('command.end',
+                  lambda **kwargs: events.append(('end', kwargs)))
+    executor = kitipy.Executor(dispatcher)
+
+    executor.local('cat', input='foo', pipe=True)
+    with pytest.raises(subprocess.CalledProcessError):
+        executor.local('exit 3', pipe=True)
+
+    assert [e[0] for e in events] == ['start', 'end', 'start', 'end']
+    assert events[0][1] == {'cmd': 'cat', 'host': 'localhost', 'cwd': None}
+
+    end = events[1][1]
+    assert end['returncode'] == 0
+    assert end['bytes_in'] == 3
+    assert end['bytes_out'] == 3
+    assert end['duration'] >= 0
+    assert events[3][1]['returncode'] == 3
+
+
+def test_executor_emits_command_events_for_streamed_commands():
+    events = []
+    dispatcher = kitipy.Dispatcher({})
+    dispatcher.on('command.start',
+                  lambda **kwargs: events.append(('start', kwargs)))
+    dispatcher.on('command.end',
+                  lambda **kwargs: events.append(('end', kwargs)))
+    executor = kitipy.Executor(dispatcher)
+
+    assert list(executor.run_stream('cat', input='foo')) == [('stdout',
+                                                               'foo')]
+    with pytest.raises(subprocess.CalledProcessError):
+        list(executor.run_stream('echo bar; exit 3'))
+
+    assert [e[0] for e in events] == ['start', 'end', 'start', 'end']
+    assert events[0][1] == {'cmd': 'cat', 'host': 'localhost', 'cwd': None}
+
+    end = events[1][1]
+    assert end['returncode'] == 0
+    assert end['bytes_in'] == 3
+    assert end['bytes_out'] == 3
+    assert events[3][1]['returncode'] == 3
+    assert events[3][1]['bytes_out'] == 4
+
+
+def collected():
+    metrics = CommandMetrics()
+    dispatcher = kitipy.Dispatcher({})
+    metrics.attach(dispatcher)
+    for host, returncode in (('localhost', 0), ('testhost', 1)):
+        dispatcher.emit('command.end',
+                        cmd='ls',
+                        host=host,
+                        cwd=None,
+                        start=1000.0,
+                        duration=0.5,
+                        returncode=returncode,
+                        bytes_in=0,
+                        bytes_out=10)
+    return metrics
+
+
+def test_command_metrics_writes_jsonl(tmp_path):
+    path = str(tmp_path / 'metrics.jsonl')
+    collected().write(path)
+    collected().write(path)
+
+    with open(path) as f:
+        lines = [json.loads(line) for line in f]
+    assert len(lines) == 4
+    assert lines[1]['host'] == 'testhost'
+
+
+def test_command_metrics_writes_chrome_trace(tmp_path):
+    path = str(tmp_path / 'trace.json')
+    collected().write(path, 'chrome')
+
+    with open(path) as f:
+        trace = json.load(f)
+    spans = [e for e in trace['traceEvents'] if e['ph'] == 'X']
+    assert [(e['tid'], e['ts'], e['dur']) for e in spans] == [
+        (0, 1000000000, 500000),
+        (1, 1000000000, 500000),
+    ]
+
+
+def test_command_metrics_writes_openmetrics(tmp_path):
+    path = str(tmp_path / 'kitipy.prom')
+    collected().write(path, 'openmetrics')
+
+    with open(path) as f:
+        content = f.read()
+    assert 'kitipy_commands_total{host="testhost"} 1\n' in content
+    assert 'kitipy_commands_failed_total{host="localhost"} 0\n' in content
+    assert 'kitipy_command_duration_seconds_total{host="localhost"} 0.5\n' in content
+    assert content.endswith('# EOF\n')
+
+
+def test_command_metrics_rejects_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        CommandMetrics().write(str(tmp_path / 'metrics'), 'csv')
@@ -0,0 +1,70 @@
+import kitipy
+import threading
+from kitipy.progress import TransferProgress
+from unittest import mock
+
+
+def record_events():
+    events = []
+    dispatcher = kitipy.Dispatcher({})
+    dispatcher.on('file_transfer.start',
+                  lambda **kwargs: events.append(('start', kwargs)))
+    dispatcher.on('file_transfer.update',
+                  lambda **kwargs: events.append(('update', kwargs)))
+    dispatcher.on('file_transfer.end', lambda: events.append(('end', {})))
+    return dispatcher, events
+
+
+def test_transfer_progress_coalesces_updates():
+    dispatcher, events = record_events()
+
+    with mock.patch('time.monotonic', return_value=10.0):
+        with TransferProgress(dispatcher, 1000, 'Transfer') as progress:
+            callback = progress.callback()
+            for current in range(100, 1100, 100):
+                callback(current, 1000)
+
+    assert events == [
+        ('start', {
+            'size': 1000,
+            'label': 'Transfer'
+        }),
+        ('update', {
+            'current': 1000,
+            'total': 1000
+        }),
+        ('end', {}),
+    ]
+
+
+def test_transfer_progress_emits_updates_every_min_bytes():
+    dispatcher, events = record_events()
+
+    with mock.patch('time.monotonic', return_value=10.0):
+        with TransferProgress(dispatcher, 1000, 'Transfer',
+                              min_bytes=500) as progress:
+            for _ in range(10):
+                progress.advance(100)
+
+    updates = [e[1]['current'] for e in events if e[0] == 'update']
+    assert updates == [500, 1000]
+
+
+def test_transfer_progress_aggregates_concurrent_transfers():
+    dispatcher, events = record_events()
+
+    with TransferProgress(dispatcher, 4000, 'Transfer') as progress:
+
+        def transfer():
+            callback = progress.callback()
+            for current in range(10, 1010, 10):
+                callback(current, 1000)
+
+        threads = [threading.Thread(target=transfer) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert progress.current == 4000
+    assert events[-2] == ('update', {'current': 4000, 'total': 4000})
@@ -0,0 +1,120 @@
+import os
+import paramiko
+import pytest
+import subprocess
+from kitipy.remotefs import RemoteFS
+from unittest import mock
+
+
+class LocalSFTP(object):
+    """LocalSFTP implements the subset of paramiko.SFTPClient used by
+    RemoteFS on top of the local filesystem.
+    """
+    def stat(self, path):
+        return paramiko.SFTPAttributes.from_stat(os.stat(path))
+
+    def listdir_attr(self, path):
+        entries = []
+        for name in os.listdir(path):
+            st = os.lstat(os.path.join(path, name))
+            entries.append(paramiko.SFTPAttributes.from_stat(st, name))
+        return entries
+
+    def mkdir(self, path, mode):
+        os.mkdir(path, mode)
+
+    def remove(self, path):
+        os.remove(path)
+
+    def posix_rename(self, src, dest):
+        os.rename(src, dest)
+
+
+def run_locally(cmd, **kwargs):
+    return subprocess.run(cmd,
+                          shell=True,
+                          text=True,
+                          stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE)
+
+
+@pytest.fixture
+def executor(tmp_path):
+    executor = mock.Mock()
+    executor.remote_cwd = str(tmp_path)
+    executor.sftp = mock.Mock(wraps=LocalSFTP())
+    executor.run.side_effect = run_locally
+    executor._remote.side_effect = run_locally
+    return executor
+
+
+def test_remotefs_caches_stat_results(executor, tmp_path):
+    (tmp_path / 'foo').write_text('foo')
+    fs = RemoteFS(executor)
+
+    assert fs.stat('foo').st_size == 3
+    assert fs.exists('foo')
+    assert executor.sftp.stat.call_count == 1
+
+    with pytest.raises(FileNotFoundError):
+        fs.stat('bar')
+
+
+def test_remotefs_caches_missing_paths_until_invalidated(executor, tmp_path):
+    fs = RemoteFS(executor)
+
+    assert not fs.exists('bar')
+    # e.g. created through kctx.run('touch bar'), which invalidates the cache
+    (tmp_path / 'bar').write_text('bar')
+    assert not fs.exists('bar')
+    fs.invalidate()
+
+    assert fs.exists('bar')
+    assert fs.exists_many(['bar', 'baz']) == {'bar': True, 'baz': False}
+    assert fs.exists_many(['baz']) == {'baz': False}
+    assert not fs.exists('baz')
+    assert executor.sftp.stat.call_count == 2
+    executor._remote.assert_called_once()
+    assert executor._remote.call_args[1]['invalidate'] is False
+
+
+def test_remotefs_mutations_invalidate_cache(executor, tmp_path):
+    fs = RemoteFS(executor)
+
+    assert not fs.exists('a/b')
+    fs.mkdir('a/b', parents=True)
+    assert fs.isdir('a/b')
+
+    (tmp_path / 'a' / 'b' / 'foo').write_text('foo')
+    assert fs.listdir('a/b') == ['foo']
+    fs.rename('a/b/foo', 'a/b/bar')
+    assert not fs.exists('a/b/foo')
+    assert fs.exists('a/b/bar')
+
+    fs.remove('a/b/bar')
+    assert not fs.exists('a/b/bar')
+
+
+def test_remotefs_stat_many_uses_a_single_command(executor, tmp_path):
+    (tmp_path / 'foo').write_text('foo')
+    (tmp_path / 'with space').write_text('bar')
+    fs = RemoteFS(executor)
+
+    assert fs.exists_many(['foo', 'with space', 'missing']) == {
+        'foo': True,
+        'with space': True,
+        'missing': False,
+    }
+    assert executor._remote.call_count == 1
+    executor.sftp.stat.assert_not_called()
+
+    assert fs.stat('foo').st_size == 3
+    executor.sftp.stat.assert_not_called()
+
+
+def test_remotefs_cleans_up_temporary_directories(executor):
+    with RemoteFS(executor) as fs:
+        path = fs.mkdtemp(prefix='kitipy-')
+        assert os.path.isdir(path)
+
+    assert not os.path.exists(path)
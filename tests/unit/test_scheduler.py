@@ -0,0 +1,119 @@
+import click
+import kitipy
+import pytest
+import threading
+from unittest import mock
+
+
+@pytest.fixture
+def click_ctx():
+    executor = mock.Mock(spec=kitipy.Executor)
+    kctx = kitipy.Context({}, executor, kitipy.Dispatcher())
+    ctx = click.Context(click.Command('root'), obj=kctx)
+    with ctx.scope(cleanup=False):
+        yield ctx
+
+
+def test_scheduler_runs_independent_tasks_concurrently(click_ctx):
+    # Both tasks have to be running at the same time to pass the barrier.
+    barrier = threading.Barrier(2, timeout=5)
+
+    def wait_for_other_task(name):
+        barrier.wait()
+        return name
+
+    build = kitipy.task(name='build')(lambda: wait_for_other_task('built'))
+    push = kitipy.task(name='push')(lambda: wait_for_other_task('pushed'))
+
+    results = click_ctx.obj.invoke_parallel([build, push], concurrency=2)
+
+    assert results == ['built', 'pushed']
+
+
+def test_scheduler_runs_shared_dependencies_once_and_first(click_ctx):
+    calls = []
+    deps = kitipy.task(name='deps')(lambda: calls.append('deps'))
+    build = kitipy.task(name='build',
+                        depends_on=[deps])(lambda: calls.append('build'))
+    test = kitipy.task(name='test',
+                       depends_on=[deps])(lambda: calls.append('test'))
+
+    kitipy.TaskScheduler(click_ctx.obj).run([build, test])
+
+    assert calls[0] == 'deps'
+    assert sorted(calls[1:]) == ['build', 'test']
+
+
+def test_scheduler_stops_starting_tasks_after_a_failure(click_ctx):
+    def fail():
+        raise kitipy.TaskError('boom')
+
+    deploy = mock.Mock()
+    failing = kitipy.task(name='failing')(fail)
+    deploy_task = kitipy.task(name='deploy', depends_on=[failing])(deploy)
+
+    with pytest.raises(kitipy.TaskError, match='boom'):
+        kitipy.TaskScheduler(click_ctx.obj).run([deploy_task])
+
+    deploy.assert_not_called()
+
+
+def test_scheduler_detects_circular_dependencies(click_ctx):
+    first = kitipy.Task(name='first')
+    second = kitipy.Task(name='second', depends_on=[first])
+    first.depends_on = [second]
+
+    with pytest.raises(kitipy.TaskError, match='first -> second -> first'):
+        kitipy.TaskScheduler(click_ctx.obj).run([first])
+
+
+def test_task_invoke_runs_its_dependencies_first(click_ctx):
+    calls = []
+    deps = kitipy.task(name='deps')(lambda: calls.append('deps'))
+    build = kitipy.task(name='build',
+                        depends_on=[deps])(lambda: calls.append('build'))
+
+    ctx = build.make_context('build', [], parent=click_ctx)
+    with ctx:
+        build.invoke(ctx)
+
+    assert calls == ['deps', 'build']
+
+
+def test_context_invoke_runs_dependencies_first_and_once(click_ctx):
+    calls = []
+    deps = kitipy.task(name='deps')(lambda: calls.append('deps'))
+    build = kitipy.task(name='build',
+                        depends_on=[deps])(lambda: calls.append('build'))
+    deploy = kitipy.task(name='deploy',
+                         depends_on=[build])(lambda: calls.append('deploy'))
+
+    click_ctx.obj.invoke(deploy)
+
+    assert calls == ['deps', 'build', 'deploy']
+
+
+def test_context_invoke_prefetches_config_values(click_ctx):
+    deploy = kitipy.task(name='deploy',
+                         prefetch=['ecs_task_definition'])(lambda: None)
+
+    with mock.patch.object(kitipy.Context, 'prefetch') as prefetch:
+        click_ctx.obj.invoke(deploy)
+
+    prefetch.assert_called_once_with(['ecs_task_definition'])
+
+
+def test_context_invoke_runs_shared_dependencies_once(click_ctx):
+    calls = []
+    deps = kitipy.task(name='deps')(lambda: calls.append('deps'))
+    build = kitipy.task(name='build',
+                        depends_on=[deps])(lambda: calls.append('build'))
+    test = kitipy.task(name='test',
+                       depends_on=[deps])(lambda: calls.append('test'))
+
+    click_ctx.obj.invoke(build)
+    click_ctx.obj.invoke(test)
+    # Tasks explicitly invoked are always run.
+    click_ctx.obj.invoke(deps)
+
+    assert calls == ['deps', 'build', 'test', 'deps']
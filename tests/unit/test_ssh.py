@@ -0,0 +1,283 @@
+import io
+import kitipy
+import os
+import paramiko
+import pytest
+import select
+import subprocess
+from kitipy.ssh import (ConnectionPool, ShellSession, _SentinelReader,
+                        connection_key, quote_path)
+from unittest import mock
+
+params = {'hostname': '127.0.0.1', 'port': 2022, 'username': 'app'}
+
+
+def new_client():
+    client = mock.Mock(spec=paramiko.SSHClient)
+    client.get_transport.return_value.is_active.return_value = True
+    return client
+
+
+def test_connection_key():
+    assert connection_key(params) == ('127.0.0.1', 2022, 'app', None)
+    assert connection_key({
+        'hostname': 'testhost',
+        'proxycommand': 'ssh -W %h:%p jumphost',
+    }) == ('testhost', 22, None, 'ssh -W %h:%p jumphost')
+
+
+def test_connection_pool_reuses_live_connections():
+    pool = ConnectionPool()
+    policy = paramiko.AutoAddPolicy()
+
+    with mock.patch('kitipy.ssh._connect') as connect:
+        connect.side_effect = lambda *args: new_client()
+
+        first = pool.acquire(params, policy)
+        second = pool.acquire(dict(params), policy)
+        other = pool.acquire(dict(params, port=2023), policy)
+
+        assert first is second
+        assert first is not other
+        assert connect.call_count == 2
+
+
+def test_connection_pool_reconnects_dead_connections():
+    pool = ConnectionPool()
+    policy = paramiko.AutoAddPolicy()
+
+    with mock.patch('kitipy.ssh._connect') as connect:
+        connect.side_effect = lambda *args: new_client()
+
+        first = pool.acquire(params, policy)
+        first.get_transport.return_value.is_active.return_value = False
+        second = pool.acquire(params, policy)
+
+        assert first is not second
+
+
+def test_connection_pool_evicts_idle_connections():
+    pool = ConnectionPool(idle_timeout=0)
+    policy = paramiko.AutoAddPolicy()
+
+    with mock.patch('kitipy.ssh._connect') as connect:
+        connect.side_effect = lambda *args: new_client()
+
+        client = pool.acquire(params, policy)
+        pool.acquire(params, policy)
+
+        pool.release(client)
+        client.close.assert_not_called()
+        assert len(pool) == 1
+
+        pool.release(client)
+        client.close.assert_called_once()
+        assert len(pool) == 0
+
+
+
+def test_connection_pool_releases_replaced_connections():
+    pool = ConnectionPool(idle_timeout=0)
+    policy = paramiko.AutoAddPolicy()
+
+    with mock.patch('kitipy.ssh._connect') as connect:
+        connect.side_effect = lambda *args: new_client()
+
+        first = pool.acquire(params, policy)
+        first.get_transport.return_value.is_active.return_value = False
+        second = pool.acquire(params, policy)
+
+        pool.release(first)
+        second.close.assert_not_called()
+        assert len(pool) == 1
+
+        pool.release(second)
+        second.close.assert_called_once()
+        assert len(pool) == 0
+
+
+def test_connection_pool_close():
+    pool = ConnectionPool()
+    policy = paramiko.AutoAddPolicy()
+
+    with mock.patch('kitipy.ssh._connect') as connect:
+        connect.side_effect = lambda *args: new_client()
+
+        client = pool.acquire(params, policy)
+        pool.close()
+
+        client.close.assert_called_once()
+        assert len(pool) == 0
+
+
+def test_executors_share_connections_through_the_pool():
+    pool = ConnectionPool()
+    executor = kitipy.Executor(kitipy.Dispatcher(),
+                               hostname='testhost',
+                               ssh_config_file='tests/.ssh/config',
+                               connection_pool=pool)
+    other = kitipy.Executor(kitipy.Dispatcher(),
+                            hostname='testhost',
+                            ssh_config_file='tests/.ssh/config',
+                            connection_pool=pool)
+
+    with mock.patch('kitipy.ssh._connect') as connect:
+        connect.side_effect = lambda *args: new_client()
+
+        assert executor.ssh is other.ssh
+        connect.assert_called_once()
+
+        executor.close()
+        other.close()
+        assert len(pool) == 1
+
+
+class LocalChannel(object):
+    """LocalChannel mimics a paramiko.Channel running a local command."""
+    def __init__(self):
+        self.proc = None
+        self.closed = False
+
+    def exec_command(self, cmd):
+        self.proc = subprocess.Popen(cmd,
+                                     shell=True,
+                                     stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.PIPE)
+
+    def sendall(self, data):
+        self.proc.stdin.write(data)
+        self.proc.stdin.flush()
+
+    def fileno(self):
+        return self.proc.stdout.fileno()
+
+    def recv_ready(self):
+        return len(select.select([self.proc.stdout], [], [], 0)[0]) > 0
+
+    def recv(self, size):
+        return os.read(self.proc.stdout.fileno(), size)
+
+    def recv_stderr_ready(self):
+        return len(select.select([self.proc.stderr], [], [], 0)[0]) > 0
+
+    def recv_stderr(self, size):
+        return os.read(self.proc.stderr.fileno(), size)
+
+    def exit_status_ready(self):
+        return self.proc.poll() is not None
+
+    def close(self):
+        self.proc.stdin.close()
+        self.proc.wait()
+        self.closed = True
+
+
+@pytest.fixture
+def session():
+    client = mock.Mock(spec=paramiko.SSHClient)
+    client.get_transport.return_value.open_session.side_effect = LocalChannel
+    session = ShellSession(client)
+    yield session
+    session.close()
+
+
+def test_shell_session_runs_commands(session):
+    res = session.run('echo yolo; echo oops >&2; exit 3', pipe=True)
+
+    assert res.returncode == 3
+    assert res.stdout == 'yolo\n'
+    assert res.stderr == 'oops\n'
+
+
+def test_shell_session_applies_cwd_and_env(session):
+    res = session.run('pwd; echo $FOO', cwd='/tmp', env={'FOO': 'b a r'},
+                      pipe=True)
+
+    assert res.stdout == '/tmp\nb a r\n'
+
+    # Commands are isolated from each other
+    res = session.run('pwd; echo $FOO', pipe=True)
+    assert res.stdout != '/tmp\nb a r\n'
+
+
+
+def test_shell_session_quotes_cwd(session, tmp_path):
+    cwd = tmp_path / 'my app'
+    cwd.mkdir()
+    res = session.run('pwd', cwd=str(cwd), pipe=True)
+
+    assert res.returncode == 0
+    assert res.stdout == '%s\n' % (cwd)
+
+
+def test_quote_path():
+    assert quote_path('/srv/my app') == "'/srv/my app'"
+    assert quote_path('~') == '~'
+    assert quote_path('~/my app') == "~/'my app'"
+
+
+def test_shell_session_reuses_the_same_shell(session):
+    session.run('true', pipe=True)
+    channel = session.channel
+    res = session.run('printf foo', pipe=True)
+
+    assert session.channel is channel
+    assert res.stdout == 'foo'
+
+
+def test_shell_session_streams_output(session, capsys):
+    res = session.run('echo yolo', pipe=False)
+
+    assert res.stdout == ''
+    assert capsys.readouterr().out == 'yolo\n'
+
+
+
+def test_shell_session_flushes_partial_output(session, capfd):
+    session.run("printf 'h\\303'", pipe=False)
+
+    assert capfd.readouterr().out == 'h\ufffd'
+
+
+def test_shell_session_consumes_the_whole_stderr_sentinel(session):
+    assert session.run('echo oops >&2', pipe=True).stderr == 'oops\n'
+    assert session.run('true', pipe=True).stderr == ''
+
+
+def test_shell_session_is_reset_after_a_failure(session):
+    channel = session.channel
+    with mock.patch.object(_SentinelReader, 'read',
+                           side_effect=KeyboardInterrupt):
+        with pytest.raises(KeyboardInterrupt):
+            session.run('sleep 0.2; echo first', pipe=True)
+
+    assert channel.closed
+    res = session.run('echo second', pipe=True)
+    assert session.channel is not channel
+    assert res.stdout == 'second\n'
+
+
+def test_shell_session_keeps_only_the_tail_of_large_outputs(session):
+    res = session.run('seq 1 100000', pipe=True, max_size=13)
+
+    assert res.returncode == 0
+    assert res.stdout == '99999\n100000\n'
+
+
+def test_sentinel_reader_drops_printed_output():
+    chunks = [b'x' * 1000, b'y' * 1000 + b'__EN', b'D__0 \n']
+    output = io.StringIO()
+    reader = _SentinelReader(lambda _: chunks.pop(0), None, b'__END__',
+                             output, 'utf-8', b'\n')
+
+    reader.read()
+    assert len(reader._buffer) < len(b'__END__')
+    reader.read()
+    assert len(reader._buffer) < len(b'__END__')
+
+    reader.read()
+    assert reader.done
+    assert reader.output == b''
+    assert reader.trailer == b'0 \n'
+    assert output.getvalue() == 'x' * 1000 + 'y' * 1000
@@ -0,0 +1,85 @@
+import kitipy
+import os
+import pytest
+from kitipy import sync
+from unittest import mock
+
+
+def test_build_manifest_reuses_cached_digests(tmp_path):
+    root = tmp_path / 'root'
+    (root / 'sub').mkdir(parents=True)
+    (root / 'a.txt').write_text('a')
+    (root / 'sub' / 'b.txt').write_text('b')
+    cache_dir = str(tmp_path / 'cache')
+
+    manifest = sync.build_manifest(str(root), cache_dir)
+    assert manifest == {
+        'a.txt': sync.hash_file(str(root / 'a.txt')),
+        os.path.join('sub', 'b.txt'): sync.hash_file(str(root / 'sub' /
+                                                         'b.txt')),
+    }
+
+    with mock.patch('kitipy.sync.hash_file') as hash_file:
+        assert sync.build_manifest(str(root), cache_dir) == manifest
+        hash_file.assert_not_called()
+
+        (root / 'a.txt').write_text('changed')
+        hash_file.return_value = 'new digest'
+        manifest = sync.build_manifest(str(root), cache_dir)
+        hash_file.assert_called_once_with(str(root / 'a.txt'))
+        assert manifest['a.txt'] == 'new digest'
+
+
+def test_parse_sha256sum():
+    output = ('abc  ./a.txt\n'
+              'def  ./sub/b c.txt\n'
+              '\\123  ./new\\nline\n')
+
+    assert sync.parse_sha256sum(output) == {
+        'a.txt': 'abc',
+        'sub/b c.txt': 'def',
+        'new\nline': '123',
+    }
+
+
+
+@pytest.mark.parametrize('line', ['abc', 'xyz  ./a.txt', 'abc ./a.txt'])
+def test_parse_sha256sum_rejects_malformed_lines(line):
+    with pytest.raises(kitipy.TaskError, match='Malformed line'):
+        sync.parse_sha256sum('abc  ./ok.txt\n%s\n' % (line))
+
+
+def test_sync_plan():
+    plan = sync.SyncPlan({
+        'same': '1',
+        'changed': '2',
+        'new': '3'
+    }, {
+        'same': '1',
+        'changed': '0',
+        'extra': '4'
+    })
+
+    assert plan.upload == ['changed', 'new']
+    assert plan.delete == ['extra']
+    assert bool(sync.SyncPlan({'same': '1'}, {'same': '1'})) is False
+
+
+def test_local_executor_sync(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    src = tmp_path / 'src'
+    dest = tmp_path / 'dest'
+    (src / 'sub').mkdir(parents=True)
+    dest.mkdir()
+    (src / 'a.txt').write_text('a')
+    (src / 'sub' / 'b.txt').write_text('b')
+    (dest / 'a.txt').write_text('a')
+    (dest / 'extra.txt').write_text('extra')
+
+    executor = kitipy.Executor(kitipy.Dispatcher())
+    plan = executor.sync(str(src), str(dest), delete=True)
+
+    assert plan.upload == [os.path.join('sub', 'b.txt')]
+    assert plan.delete == ['extra.txt']
+    assert (dest / 'sub' / 'b.txt').read_text() == 'b'
+    assert not (dest / 'extra.txt').exists()
@@ -0,0 +1,145 @@
+import json
+import os
+import subprocess
+import kitipy
+import kitipy.libs.terraform as terraform
+import pytest
+from unittest import mock
+
+
+@pytest.fixture
+def kctx(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+    monkeypatch.setenv('TFCLOUD_API_TOKEN', 'token')
+    config = kitipy.normalize_config({
+        'stages': {
+            'dev': {
+                'tfcloud_workspace_id': 'ws-dev'
+            },
+            'prod': {
+                'tfcloud_workspace_id': 'ws-prod'
+            },
+            'local': {},
+        },
+    })
+    executor = mock.Mock(spec=kitipy.Executor)
+    executor.local_cwd = None
+    return kitipy.Context(config, executor, kitipy.Dispatcher(),
+                          config['stages']['dev'])
+
+
+@pytest.fixture
+def tfcloud(monkeypatch):
+    state_versions = {'ws-dev': 'sv-1', 'ws-prod': 'sv-1'}
+    current = mock.Mock(side_effect=lambda token, ws: {
+        'data': {
+            'id': state_versions[ws],
+            'workspace': ws
+        }
+    })
+    outputs = mock.Mock(side_effect=lambda token, sv: {
+        'workspace': sv['data']['workspace'],
+        'version': sv['data']['id'],
+    })
+    monkeypatch.setattr(terraform, 'get_current_state_version', current)
+    monkeypatch.setattr(terraform, 'get_state_version_outputs', outputs)
+    return state_versions, current, outputs
+
+
+def test_output_defaults_to_current_stage_and_is_memoized(kctx, tfcloud):
+    _, current, outputs = tfcloud
+    output = terraform._memoize(terraform._output)
+
+    assert output(kctx) == {'workspace': 'ws-dev', 'version': 'sv-1'}
+    assert output(kctx, 'dev') == {'workspace': 'ws-dev', 'version': 'sv-1'}
+    assert output(kctx, 'prod')['workspace'] == 'ws-prod'
+    assert current.call_count == 2
+    assert outputs.call_count == 2
+
+
+def test_output_reuses_disk_cache_until_state_version_changes(kctx, tfcloud):
+    state_versions, current, outputs = tfcloud
+
+    terraform._output(kctx, 'dev')
+    assert terraform._output(kctx, 'dev')['version'] == 'sv-1'
+    assert current.call_count == 2
+    assert outputs.call_count == 1
+
+    state_versions['ws-dev'] = 'sv-2'
+
+    assert terraform._output(kctx, 'dev')['version'] == 'sv-2'
+    assert outputs.call_count == 2
+
+
+def test_outputs_by_stage_fetches_stages_with_a_workspace(
+        kctx, tfcloud, monkeypatch):
+    monkeypatch.setattr(terraform, 'output',
+                        terraform._memoize(terraform._output))
+
+    outputs = terraform.outputs_by_stage(kctx)
+
+    assert outputs == {
+        'dev': {
+            'workspace': 'ws-dev',
+            'version': 'sv-1'
+        },
+        'prod': {
+            'workspace': 'ws-prod',
+            'version': 'sv-1'
+        },
+    }
+
+
+def write_state(path, outputs, mtime_offset=0):
+    path.write_text(
+        json.dumps({
+            'version': 4,
+            'outputs': {k: {'value': v} for k, v in outputs.items()},
+            'resources': [],
+        }))
+    stat = os.stat(str(path))
+    os.utime(str(path),
+             ns=(stat.st_atime_ns, stat.st_mtime_ns + mtime_offset))
+
+
+def test_local_backend_reads_state_file_and_caches_by_mtime(
+        kctx, tmp_path, monkeypatch):
+    kctx.config['stages']['local'] = {
+        'name': 'local',
+        'terraform_state_file': str(tmp_path / 'terraform.tfstate'),
+    }
+    write_state(tmp_path / 'terraform.tfstate', {'vpc_id': 'vpc-1'})
+    read = mock.Mock(side_effect=terraform.read_state_outputs)
+    monkeypatch.setattr(terraform, 'read_state_outputs', read)
+
+    assert terraform._output(kctx, 'local') == {'vpc_id': 'vpc-1'}
+    assert terraform._output(kctx, 'local') == {'vpc_id': 'vpc-1'}
+    assert read.call_count == 1
+
+    write_state(tmp_path / 'terraform.tfstate', {'vpc_id': 'vpc-2'}, 10**9)
+
+    assert terraform._output(kctx, 'local') == {'vpc_id': 'vpc-2'}
+    assert read.call_count == 2
+
+
+def test_cli_backend_runs_terraform_output(kctx):
+    kctx.config['stages']['local'] = {
+        'name': 'local',
+        'terraform_backend': 'cli',
+        'terraform_dir': 'infra/',
+    }
+    kctx.executor.local.return_value = subprocess.CompletedProcess(
+        [], 0, stdout='{"vpc_id": {"sensitive": false, "value": "vpc-1"}}')
+
+    assert terraform._output(kctx, 'local') == {'vpc_id': 'vpc-1'}
+    cmd, _, cwd = kctx.executor.local.call_args[0][:3]
+    assert (cmd, cwd) == ('terraform output -json', 'infra/')
+
+
+def test_output_fails_without_backend(kctx):
+    with pytest.raises(RuntimeError, match='No Terraform output backend'):
+        terraform._output(kctx, 'local')
+
+    kctx.config['stages']['local']['terraform_backend'] = 's3'
+    with pytest.raises(RuntimeError, match='s3 is not supported'):
+        terraform._output(kctx, 'local')
@@ -0,0 +1,96 @@
+import json
+import pytest
+from kitipy.libs import tfcloud
+
+
+def chunked(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+STATE = {
+    'version': 4,
+    'terraform_version': '0.12.24',
+    'serial': 12,
+    'lineage': 'ab"c\\d}',
+    'outputs': {
+        'vpc_id': {
+            'value': 'vpc-123',
+            'type': 'string'
+        },
+        'subnets': {
+            'value': ['a', 'b]', '{c'],
+            'type': ['list', 'string']
+        },
+        'name': {
+            'value': 'café ☃',
+            'type': 'string'
+        },
+    },
+    'resources': [{
+        'type': 'aws_vpc',
+        'instances': [{
+            'attributes': {
+                'id': 'vpc-123',
+                'tags': {}
+            }
+        }]
+    }],
+}
+
+
+@pytest.mark.parametrize('size', [1, 3, 7, 65536])
+def test_read_state_outputs_handles_any_chunk_size(size):
+    data = json.dumps(STATE, ensure_ascii=False).encode('utf-8')
+
+    outputs = tfcloud.read_state_outputs(chunked(data, size))
+
+    assert outputs == STATE['outputs']
+
+
+def test_read_state_outputs_stops_reading_after_outputs():
+    read = []
+
+    def chunks():
+        yield b'{"version": 4, "outputs": {"foo": '
+        read.append('outputs')
+        yield b'{"value": 1}}, "resources": ['
+        read.append('resources')
+        raise AssertionError('The resources should not be read.')
+
+    assert tfcloud.read_state_outputs(chunks()) == {'foo': {'value': 1}}
+    assert read == ['outputs']
+
+
+def test_read_state_outputs_skips_values_before_outputs():
+    data = json.dumps({
+        'resources': [{'a': [1, 2, {'b': 'c]'}]}],
+        'check_results': None,
+        'serial': 1.5e3,
+        'outputs': {'foo': {'value': True}},
+    }).encode('utf-8')
+
+    outputs = tfcloud.read_state_outputs(chunked(data, 5))
+
+    assert outputs == {'foo': {'value': True}}
+
+
+def test_read_state_outputs_returns_empty_dict_without_outputs():
+    data = json.dumps({'version': 4, 'resources': []}).encode('utf-8')
+
+    assert tfcloud.read_state_outputs(chunked(data, 4)) == {}
+
+
+@pytest.mark.parametrize('data', [b'[]', b'{"version": 4', b''])
+def test_read_state_outputs_rejects_invalid_documents(data):
+    with pytest.raises(ValueError):
+        tfcloud.read_state_outputs(chunked(data, 4))
+
+
+def test_new_session_retries_rate_limited_and_server_errors():
+    session = tfcloud.new_session(retries=3)
+    retry = session.get_adapter('https://app.terraform.io').max_retries
+
+    assert retry.total == 3
+    assert 429 in retry.status_forcelist
+    assert 503 in retry.status_forcelist
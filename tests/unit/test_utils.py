@@ -1,7 +1,7 @@
 import kitipy
 import os
 import pytest
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 from kitipy import *
 
 
@@ -40,6 +40,26 @@ def test_set_up_file_transfer_listeners():
     set_up_file_transfer_listeners(dispatcher)
 
     assert dispatcher.on.call_count == 3
+    assert [c[0][0] for c in dispatcher.on.call_args_list] == [
+        'file_transfer.start',
+        'file_transfer.update',
+        'file_transfer.end',
+    ]
+
+
+def test_file_transfer_listeners_update_progressbar():
+    dispatcher = kitipy.Dispatcher({})
+    set_up_file_transfer_listeners(dispatcher)
+
+    with patch('click.progressbar') as progressbar:
+        dispatcher.emit('file_transfer.start', size=100, label='Transfer')
+        dispatcher.emit('file_transfer.update', current=30, total=100)
+        dispatcher.emit('file_transfer.update', current=100, total=100)
+        dispatcher.emit('file_transfer.end')
+
+    bar = progressbar.return_value
+    assert [c[0][0] for c in bar.update.call_args_list] == [30, 70]
+    bar.render_finish.assert_called_once_with()
 
 
 def normalize_config_testdata():
@@ -130,7 +150,8 @@ def test_normalize_config(config, expected):
     assert config == expected
 
 
-def test_load_config_file():
+def test_load_config_file(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
     filepath = os.path.join(os.path.dirname(__file__), "testdata/config.yml")
 
     config = load_config_file(filepath)
@@ -144,3 +165,89 @@ def test_load_config_file():
     }
 
     assert config == expected
+
+
+def write_config(path, content):
+    path.write_text(content)
+    # Make sure the mtime changes even on filesystems with coarse timestamps.
+    stat = os.stat(str(path))
+    os.utime(str(path), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_load_config_merges_included_files(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    (tmp_path / 'stacks').mkdir()
+    write_config(tmp_path / 'stacks' / 'api.yml',
+                 'stacks:\n  api:\n    type: compose\n')
+    write_config(tmp_path / 'stages.yml',
+                 'include: stacks/api.yml\nstages:\n  dev:\n    type: local\n')
+    write_config(tmp_path / 'kitipy.yml',
+                 'include:\n  - stages.yml\nstages:\n  dev:\n    foo: bar\n')
+
+    config = load_config(str(tmp_path / 'kitipy.yml'))
+
+    assert config == {
+        'path': str(tmp_path / 'kitipy.yml'),
+        'stages': {
+            'dev': {
+                'name': 'dev',
+                'type': 'local',
+                'foo': 'bar',
+            },
+        },
+        'stacks': {
+            'api': {
+                'name': 'api',
+                'type': 'compose',
+            },
+        },
+    }
+
+
+def test_load_config_only_parses_changed_files(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    write_config(tmp_path / 'stages.yml', 'stages:\n  dev:\n    type: local\n')
+    write_config(tmp_path / 'kitipy.yml', 'include: stages.yml\n')
+    path = str(tmp_path / 'kitipy.yml')
+
+    parsed = []
+    load = kitipy.utils.yaml.load
+
+    def spy(stream, Loader):
+        parsed.append(os.path.basename(stream.name))
+        return load(stream, Loader=Loader)
+
+    monkeypatch.setattr(kitipy.utils.yaml, 'load', spy)
+
+    assert load_config(path)['stages']['dev']['type'] == 'local'
+    assert load_config(path)['stages']['dev']['type'] == 'local'
+    assert parsed == ['kitipy.yml', 'stages.yml']
+
+    write_config(tmp_path / 'stages.yml', 'stages:\n  dev:\n    type: remote\n')
+
+    assert load_config(path)['stages']['dev']['type'] == 'remote'
+    assert parsed == ['kitipy.yml', 'stages.yml', 'stages.yml']
+
+
+def test_load_config_ignores_cache_from_other_versions(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    write_config(tmp_path / 'kitipy.yml', 'stages:\n  dev:\n    type: local\n')
+    path = str(tmp_path / 'kitipy.yml')
+
+    load_config(path)
+    monkeypatch.setattr(kitipy, '__version__', '0.0-test')
+    monkeypatch.setattr(kitipy.utils, 'normalize_config',
+                        Mock(side_effect=normalize_config))
+
+    load_config(path)
+
+    assert kitipy.utils.normalize_config.call_count == 1
+
+
+def test_load_config_detects_circular_includes(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    write_config(tmp_path / 'a.yml', 'include: b.yml\n')
+    write_config(tmp_path / 'b.yml', 'include: a.yml\n')
+
+    with pytest.raises(RuntimeError, match='circular includes'):
+        load_config(str(tmp_path / 'a.yml'))
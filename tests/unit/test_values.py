@@ -0,0 +1,89 @@
+import click
+import kitipy
+import pytest
+import threading
+from unittest import mock
+
+
+def new_kctx(config=None, stage='dev'):
+    config = kitipy.normalize_config(config if config else {
+        'stages': {
+            'dev': {},
+            'prod': {}
+        },
+    })
+    executor = mock.Mock(spec=kitipy.Executor)
+    return kitipy.Context(config, executor, kitipy.Dispatcher(),
+                          config['stages'][stage])
+
+
+def test_lazy_value_is_memoized_per_stage():
+    fn = mock.Mock(side_effect=lambda kctx: {'stage': kctx.stage['name']})
+    value = kitipy.lazy_value(fn)
+
+    assert value(new_kctx(stage='dev')) == {'stage': 'dev'}
+    assert value(new_kctx(stage='dev')) == {'stage': 'dev'}
+    assert value(new_kctx(stage='prod')) == {'stage': 'prod'}
+    assert fn.call_count == 2
+
+
+def test_lazy_value_returns_copies_of_memoized_value():
+    value = kitipy.lazy_value(lambda kctx, tag: {'tags': [tag]})
+    kctx = new_kctx()
+
+    value(kctx, 'v1')['tags'].append('altered')
+
+    assert value(kctx, 'v1') == {'tags': ['v1']}
+    assert value(kctx, 'v2') == {'tags': ['v2']}
+
+
+def test_prefetch_fetches_sources_concurrently():
+    # Both sources have to be running at the same time to pass the barrier.
+    barrier = threading.Barrier(2, timeout=5)
+    first = kitipy.lazy_value(lambda kctx: barrier.wait() is not None)
+    second = kitipy.lazy_value(lambda kctx: barrier.wait() is not None)
+    plain = mock.Mock()
+
+    @kitipy.lazy_value(sources=[first, mock.Mock()])
+    def nested(kctx):
+        return first(kctx)
+
+    values = [
+        kitipy.lazy_value(lambda kctx: None, sources=[nested, second]),
+        kitipy.lazy_value(lambda kctx: None, sources=[plain]),
+        'not a lazy value',
+    ]
+    kctx = new_kctx()
+
+    kitipy.values.prefetch(kctx, values, concurrency=2)
+
+    plain.assert_called_once_with(kctx)
+
+
+def test_prefetch_raises_errors_of_sources():
+    failing = mock.Mock(side_effect=RuntimeError('fetch failed'))
+    value = kitipy.lazy_value(lambda kctx: None, sources=[failing])
+
+    with pytest.raises(RuntimeError, match='fetch failed'):
+        kitipy.values.prefetch(new_kctx(), [value])
+
+
+def test_task_prefetches_declared_config_values():
+    source = mock.Mock()
+    config = {
+        'stage': {
+            'name': 'dev',
+            'resolver': kitipy.lazy_value(lambda kctx: 'ok', sources=[source]),
+        },
+    }
+    kctx = new_kctx(config)
+
+    @kitipy.task(prefetch=['resolver', 'missing'])
+    def deploy():
+        return kctx.stage['resolver'](kctx)
+
+    click_ctx = click.Context(deploy, obj=kctx)
+    with click_ctx.scope(cleanup=False):
+        assert deploy.invoke(click_ctx) == 'ok'
+
+    source.assert_called_once_with(kctx)